@@ -0,0 +1,161 @@
+r'''Benchmark of the number of Maya commands issued by 'mtgMain'.
+
+   Runs 'mtgMain.music_displace' on poly planes of different sizes,
+   'mtgMain.create_texture' with different numbers of textures and
+   'mtgMain.scatter_instances' with different numbers of instances against
+   the recording stand-in for Maya in 'fakeMaya', and reports the commands
+   issued for each vertex, for each material and for each scatter along
+   with the commands that were called the most. The scatters also check
+   that every instance has its scale, rotation and object index set.
+
+   The counts are compared against 'BUDGETS'. If any count goes over its
+   budget the benchmark exits with 1, so a change that makes MTG issue more
+   commands is noticed. Lower the budgets when the counts come down.
+
+   This doesn't need Maya and is run from the root of the repository with:
+   python benchmarks/benchCommandCounts.py [--output results.json]
+
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'mtg'))
+
+import fakeMaya
+cmds = fakeMaya.install()
+
+import mtgMain
+import terrainWave as tw
+from benchTerrainWave import write_song
+
+# The number of vertices along each side of the planes
+PLANE_SIZES = (11, 31, 101)
+DIRECTIONS = ('y', 'xyz', 'n')
+TEXTURE_COUNTS = (1, 5, 10)
+SCATTER_COUNTS = (1000, 10000)
+
+# The most commands allowed for each vertex, for each material by the
+# number of textures and for each scatter, a little over the counts when
+# they were last lowered
+BUDGETS = {'music_displace y': 2.1,
+           'music_displace xyz': 2.1,
+           'music_displace n': 4.2,
+           'create_texture': {1: 600, 5: 1650, 10: 2500},
+           'scatter_instances': 16}
+
+
+def budget(case):
+    '''Returns the most commands allowed for a case.'''
+    allowed = BUDGETS[case['name']]
+    if isinstance(allowed, dict):
+        return allowed[case['textures']]
+    return allowed
+
+
+def count_commands(func, *args, **kwargs):
+    '''Runs 'func' and returns the number of commands it issued, the time
+    spent in commands and the most called commands.'''
+    del cmds.calls[:]
+    cmds.counts.clear()
+    start = time.time()
+    func(*args, **kwargs)
+    taken = time.time() - start
+    return {'commands': len(cmds.calls), 'time': taken,
+            'command_time': sum(t for _, t in cmds.calls),
+            'top': cmds.counts.most_common(5)}
+
+
+def displace_cases(song):
+    cases = []
+    for size in PLANE_SIZES:
+        for direction in DIRECTIONS:
+            cmds.reset()
+            plane = cmds.polyPlane(w=24, h=24, sx=size - 1, sy=size - 1)[0]
+            nVtx = size * size
+            result = count_commands(mtgMain.music_displace,
+                                    tw.TerrainWaveFile(song), 4, plane,
+                                    vtxDire=direction, refresh=False)
+            result.update(name='music_displace %s' % direction, nvtx=nVtx,
+                          per=float(result['commands']) / nVtx, unit='vertex')
+            cases.append(result)
+    return cases
+
+
+def texture_cases():
+    cases = []
+    for nTex in TEXTURE_COUNTS:
+        cmds.reset()
+        result = count_commands(mtgMain.create_texture, 'arid', nOfCTex=nTex,
+                                grassType='tall', nOfGTex=nTex)
+        result.update(name='create_texture', textures=nTex,
+                      per=float(result['commands']), unit='material')
+        cases.append(result)
+    return cases
+
+
+def scatter_cases():
+    cases = []
+    for nInstances in SCATTER_COUNTS:
+        cmds.reset()
+        plane = cmds.polyPlane(w=24, h=24, sx=50, sy=50)[0]
+        result = count_commands(mtgMain.scatter_instances, plane, nInstances,
+                                instances=['rock'], seed=1)
+        shape = cmds.nodes['mtg_scatterShape']
+        for attr in ('scalePP', 'rotationPP', 'indexPP'):
+            if len(shape.attrs[attr]) != nInstances:
+                raise ValueError('%s has %d values for %d instances' %
+                                 (attr, len(shape.attrs[attr]), nInstances))
+        result.update(name='scatter_instances', instances=nInstances,
+                      per=float(result['commands']), unit='scatter')
+        cases.append(result)
+    return cases
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='where the JSON results are written')
+    options = parser.parse_args(args)
+
+    folder = tempfile.mkdtemp(prefix='mtgBench')
+    try:
+        song = os.path.join(folder, 'song.wav')
+        write_song(song, 'sine', 2, 2, 30)
+        # create_texture prints every attribute it sets
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            cases = displace_cases(song) + texture_cases() + scatter_cases()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    finally:
+        shutil.rmtree(folder)
+
+    failed = False
+    print '%-20s %8s %9s %12s %9s  %s' % ('procedure', 'size', 'commands',
+                                         'per', 'time', 'most called')
+    for case in cases:
+        size = case.get('nvtx', case.get('textures', case.get('instances')))
+        over = case['per'] > budget(case)
+        failed = failed or over
+        print '%-20s %8d %9d %8.2f/%-3s %8.3fs  %s%s' % (
+            case['name'], size, case['commands'], case['per'],
+            case['unit'][:3], case['time'],
+            ', '.join('%s %d' % c for c in case['top'][:3]),
+            '  OVER BUDGET %.1f' % budget(case) if over else '')
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'budgets': BUDGETS, 'cases': cases}, f, indent=1,
+                      sort_keys=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
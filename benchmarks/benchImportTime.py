@@ -0,0 +1,89 @@
+r'''Benchmark of the time taken to import the MTG modules.
+
+   Imports each module in 'MODULES' in a new Python process against the
+   recording stand-in for Maya in 'fakeMaya', and reports how long the
+   import took and the Maya commands it called. Shelves that import MTG do
+   so while Maya is starting up, and every command is much slower in Maya
+   than in the stand-in, so importing must not call Maya at all. The node
+   type tables of 'mayaFuncs' and the MEL scripts of 'mtgMain' are made the
+   first time they are needed instead.
+
+   If any import calls more commands than 'COMMAND_BUDGET' or takes longer
+   than 'TIME_BUDGET' seconds, the benchmark exits with 1.
+
+   This doesn't need Maya and is run from the root of the repository with:
+   python benchmarks/benchImportTime.py [--repeat 5] [--output results.json]
+
+'''
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = ('mayaSnippet.mayaFuncs', 'mtg.mtgMain', 'mtg.mtgGUI')
+
+# The most commands and seconds allowed for importing each module
+COMMAND_BUDGET = 0
+TIME_BUDGET = 1.0
+
+# Run in the new process, it prints the import time and the commands called
+CHILD = '''
+import sys, json, time
+sys.path[:0] = [%r, %r]
+import fakeMaya
+cmds = fakeMaya.install()
+start = time.time()
+__import__(%r)
+taken = time.time() - start
+print json.dumps({'time': taken, 'commands': [n for n, _ in cmds.calls]})
+'''
+
+
+def import_module(name):
+    '''Imports 'name' in a new Python process and returns a dictionary of
+    the seconds taken and the names of the commands called.'''
+    code = CHILD % (BENCHMARKS, os.path.join(ROOT, 'scripts'), name)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='the number of times each module is imported')
+    parser.add_argument('--output', help='where the JSON results are written')
+    options = parser.parse_args(args)
+
+    failed = False
+    cases = []
+    print '%-24s %9s %9s %9s  %s' % ('module', 'best', 'median', 'commands',
+                                     'called')
+    for name in MODULES:
+        runs = [import_module(name) for _ in xrange(options.repeat)]
+        times = sorted(run['time'] for run in runs)
+        commands = runs[0]['commands']
+        case = {'module': name, 'best': times[0],
+                'median': times[len(times) // 2], 'commands': commands}
+        over = (len(commands) > COMMAND_BUDGET or
+                case['median'] > TIME_BUDGET)
+        failed = failed or over
+        print '%-24s %8.3fs %8.3fs %9d  %s%s' % (
+            name, case['best'], case['median'], len(commands),
+            ', '.join(sorted(set(commands))) or '-',
+            '  OVER BUDGET' if over else '')
+        cases.append(case)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'command_budget': COMMAND_BUDGET,
+                       'time_budget': TIME_BUDGET, 'cases': cases}, f,
+                      indent=1, sort_keys=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
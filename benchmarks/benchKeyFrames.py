@@ -0,0 +1,81 @@
+r'''Benchmark of keying long lists of values with 'mayaFuncs.setup_key_frames'.
+
+   Times keying 1,000, 10,000 and 100,000 values onto an attribute with one
+   'setKeyframe' command per value and with the bulk API call, and checks
+   that both make the same keys. The per value commands are skipped above
+   'PER_KEY_LIMIT' keys since they take minutes. The bulk keys are then
+   timed again with the keys reduced to within 'TOLERANCE' of the values.
+
+   This needs Maya's Python interpreter and is run from the root of the
+   repository with:
+   mayapy benchmarks/benchKeyFrames.py
+
+'''
+import os
+import sys
+import time
+import math
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'scripts'))
+
+import maya.standalone
+maya.standalone.initialize(name='python')
+
+import maya.cmds as cmds
+import mayaSnippet.mayaFuncs as mf
+
+KEY_COUNTS = (1000, 10000, 100000)
+PER_KEY_LIMIT = 10000
+TOLERANCE = 0.01
+
+
+def envelope(nKeys):
+    '''Makes a song like envelope of values to key.'''
+    return [abs(math.sin(i * 0.01)) * (1 + 0.5 * math.sin(i * 0.37))
+            for i in range(nKeys)]
+
+
+def time_keys(vals, bulk, fp=0, tolerance=None):
+    '''Keys the values onto a new locator and returns the time taken and the
+    keys made.'''
+    node = cmds.spaceLocator()[0]
+    start = time.time()
+    mf.setup_key_frames(node, 'translateY', vals, fp=fp, bulk=bulk, 
+                        tolerance=tolerance)
+    taken = time.time() - start
+    keys = (cmds.keyframe(node, attribute='translateY', q=True,
+                          timeChange=True),
+            cmds.keyframe(node, attribute='translateY', q=True,
+                          valueChange=True))
+    cmds.delete(node)
+    return taken, keys
+
+
+def run():
+    cmds.file(new=True, force=True)
+    print '%8s %12s %12s %8s' % ('keys', 'setKeyframe', 'bulk', 'speedup')
+    for nKeys in KEY_COUNTS:
+        vals = envelope(nKeys)
+        bulkTime, bulkKeys = time_keys(vals, True, fp=1)
+        if nKeys <= PER_KEY_LIMIT:
+            keyTime, keys = time_keys(vals, False, fp=1)
+            same = (keys[0] == bulkKeys[0] and
+                    max(abs(a - b) for a, b in zip(keys[1], bulkKeys[1]))
+                    < 1e-9)
+            print '%8d %11.3fs %11.3fs %7.0fx%s' % (
+                nKeys, keyTime, bulkTime, keyTime / bulkTime,
+                '' if same else '  KEYS DIFFER')
+        else:
+            print '%8d %12s %11.3fs %8s' % (nKeys, '-', bulkTime, '-')
+    
+    print
+    print '%8s %12s %12s' % ('keys', 'reduced', 'time')
+    for nKeys in KEY_COUNTS:
+        reduceTime, keys = time_keys(envelope(nKeys), True, fp=1, 
+                                     tolerance=TOLERANCE)
+        print '%8d %12d %11.3fs' % (nKeys, len(keys[0]), reduceTime)
+
+
+if __name__ == '__main__':
+    run()
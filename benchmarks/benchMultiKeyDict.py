@@ -0,0 +1,108 @@
+r'''Benchmark of 'mayaSnippet.multi_key_dict' as it grows.
+
+   Fills a 'multi_key_dict' with entries of an int and a str key each, for
+   every size in 'SIZES', then times making it, iterating over it with
+   'items', 'keys' and 'iteritems', looking up every entry and deleting
+   'DELETES' of its entries. Each time is the best of 'REPEAT' runs and is
+   reported per entry.
+
+   Iterating and deleting used to search every key of the dictionary for
+   each entry, so the time per entry grew with the size of the dictionary.
+   If the time per entry of the largest size is more than 'GROWTH_LIMIT'
+   times that of the smallest for any operation, the benchmark exits with 1.
+
+   This doesn't need Maya and is run from the root of the repository with:
+   python benchmarks/benchMultiKeyDict.py [--output results.json]
+
+'''
+import os
+import sys
+import json
+import argparse
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'scripts', 'mayaSnippet'))
+
+from multi_key_dict import multi_key_dict
+
+SIZES = (1000, 10000, 100000)
+DELETES = 1000
+REPEAT = 3
+# The most the time per entry may grow from the smallest to the largest size
+GROWTH_LIMIT = 3.0
+
+
+def fill(size):
+    m = multi_key_dict()
+    for i in xrange(size):
+        m[i, 'key%d' % i] = i
+    return m
+
+
+def lookup(m, size):
+    for i in xrange(size):
+        m['key%d' % i]
+
+
+def delete(m, size):
+    for i in xrange(0, size, size // DELETES):
+        del m['key%d' % i]
+
+
+def iterate(m, size):
+    for _ in m.iteritems():
+        pass
+
+# The operations timed, with the number of entries each works on
+OPERATIONS = (('fill', lambda m, size: fill(size), lambda size: size),
+              ('items', lambda m, size: m.items(), lambda size: size),
+              ('keys', lambda m, size: m.keys(), lambda size: size),
+              ('iteritems', iterate, lambda size: size),
+              ('lookup', lookup, lambda size: size),
+              ('delete', delete, lambda size: DELETES))
+
+
+def run():
+    '''Times every operation for every size, returning the microseconds
+    taken for each entry by operation and size.'''
+    results = {}
+    for size in SIZES:
+        for _ in xrange(REPEAT):
+            m = fill(size)
+            for name, func, count in OPERATIONS:
+                start = timer()
+                func(m, size)
+                taken = 1e6 * (timer() - start) / count(size)
+                times = results.setdefault(name, {})
+                times[size] = min(times.get(size, taken), taken)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='where the JSON results are written')
+    options = parser.parse_args(args)
+
+    results = run()
+    failed = False
+    print '%-10s %s %8s' % ('operation', ' '.join('%10d' % size
+                                                  for size in SIZES), 'growth')
+    for name, _, _ in OPERATIONS:
+        times = results[name]
+        growth = times[SIZES[-1]] / max(times[SIZES[0]], 1e-9)
+        over = growth > GROWTH_LIMIT
+        failed = failed or over
+        print '%-10s %s %7.2fx%s' % (name, ' '.join('%8.2fus' % times[size]
+                                                    for size in SIZES),
+                                     growth, '  NOT LINEAR' if over else '')
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'sizes': SIZES, 'growth_limit': GROWTH_LIMIT,
+                       'us_per_entry': results}, f, indent=1, sort_keys=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+r'''Benchmark of making the height values of a song with 'terrainWave'.
+
+   Writes synthetic songs (sine, noise and silence at 8, 16 and 24 bits with
+   1, 2 and 6 channels) into a temporary folder and times every engine in
+   'ENGINES' making the heights for each number of vertices in 'NVTX', along
+   with how much the peak memory grew. Each engine is run in its own process
+   so that the peak memory of one does not hide another. Engines that do
+   not support a song, such as 'createheightvals' with 8 bit samples or any
+   engine on silence, are recorded with the error they raised. The max diff
+   of each engine is how far its heights are from the first engine that
+   made any, so a difference at 8 or 24 bits shows that the 'struct' based
+   engines read those samples as 16 bit ones.
+
+   The results are written as JSON. When a baseline from an earlier run is
+   given, any case more than 'TIME_THRESHOLD' times slower or using more than
+   'MEMORY_THRESHOLD' times the memory of the baseline is reported and the
+   benchmark exits with 1.
+
+   This doesn't need Maya and is run from the root of the repository with:
+   python benchmarks/benchTerrainWave.py [--full] [--output results.json]
+                                         [--baseline old.json]
+
+   By default every format is 30 seconds long. '--full' also runs 16 bit
+   stereo songs of 5 and 20 minutes.
+
+'''
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import tempfile
+import argparse
+import resource
+import itertools
+import multiprocessing
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'scripts', 'mtg'))
+
+import terrainWave as tw
+
+RATE = 44100
+SIGNALS = ('sine', 'noise', 'silence')
+SAMPLE_WIDTHS = (1, 2, 3)
+CHANNELS = (1, 2, 6)
+DURATIONS = (30,)
+LONG_DURATIONS = (300, 1200)
+NVTX = (100, 10000, 100000)
+HEIGHT = 16.0
+BLOCK_FRAMES = 1 << 20
+
+TIME_THRESHOLD = 1.25
+MEMORY_THRESHOLD = 1.25
+# Differences smaller than these are treated as noise
+TIME_SLACK = 0.05
+MEMORY_SLACK = 2.0
+
+
+def create_heightvals(path, nVtx):
+    return tw.TerrainWaveFile(path).createheightvals(nVtx, HEIGHT)
+
+
+def heightval_steps(path, nVtx):
+    songInfo = tw.TerrainWaveFile(path)
+    for _ in songInfo.heightvalsteps(nVtx, HEIGHT):
+        pass
+    return songInfo.heightvals
+
+
+def song_summary(path, nVtx):
+    summary = tw.SongSummary(path)
+    summary.run()
+    if summary.error is not None:
+        raise summary.error
+    return summary.heightvals(nVtx, HEIGHT)
+
+
+ENGINES = OrderedDict([('createheightvals', create_heightvals),
+                       ('heightvalsteps', heightval_steps),
+                       ('summary', song_summary)])
+
+
+def write_song(path, signal, sampwidth, nchannels, seconds, rate=RATE):
+    '''Writes a synthetic song to 'path' a block of frames at a time.'''
+    song = wave.open(path, 'wb')
+    song.setnchannels(nchannels)
+    song.setsampwidth(sampwidth)
+    song.setframerate(rate)
+    peak = 2 ** (8 * sampwidth - 1) - 1
+    random = np.random.RandomState(0)
+    nframes = int(seconds * rate)
+    for start in xrange(0, nframes, BLOCK_FRAMES):
+        n = min(BLOCK_FRAMES, nframes - start)
+        t = (np.arange(start, start + n) / float(rate))[:, None]
+        if signal == 'sine':
+            freqs = 220.0 * (1 + np.arange(nchannels))[None, :]
+            # a slow swell so that the heights are not all the same
+            amp = 0.5 + 0.5 * np.sin(2 * np.pi * 0.05 * t)
+            values = amp * np.sin(2 * np.pi * freqs * t)
+        elif signal == 'noise':
+            values = random.uniform(-1, 1, (n, nchannels))
+        else:
+            values = np.zeros((n, nchannels))
+        samples = np.round(values * peak).astype(np.int32)
+        if sampwidth == 1:
+            data = (samples + 128).astype(np.uint8).tostring()
+        elif sampwidth == 2:
+            data = samples.astype('<i2').tostring()
+        else:
+            data = samples.astype('<i4').view(np.uint8).reshape(
+                -1, 4)[:, :sampwidth].tostring()
+        song.writeframes(data)
+    song.close()
+
+
+def peak_memory():
+    '''Returns the peak resident memory of this process in megabytes.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def measure(engine, path, nVtx, conn):
+    '''Runs one engine in a child process and sends back its timing.'''
+    result = {'error': None}
+    before = peak_memory()
+    try:
+        start = time.time()
+        heights = ENGINES[engine](path, nVtx)
+        result['time'] = time.time() - start
+        result['heights'] = [float(h) for h in heights]
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    result['peak_mb'] = peak_memory()
+    result['growth_mb'] = result['peak_mb'] - before
+    conn.send(result)
+    conn.close()
+
+
+def run_case(engine, path, nVtx):
+    parent, child = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=measure,
+                                      args=(engine, path, nVtx, child))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def song_matrix(full=False):
+    '''Lists the signal, sample width, channels and length of every song.'''
+    songs = list(itertools.product(SIGNALS, SAMPLE_WIDTHS, CHANNELS,
+                                   DURATIONS))
+    if full:
+        songs += [('sine', 2, 2, seconds) for seconds in LONG_DURATIONS]
+    return songs
+
+
+def run(full=False, engines=None):
+    engines = engines or ENGINES.keys()
+    folder = tempfile.mkdtemp(prefix='mtgBench')
+    cases = []
+    print '%-8s %4s %3s %6s %7s %-17s %9s %9s %9s' % (
+        'signal', 'bits', 'ch', 'length', 'nvtx', 'engine', 'time',
+        'memory', 'max diff')
+    try:
+        for signal, sampwidth, nchannels, seconds in song_matrix(full):
+            path = os.path.join(folder, '%s_%d_%d_%d.wav' % (
+                signal, sampwidth * 8, nchannels, seconds))
+            write_song(path, signal, sampwidth, nchannels, seconds)
+            for nVtx in NVTX:
+                reference = None
+                for engine in engines:
+                    result = run_case(engine, path, nVtx)
+                    heights = result.pop('heights', None)
+                    result['max_diff'] = None
+                    if heights is not None:
+                        if reference is None:
+                            reference = np.array(heights)
+                        else:
+                            result['max_diff'] = float(np.abs(
+                                np.array(heights) - reference).max())
+                    result.update(signal=signal, bits=sampwidth * 8,
+                                  channels=nchannels, seconds=seconds,
+                                  nvtx=nVtx, engine=engine)
+                    cases.append(result)
+                    if result['error']:
+                        timing = result['error']
+                    else:
+                        timing = '%8.3fs %7.1fMB %9s' % (
+                            result['time'], result['growth_mb'],
+                            '-' if result['max_diff'] is None
+                            else '%.2g' % result['max_diff'])
+                    print '%-8s %4d %3d %5ds %7d %-17s %s' % (
+                        signal, sampwidth * 8, nchannels, seconds, nVtx,
+                        engine, timing)
+            os.remove(path)
+    finally:
+        shutil.rmtree(folder)
+    return {'python': sys.version.split()[0], 'numpy': np.__version__,
+            'platform': sys.platform, 'rate': RATE,
+            'time_threshold': TIME_THRESHOLD,
+            'memory_threshold': MEMORY_THRESHOLD, 'cases': cases}
+
+
+def case_key(case):
+    return tuple(case[k] for k in ('signal', 'bits', 'channels', 'seconds',
+                                   'nvtx', 'engine'))
+
+
+def regressions(results, baseline):
+    '''Lists the cases that are slower or use more memory than the baseline
+    by more than the thresholds.'''
+    old = dict((case_key(case), case) for case in baseline['cases'])
+    found = []
+    for case in results['cases']:
+        before = old.get(case_key(case))
+        if before is None or case['error'] or before['error']:
+            continue
+        if case['time'] > max(before['time'] * TIME_THRESHOLD,
+                              before['time'] + TIME_SLACK):
+            found.append((case, 'time', before['time'], case['time']))
+        if case['growth_mb'] > max(before['growth_mb'] * MEMORY_THRESHOLD,
+                                   before['growth_mb'] + MEMORY_SLACK):
+            found.append((case, 'memory', before['growth_mb'],
+                          case['growth_mb']))
+    return found
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--full', action='store_true',
+                        help='also run 5 and 20 minute songs')
+    parser.add_argument('--engine', action='append', choices=ENGINES.keys(),
+                        help='only run this engine, can be given again')
+    parser.add_argument('--output', default='benchTerrainWave.json',
+                        help='where the JSON results are written')
+    parser.add_argument('--baseline',
+                        help='JSON results of an earlier run to compare to')
+    options = parser.parse_args(args)
+
+    results = run(options.full, options.engine)
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print 'Results written to %s' % options.output
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            found = regressions(results, json.load(f))
+        for case, kind, before, after in found:
+            print 'REGRESSION %s %s: %.3f -> %.3f' % (
+                ' '.join(str(k) for k in case_key(case)), kind, before, after)
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
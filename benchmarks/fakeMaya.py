@@ -0,0 +1,493 @@
+r'''A stand-in for the parts of Maya used by 'mtgMain' and 'mayaFuncs' so that
+   the number of Maya commands they issue can be measured without Maya.
+
+   'install' puts fake 'maya.cmds', 'maya.mel', 'maya.utils', 'maya.OpenMaya'
+   and 'maya.api' modules into 'sys.modules', and must be called before
+   'mtgMain' or 'mayaFuncs' are imported. The fake 'cmds' keeps an in-memory
+   scene of poly planes and shading nodes with their attributes and
+   connections, and records the name and time of every command called on
+   it. Commands it does not know are recorded and return None. The meshes of
+   the poly planes can be read in bulk through the API 2.0 'MFnMesh', and
+   array attributes must be set in the same form as Maya's 'setAttr' takes
+   them, so that setting them wrongly fails here as it would in Maya.
+
+   This is only a stand-in for measuring commands, not a copy of Maya. Soft
+   select never reaches past the selected vertex, every vertex normal points
+   up, and only the node types and attributes in 'NODE_TYPES' exist.
+
+       >>> cmds = install()
+       >>> plane = cmds.polyPlane(w=2, h=2, sx=1, sy=1)[0]
+       >>> cmds.select('%s.vtx[3]' % plane, replace=True)
+       >>> cmds.move(0.5, relative=True, moveY=True)
+       >>> cmds.pointPosition('%s.vtx[3]' % plane, w=True)
+       [1.0, 0.5, -1.0]
+       >>> cmds.counts['move'], len(cmds.calls)
+       (1, 4)
+       >>> shape = cmds.particle(name='dots')[1]
+       >>> cmds.addAttr(shape, ln='scalePP', dt='vectorArray')
+       >>> cmds.setAttr('%s.scalePP' % shape, 2, (1, 1, 1), (2, 2, 2),
+       ...              type='vectorArray')
+       >>> cmds.setAttr('%s.scalePP' % shape, [(1, 1, 1)], type='vectorArray')
+       Traceback (most recent call last):
+       RuntimeError: setAttr: the number of vectors must come first
+
+'''
+import re
+import sys
+import time
+import types
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+# The classification, attribute types and default values of the node types
+# the stand-in can create. Attributes ending in '[]' are multi attributes
+# whose elements have the children listed in 'MULTI_CHILDREN'.
+NODE_TYPES = {
+    'noise': ('texture', {'ratio': 0.707, 'frequencyRatio': 2.0,
+                          'depthMax': 3, 'time': 0.0, 'frequency': 8.0,
+                          'spottyness': 0.1, 'sizeRand': 0.0, 'falloff': 0,
+                          'outColor': (0, 0, 0), 'outAlpha': 0.0}),
+    'file': ('texture', {'fileTextureName': '', 'filterType': 3,
+                         'outColor': (0, 0, 0), 'outAlpha': 0.0}),
+    'ramp': ('texture', {'uWave': 0.0, 'vWave': 0.0, 'interpolation': 1,
+                         'type': 0, 'noise': 0.0, 'noiseFreq': 0.5,
+                         'uv': (0, 0), 'colorEntryList[]': 3,
+                         'outColor': (0, 0, 0), 'outAlpha': 0.0}),
+    'layeredTexture': ('texture', {'inputs[]': 1, 'outColor': (0, 0, 0),
+                                   'outAlpha': 0.0}),
+    'snow': ('texture', {'threshold': 0.5, 'surfaceColor': (0, 0, 0),
+                         'pm': (0,) * 16, 'outColor': (0, 0, 0)}),
+    'place2dTexture': ('utility', {'repeatU': 1.0, 'repeatV': 1.0,
+                                   'noiseU': 0.0, 'noiseV': 0.0,
+                                   'outUV': (0, 0)}),
+    'place3dTexture': ('utility', {'wim[]': 1}),
+    'projection': ('utility', {'vAngle': 180.0, 'uAngle': 360.0,
+                               'projType': 1, 'image': (0, 0, 0),
+                               'pm': (0,) * 16, 'outColor': (0, 0, 0),
+                               'outAlpha': 0.0}),
+    'multiplyDivide': ('utility', {'input1': (0, 0, 0), 'input2X': 1.0,
+                                   'input2Y': 1.0, 'input2Z': 1.0,
+                                   'output': (0, 0, 0)}),
+    'bump3d': ('utility', {'bumpDepth': 1.0, 'bumpValue': 0.0,
+                           'outNormal': (0, 0, 0)}),
+    'lambert': ('shader', {'color': (0.5, 0.5, 0.5),
+                           'normalCamera': (0, 0, 0),
+                           'outColor': (0, 0, 0)}),
+    'shadingEngine': ('utility', {'surfaceShader': (0, 0, 0)}),
+}
+
+MULTI_CHILDREN = {'colorEntryList': {'position': 0.0, 'color': (0, 0, 0)},
+                  'inputs': {'color': (0, 0, 0), 'alpha': 1.0,
+                             'blendMode': 1},
+                  'wim': {'': (0,) * 16}}
+
+COMPONENT = re.compile(r'^(.*)\.vtx\[(\d+)\]$')
+
+
+def attr_type(value):
+    '''Returns the Maya type name of a default attribute value.'''
+    if isinstance(value, basestring):
+        return 'string'
+    if isinstance(value, tuple):
+        return {2: 'float2', 3: 'float3', 16: 'matrix'}[len(value)]
+    if isinstance(value, int):
+        return 'long'
+    return 'double'
+
+
+class Node(object):
+    '''A node of the fake scene with its type and attribute values.'''
+    def __init__(self, name, nodeType):
+        self.name = name
+        self.type = nodeType
+        self.attrs = OrderedDict()
+        for attr, value in NODE_TYPES.get(nodeType, ('', {}))[1].items():
+            if attr.endswith('[]'):
+                for i in range(value):
+                    self.add_element(attr[:-2], i)
+            else:
+                self.attrs[attr] = value
+
+    def add_element(self, multi, index):
+        for child, value in MULTI_CHILDREN[multi].items():
+            name = '%s[%d]%s' % (multi, index, '.' + child if child else '')
+            self.attrs.setdefault(name, value)
+
+    def remove_element(self, multi, index):
+        prefix = '%s[%d]' % (multi, index)
+        for name in list(self.attrs):
+            if name == prefix or name.startswith(prefix + '.'):
+                del self.attrs[name]
+
+    def ensure(self, attr):
+        '''Makes the element of a multi attribute if it doesn't exist.'''
+        match = re.match(r'^(\w+)\[(\d+)\]', attr)
+        if match and match.group(1) in MULTI_CHILDREN:
+            self.add_element(match.group(1), int(match.group(2)))
+        self.attrs.setdefault(attr, 0.0)
+
+
+class FakeCmds(object):
+    '''The stand-in for 'maya.cmds'. Every command called is recorded.
+
+    Attributes:
+        calls [list]    : A 2 tuple of the name and the seconds taken of
+                          every command called.
+        counts [object] : A 'Counter' of the number of calls of each command.
+        nodes [dict]    : The nodes of the scene by name.
+        points [dict]   : The (n, 3) array of points of each mesh transform.
+        selection [list] : The currently selected objects and components.
+        connections [list] : A 2 tuple of the source and destination plugs
+                             of every connection.
+
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        '''Empties the scene and the record of commands.'''
+        self.calls = []
+        self.counts = Counter()
+        self.nodes = OrderedDict()
+        self.points = {}
+        self.grids = {}
+        self.selection = []
+        self.connections = []
+        self.softSelectOn = False
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name.startswith('cmd_'):
+            raise AttributeError(name)
+        func = getattr(self, 'cmd_' + name, lambda *args, **kwargs: None)
+        return self.recorded(name, func)
+
+    def recorded(self, name, func):
+        def command(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.calls.append((name, time.time() - start))
+                self.counts[name] += 1
+        command.__name__ = name
+        return command
+
+    def unique_name(self, base):
+        i = 1
+        while '%s%d' % (base, i) in self.nodes:
+            i += 1
+        return '%s%d' % (base, i)
+
+    def create_node(self, nodeType, name=None):
+        if name is None or name in self.nodes:
+            name = self.unique_name(name or nodeType)
+        self.nodes[name] = Node(name, nodeType)
+        return name
+
+    def plug(self, plug):
+        node, attr = plug.split('.', 1)
+        if node not in self.nodes:
+            raise ValueError('No object matches name: %s' % plug)
+        return self.nodes[node], attr
+
+    def vertex_ids(self, objs):
+        '''Returns the transform and vertex ids of the selected vertices.'''
+        found = []
+        for obj in objs:
+            match = COMPONENT.match(obj)
+            if match:
+                found.append((match.group(1).lstrip('|'),
+                              int(match.group(2))))
+        return found
+
+    # Scene and mesh commands
+
+    def cmd_allNodeTypes(self):
+        return sorted(NODE_TYPES)
+
+    def cmd_listNodeTypes(self, classification):
+        return sorted(t for t, (c, _) in NODE_TYPES.items()
+                      if c == classification)
+
+    def cmd_polyPlane(self, name=None, w=1.0, h=1.0, sx=10, sy=10,
+                      width=None, height=None, **kwargs):
+        w = width if width is not None else w
+        h = height if height is not None else h
+        transform = self.create_node('transform', name or 'pPlane1')
+        self.create_node('mesh', '%sShape' % transform)
+        history = self.create_node('polyPlane')
+        xs = np.linspace(-w / 2.0, w / 2.0, sx + 1)
+        zs = np.linspace(h / 2.0, -h / 2.0, sy + 1)
+        x, z = np.meshgrid(xs, zs)
+        self.points[transform] = np.column_stack(
+            (x.ravel(), np.zeros(x.size), z.ravel()))
+        self.grids[transform] = (sx, sy)
+        return [transform, history]
+
+    def cmd_polyEvaluate(self, obj=None, v=False, vertex=False, **kwargs):
+        if obj is None:
+            obj = self.selection[0]
+        return len(self.points[obj.lstrip('|')])
+
+    def cmd_objExists(self, name):
+        return name.split('.')[0].lstrip('|') in self.nodes
+
+    def cmd_listRelatives(self, obj, type=None, shapes=False, **kwargs):
+        shape = '%sShape' % obj.lstrip('|')
+        if shape in self.nodes and type in (None, 'mesh'):
+            return [shape]
+        return None
+
+    def cmd_select(self, *objs, **kwargs):
+        if kwargs.get('clear') or kwargs.get('cl'):
+            self.selection = []
+        elif kwargs.get('add'):
+            self.selection.extend(objs)
+        else:
+            self.selection = list(objs)
+
+    def cmd_ls(self, *objs, **kwargs):
+        if kwargs.get('selection') or kwargs.get('sl'):
+            return list(self.selection)
+        return [o for o in objs if self.cmd_objExists(o)]
+
+    def cmd_softSelect(self, **kwargs):
+        if kwargs.get('q') or kwargs.get('query'):
+            return int(self.softSelectOn)
+        if 'sse' in kwargs:
+            self.softSelectOn = bool(kwargs['sse'])
+
+    def cmd_move(self, *vals, **kwargs):
+        axes = ''
+        for key, on in kwargs.items():
+            if key.startswith('move') and on:
+                axes = key[4:].lower()
+        vals = list(vals) + [vals[-1]] * (len(axes) - len(vals))
+        for obj, i in self.vertex_ids(self.selection):
+            for a, val in zip(axes, vals):
+                self.points[obj][i, 'xyz'.index(a)] += val
+
+    def cmd_moveVertexAlongDirection(self, *objs, **kwargs):
+        verts = self.vertex_ids(objs or self.selection)
+        for (obj, i), d, m in zip(verts, kwargs['direction'],
+                                  kwargs['magnitude']):
+            self.points[obj][i] += np.asarray(d) * m
+
+    def cmd_polyNormalPerVertex(self, comp, **kwargs):
+        return [0.0, 1.0, 0.0] * 4
+
+    def cmd_pointPosition(self, comp, **kwargs):
+        (obj, i), = self.vertex_ids([comp])
+        return self.points[obj][i].tolist()
+
+    def cmd_delete(self, *objs):
+        for obj in objs:
+            self.nodes.pop(obj, None)
+            self.points.pop(obj, None)
+            self.connections = [c for c in self.connections
+                                if obj not in (c[0].split('.')[0],
+                                               c[1].split('.')[0])]
+
+    # Shading node commands
+
+    def cmd_shadingNode(self, nodeType, name=None, **kwargs):
+        return self.create_node(nodeType, name)
+
+    def cmd_sets(self, *objs, **kwargs):
+        return self.create_node('shadingEngine', kwargs.get('name'))
+
+    def cmd_listAttr(self, node, shortNames=False, sn=False, **kwargs):
+        if shortNames or sn:
+            return []
+        return list(self.nodes[node].attrs)
+
+    def cmd_getAttr(self, plug, type=False, mi=False, **kwargs):
+        node, attr = self.plug(plug)
+        if mi:
+            prefix = re.compile(r'^%s\[(\d+)\]' % re.escape(attr))
+            return sorted(set(int(m.group(1)) for m in
+                              map(prefix.match, node.attrs) if m))
+        if attr not in node.attrs:
+            raise ValueError('No attribute %s' % plug)
+        value = node.attrs[attr]
+        if type:
+            return attr_type(value)
+        return [value] if isinstance(value, tuple) else value
+
+    def cmd_setAttr(self, plug, *vals, **kwargs):
+        node, attr = self.plug(plug)
+        dataType = kwargs.get('type')
+        if dataType == 'vectorArray':
+            # Maya takes the number of vectors followed by each vector
+            if (not vals or not isinstance(vals[0], int) or
+                    vals[0] != len(vals) - 1 or
+                    any(len(v) != 3 for v in vals[1:])):
+                raise RuntimeError('setAttr: the number of vectors must come '
+                                   'first')
+            vals = ([tuple(v) for v in vals[1:]],)
+        elif dataType in ('doubleArray', 'Int32Array'):
+            if len(vals) != 1 or not isinstance(vals[0], (list, tuple)):
+                raise RuntimeError('setAttr: a %s is set from one list' %
+                                   dataType)
+        node.ensure(attr)
+        node.attrs[attr] = vals[0] if len(vals) == 1 else tuple(vals)
+
+    def cmd_addAttr(self, node, ln=None, dt=None, **kwargs):
+        self.nodes[node].attrs[ln] = [] if dt else 0.0
+
+    # Particle commands
+
+    def cmd_particle(self, position=None, name=None, **kwargs):
+        transform = self.create_node('transform', name or 'particle1')
+        shape = self.create_node('particle', '%sShape' % transform)
+        self.points[shape] = np.array(position or [], dtype=np.float64)
+        return [transform, shape]
+
+    def cmd_particleInstancer(self, particle, **kwargs):
+        return self.create_node('instancer')
+
+    def cmd_connectAttr(self, src, dst, **kwargs):
+        srcNode, srcAttr = self.plug(src)
+        dstNode, dstAttr = self.plug(dst)
+        dstNode.ensure(dstAttr)
+        self.connections.append((src, dst))
+
+    def cmd_removeMultiInstance(self, plug, **kwargs):
+        node, attr = self.plug(plug)
+        match = re.match(r'^(\w+)\[(\d+)\]$', attr)
+        node.remove_element(match.group(1), int(match.group(2)))
+
+    def cmd_defaultNavigation(self, source=None, destination=None, **kwargs):
+        self.connections.append(('%s.message' % source,
+                                  '%s.message' % destination))
+
+
+class _Selection(object):
+    '''The parts of the API 1.0 classes used by 'mayaFuncs.soft_selection'.
+    The rich selection is the selected vertices, as soft select never
+    reaches past them in the stand-in.'''
+    def __init__(self, *args):
+        self.items = []
+        self.index = 0
+        self.name = None
+        self.ids = []
+
+    def getSelection(self, selection):
+        selection.items = CMDS.vertex_ids(CMDS.selection)
+
+    def isDone(self):
+        return self.index >= len(self.items)
+
+    def getDagPath(self, dagPath, component):
+        dagPath.name, index = self.items[self.index]
+        component.ids = [index]
+
+    def next(self):
+        self.index += 1
+
+    def pop(self):
+        pass
+
+    def fullPathName(self):
+        return '|%s' % self.name
+
+    def elementCount(self):
+        return len(self.ids)
+
+    def element(self, i):
+        return self.ids[i]
+
+
+class _MeshPath(object):
+    '''The parts of the API 2.0 'MSelectionList' and 'MDagPath' used by
+    'mayaFuncs.get_mesh_fn'.'''
+    def __init__(self, names=None):
+        self.names = names or []
+
+    def add(self, name):
+        self.names.append(name.lstrip('|'))
+
+    def getDagPath(self, index):
+        return _MeshPath([self.names[index]])
+
+    def extendToShape(self):
+        pass
+
+
+class _MeshFn(object):
+    '''The parts of the API 2.0 'MFnMesh' used to read a poly plane in bulk.
+    Every vertex normal points up, as with 'polyNormalPerVertex'.'''
+    def __init__(self, dagPath):
+        self.name = dagPath.names[0]
+        self.numVertices = len(CMDS.points[self.name])
+
+    def getPoints(self, space=None):
+        return [tuple(p) + (1.0,) for p in CMDS.points[self.name].tolist()]
+
+    def getVertexNormals(self, angleWeighted, space=None):
+        return [(0.0, 1.0, 0.0)] * self.numVertices
+
+    def getVertices(self):
+        sx, sy = CMDS.grids[self.name]
+        corner = (np.arange(sy)[:, None] * (sx + 1) +
+                  np.arange(sx)[None, :]).ravel()
+        faces = np.column_stack((corner, corner + 1, corner + sx + 2,
+                                 corner + sx + 1))
+        return [4] * len(faces), faces.ravel().tolist()
+
+
+def _item_iterator(selection, filterType=None):
+    iterator = _Selection()
+    iterator.items = selection.items
+    return iterator
+
+
+def _component_fn(component):
+    return component
+
+
+def _rich_selection(rich):
+    CMDS.counts['OpenMaya.getRichSelection'] += 1
+    CMDS.calls.append(('OpenMaya.getRichSelection', 0.0))
+
+
+CMDS = FakeCmds()
+
+
+def module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    sys.modules[name] = mod
+    return mod
+
+
+def install():
+    '''Puts the stand-in Maya modules into 'sys.modules', replacing any that
+    are there, and returns the fake 'cmds' with an empty scene.'''
+    CMDS.reset()
+    om = module('maya.OpenMaya',
+                MSelectionList=_Selection, MRichSelection=_Selection,
+                MDagPath=_Selection, MObject=_Selection,
+                MItSelectionList=_item_iterator,
+                MFnSingleIndexedComponent=_component_fn,
+                MFn=type('MFn', (object,), {'kMeshVertComponent': 550}),
+                MGlobal=type('MGlobal', (object,), {
+                    'getRichSelection': staticmethod(_rich_selection)}))
+    mel = module('maya.mel', eval=CMDS.recorded('mel.eval',
+                                                lambda *args: None))
+    utils = module('maya.utils',
+                   executeDeferred=lambda func, *a, **k: func(*a, **k),
+                   executeInMainThreadWithResult=(
+                       lambda func, *a, **k: func(*a, **k)),
+                   processIdleEvents=lambda: None)
+    om2 = module('maya.api.OpenMaya',
+                 MSelectionList=_MeshPath, MFnMesh=_MeshFn,
+                 MSpace=type('MSpace', (object,), {'kWorld': 4,
+                                                   'kObject': 2}))
+    om2a = module('maya.api.OpenMayaAnim')
+    api = module('maya.api', OpenMaya=om2, OpenMayaAnim=om2a)
+    module('maya', cmds=CMDS, mel=mel, utils=utils, OpenMaya=om, api=api,
+           __path__=[])
+    sys.modules['maya.cmds'] = CMDS
+    return CMDS
@@ -30,19 +30,26 @@ import random as rand
 try:
     import maya.cmds as cmds
     import maya.OpenMaya as om
+    import maya.api.OpenMaya as om2
+    import maya.api.OpenMayaAnim as om2a
     import maya.mel as mel
 except:
     pass
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from multi_key_dict import multi_key_dict
 
-uAll_NODES = cmds.allNodeTypes()
+SHADING_CLASSIFICATIONS = ('shader', 'texture', 'light', 'postProcess', 
+                           'utility')
 
-uALL_SHADING_NODES = cmds.listNodeTypes('shader') + \
-                     cmds.listNodeTypes('texture') + \
-                     cmds.listNodeTypes('light') + \
-                     cmds.listNodeTypes('postProcess') + \
-                     cmds.listNodeTypes('utility')
+# The node types and MEL scripts are only listed and sourced the first time 
+# they are needed, so that importing this module does not call Maya
+_NODE_TYPES = {}
+SOURCED_MEL = set()
                      
 UNPACK_TYPES = [u'short2', u'short3', u'long2', u'long3', u'float2', u'float3',
                 u'double2', u'double3', u'matrix', u'pointArray', 
@@ -136,7 +143,133 @@ def setup_graph_values(gVals):
     return [','.join(split[i:i+3]).strip() for i in range(0,len(split),3)]
 
 
-def setup_key_frames(node, attr, vals, fp=0):
+def key_frame_times(nKeys, fp=0):
+    '''Works out the frame of each key set by 'setup_key_frames'.
+    
+    Parameters:
+        nKeys [int] : The number of keys.
+        fp [int]    : The number of frames in-between each of the keyframes.
+    
+    On Exit:
+        Returns a list of the frame of each key, starting at frame 1.
+    
+    '''
+    step = 1+fp if fp >= 1 else 1
+    return [step*i+1 for i in range(nKeys)]
+
+
+def reduce_keys(times, vals, tolerance):
+    '''Removes keys from a dense curve, such as a song envelope, keeping the 
+    fewest keys that stay within 'tolerance' of every original value when 
+    the kept keys are joined with straight lines (Ramer-Douglas-Peucker). 
+    All of the curve segments that still need splitting are split at the 
+    same time, so each pass is a few NumPy operations over all the keys.
+    
+    Parameters:
+        times [list]      : The frame of each key, in increasing order.
+        vals [list]       : The value of each key.
+        tolerance [float] : The largest difference in value allowed between 
+                            the original keys and the reduced curve.
+    
+    On Exit:
+        Returns a 2 tuple of the lists of the times and values of the kept 
+        keys. The first and last keys are always kept.
+    
+    '''
+    times = np.asarray(times, dtype=np.float64)
+    vals = np.asarray(vals, dtype=np.float64)
+    if len(times) < 3:
+        return times.tolist(), vals.tolist()
+    kept = [np.array([0, len(times)-1])]
+    firsts = np.array([0])
+    lasts = np.array([len(times)-1])
+    while len(firsts) > 0:
+        # every key inside of the segments that still need checking
+        lengths = lasts - firsts - 1
+        starts = np.cumsum(lengths) - lengths
+        segment = np.repeat(np.arange(len(firsts)), lengths)
+        inner = np.arange(lengths.sum()) - starts[segment] + firsts[segment] + 1
+        first = firsts[segment]
+        last = lasts[segment]
+        blend = (times[inner] - times[first]) / (times[last] - times[first])
+        error = np.abs(vals[inner] - 
+                       (vals[first] + blend*(vals[last] - vals[first])))
+        
+        hasKeys = lengths > 0
+        worst = np.zeros(len(firsts))
+        worst[hasKeys] = np.maximum.reduceat(error, starts[hasKeys])
+        split = worst > tolerance
+        candidates = np.flatnonzero((error == worst[segment]) & 
+                                    split[segment])
+        _, firstFound = np.unique(segment[candidates], return_index=True)
+        middles = inner[candidates[firstFound]]
+        kept.append(middles)
+        firsts = np.concatenate((firsts[split], middles))
+        lasts = np.concatenate((middles, lasts[split]))
+    kept = np.unique(np.concatenate(kept))
+    return times[kept].tolist(), vals[kept].tolist()
+
+
+def bulk_key_frames(node, attr, vals, fp=0, times=None, linear=False):
+    '''Used to keyframe a list of values onto a nodes attribute with a single
+    API call, by adding all of the keys to the attributes animation curve at
+    once. If the attribute has no animation curve, one is made. The keys are
+    on the same frames as 'setup_key_frames' and replace any keys already on
+    those frames. Unlike 'setKeyframe', the keys are not added to the undo 
+    queue.
+    
+    Parameters:
+        node [str]   : The name of the node or object to which the attribute
+                       'attr' applies to.
+        attr [str]   : The name of the attribute to key.
+        vals [tuple]         : The values to key, in the scenes UI units.
+        fp [int]             : The number of frames in-between each of the 
+                               keyframes.
+        times [None][tuple]  : If not None, the frame of each value, used 
+                               instead of 'fp'.
+        linear [bool]        : If True, the keys have linear tangents. Else, 
+                               the default tangents are used.
+    
+    On Exit:
+        Keys the values onto the attribute and returns the name of the 
+        animation curve.
+    
+    '''
+    plugName = '%s.%s' % (node, attr)
+    selection = om2.MSelectionList()
+    selection.add(plugName)
+    plug = selection.getPlug(0)
+    
+    curveFn = om2a.MFnAnimCurve()
+    curves = cmds.listConnections(plugName, source=True, destination=False, 
+                                  type='animCurve') or []
+    if curves != []:
+        selection.add(curves[0])
+        curveFn.setObject(selection.getDependNode(1))
+    else:
+        curveFn.create(plug)
+    
+    scale = 1.0
+    if curveFn.animCurveType in (om2a.MFnAnimCurve.kAnimCurveTA, 
+                                 om2a.MFnAnimCurve.kAnimCurveUA):
+        scale = om2.MAngle(1.0, om2.MAngle.uiUnit()).asRadians()
+    elif curveFn.animCurveType in (om2a.MFnAnimCurve.kAnimCurveTL, 
+                                   om2a.MFnAnimCurve.kAnimCurveUL):
+        scale = om2.MDistance(1.0, om2.MDistance.uiUnit()).asCentimeters()
+    
+    if times is None:
+        times = key_frame_times(len(vals), fp)
+    tangent = om2a.MFnAnimCurve.kTangentGlobal
+    if linear:
+        tangent = om2a.MFnAnimCurve.kTangentLinear
+    unit = om2.MTime.uiUnit()
+    times = om2.MTimeArray([om2.MTime(t, unit) for t in times])
+    values = om2.MDoubleArray([float(v)*scale for v in vals])
+    curveFn.addKeys(times, values, tangent, tangent, True)
+    return curveFn.name()
+
+
+def setup_key_frames(node, attr, vals, fp=0, bulk=False, tolerance=None):
     '''Used to setup a list of values to a nodes attribute and keyframe them 
     with optional padding.
     
@@ -149,22 +282,37 @@ def setup_key_frames(node, attr, vals, fp=0):
                        attribute.
         fp [int]     : The number of frames in-between each of the keyframes
                        for which the values will be set to.
+        bulk [bool]  : If True, all the keys are added in one API call (see 
+                       'bulk_key_frames') instead of one 'setKeyframe' 
+                       command for each value.
+        tolerance [None][float] : If not None, the keys are reduced to the 
+                                  fewest keys within this difference of the 
+                                  values (see 'reduce_keys') and are given 
+                                  linear tangents.
                        
     On Exit:
         Sets the values to the nodes attribute and keyframes it. It will also
-        framepad for any value higher then 0.
+        framepad for any value higher then 0. Returns a 2 tuple of the number
+        of keys set and the number of values, showing how many keys were 
+        removed by the reduction.
     
     '''
-    if isinstance(vals, (tuple,list)):
-        for i in range(len(vals)):
-            if fp >= 1:
-                time = (1+fp)*i+1
-            else:
-                time = 1+i
-            cmds.setKeyframe(node, time=time, attribute=attr,
-                            value=vals[i])
-    else:
+    if not(isinstance(vals, (tuple,list))):
         raise ValueError('%s is not a list or tuple type' % vals)
+    nVals = len(vals)
+    times = key_frame_times(nVals, fp)
+    tangents = {}
+    if tolerance is not None:
+        times, vals = reduce_keys(times, vals, tolerance)
+        tangents = {'inTangentType': 'linear', 'outTangentType': 'linear'}
+    if bulk:
+        bulk_key_frames(node, attr, vals, times=times, 
+                        linear=tolerance is not None)
+    else:
+        for time, val in zip(times, vals):
+            cmds.setKeyframe(node, time=time, attribute=attr, value=val, 
+                             **tangents)
+    return (len(times), nVals)
 
    
 def mel_file_import(name):
@@ -180,6 +328,41 @@ def mel_file_import(name):
         
     '''
     mel.eval('source %s.mel' % name)
+    SOURCED_MEL.add(name)
+
+def mel_file_require(name):
+    '''Imports a mel script into the Maya scene the first time it is needed, 
+    so that it is not sourced again each time it is used.
+    
+    Parameters:
+        name [str] : The name of the source script inside the Maya directory
+                     to be imported.
+    
+    On Exit:
+        The Maya script will be imported into the scene if it has not been 
+        already.
+        
+    '''
+    if name not in SOURCED_MEL:
+        mel_file_import(name)
+
+def all_node_types():
+    '''Returns a set of the names of all the node types in Maya. The node 
+    types are listed the first time this is called and kept after that.'''
+    if 'all' not in _NODE_TYPES:
+        _NODE_TYPES['all'] = frozenset(cmds.allNodeTypes())
+    return _NODE_TYPES['all']
+
+def shading_node_types():
+    '''Returns a set of the names of all the shading node types in Maya, 
+    the types of each of the 'SHADING_CLASSIFICATIONS'. The node types are 
+    listed the first time this is called and kept after that.'''
+    if 'shading' not in _NODE_TYPES:
+        types = set()
+        for classification in SHADING_CLASSIFICATIONS:
+            types.update(cmds.listNodeTypes(classification) or [])
+        _NODE_TYPES['shading'] = frozenset(types)
+    return _NODE_TYPES['shading']
 
 
 def poly_check(dagObj):
@@ -304,7 +487,7 @@ def check_shader_node(sNode):
         Returns True if 'sNode' is a shader node, else returns False
         
     '''
-    return True if unicode(sNode) in uALL_SHADING_NODES else False
+    return unicode(sNode) in shading_node_types()
         
 
 def create_shader_node(node, flags=False, **kwargs):
@@ -436,14 +619,27 @@ def get_vertex_normals(pObject):
         face normal.
     
     '''
-    lsVtxNormals = []
+    return list(iter_vertex_normals(pObject))
+
+def iter_vertex_normals(pObject):
+    '''Gathers the normal directions of the vertices of a poly object one 
+    vertex at a time, so that they can be stored in a more compact form than 
+    a list of lists.
+    
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+    
+    On Exit:
+        A generator yielding the normal of each vertex in order, averaged 
+        from each adjacent face normal (see 'get_vertex_normals').
+    
+    '''
     nVtx = cmds.polyEvaluate(pObject, vertex=True)
     for i in range(nVtx):
         xyzNorm = cmds.polyNormalPerVertex('%s.vtx[%d]' % (pObject, i), q=True, xyz=True)
         vtxNormal = [sum([xyzNorm[i] for i in range(0+x, len(xyzNorm), 3)]) / \
                      (len(xyzNorm)/3) for x in range(3)]
-        lsVtxNormals.append(vtxNormal)
-    return lsVtxNormals
+        yield vtxNormal
     
 def point_positions(pObject):
     '''Finds the location of all the vertex points of a polygonal object in
@@ -460,6 +656,207 @@ def point_positions(pObject):
     return [cmds.pointPosition('%s.vtx[%d]' % (pObject,i), w=True) \
             for i in range(nOfVerts)]
   
+def get_mesh_fn(pObject):
+    '''Gets the Maya API 2.0 mesh function set for a polygonal object so that
+    its data can be read and written in bulk instead of one vertex at a time.
+
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+
+    On Exit:
+        Returns the 'MFnMesh' of the objects mesh shape.
+
+    '''
+    selection = om2.MSelectionList()
+    selection.add(pObject)
+    dagPath = selection.getDagPath(0)
+    dagPath.extendToShape()
+    return om2.MFnMesh(dagPath)
+
+
+def point_array(pObject, world=True):
+    '''Finds the location of all the vertex points of a polygonal object with
+    a single API call.
+
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+        world [bool]  : If True, the points are in world space. Else, they
+                        are in object space.
+
+    On Exit:
+        Returns a (n, 3) NumPy array of all the vertex point positions of the
+        object.
+
+    '''
+    space = om2.MSpace.kWorld if world else om2.MSpace.kObject
+    points = get_mesh_fn(pObject).getPoints(space)
+    return np.array(list(points), dtype=np.float64)[:, :3]
+
+
+def set_point_array(pObject, points, world=True):
+    '''Moves all the vertex points of a polygonal object with a single API
+    call. This is not undoable, so the old points should be kept if they are
+    needed again.
+
+    Parameters:
+        pObject [str]  : The name of a polygonal object from the scene.
+        points [array] : A (n, 3) array of the new point positions, one for
+                         each vertex of the object.
+        world [bool]   : If True, the points are in world space. Else, they
+                         are in object space.
+
+    On Exit:
+        The vertices of the object are moved to 'points'.
+
+    '''
+    space = om2.MSpace.kWorld if world else om2.MSpace.kObject
+    meshFn = get_mesh_fn(pObject)
+    meshFn.setPoints(om2.MPointArray(np.asarray(points).tolist()), space)
+    meshFn.updateSurface()
+
+
+def normal_array(pObject, world=True):
+    '''Gathers all the vertex normals of a polygonal object with a single API
+    call.
+
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+        world [bool]  : If True, the normals are in world space. Else, they
+                        are in object space.
+
+    On Exit:
+        Returns a (n, 3) NumPy array of all the vertex normals, averaged from
+        each adjacent face normal.
+
+    '''
+    space = om2.MSpace.kWorld if world else om2.MSpace.kObject
+    normals = get_mesh_fn(pObject).getVertexNormals(False, space)
+    return np.array(list(normals), dtype=np.float64)
+
+
+def mesh_connectivity(pObject):
+    '''Gathers how the vertices of a polygonal object are joined into faces
+    with a single API call.
+
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+
+    On Exit:
+        Returns a 2 tuple of NumPy arrays of the number of vertices of each 
+        face and the vertex ids of every face, one face after the other.
+
+    '''
+    counts, vertexIds = get_mesh_fn(pObject).getVertices()
+    return (np.array(counts, dtype=np.int64), 
+            np.array(vertexIds, dtype=np.int64))
+
+
+def face_vertex_uvs(pObject):
+    '''Gathers the UV of every face vertex of a polygonal object along with
+    the vertex each UV belongs to. Faces without UVs are skipped.
+
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+
+    On Exit:
+        Returns a 2 tuple of a (m, 2) NumPy array of UVs and a NumPy array of
+        length m of the vertex ids for each of the UVs.
+
+    '''
+    meshFn = get_mesh_fn(pObject)
+    us, vs = meshFn.getUVs()
+    uvCounts, uvIds = meshFn.getAssignedUVs()
+    counts, vertexIds = meshFn.getVertices()
+    counts = np.array(counts, dtype=np.int64)
+    faceIds = np.repeat(np.arange(len(counts)), counts)
+    hasUVs = np.array(uvCounts, dtype=np.int64)[faceIds] > 0
+    uvIds = np.array(uvIds, dtype=np.int64)
+    uvs = np.column_stack((np.array(us), np.array(vs)))[uvIds]
+    return uvs, np.array(vertexIds, dtype=np.int64)[hasUVs]
+
+
+def face_vertex_triangles(pObject):
+    '''Splits the faces of a polygonal object into triangles of face 
+    vertices, in the same order as the UVs from 'face_vertex_uvs'. Faces 
+    without UVs are skipped.
+
+    Parameters:
+        pObject [str] : The name of a polygonal object from the scene.
+
+    On Exit:
+        Returns a (t, 3) NumPy array of the index of each corner of every
+        triangle into the arrays returned by 'face_vertex_uvs'.
+
+    '''
+    meshFn = get_mesh_fn(pObject)
+    uvCounts = meshFn.getAssignedUVs()[0]
+    counts, vertexIds = meshFn.getVertices()
+    triCounts, triVertices = meshFn.getTriangles()
+    nFaces = len(counts)
+    nVerts = meshFn.numVertices
+    hasUVs = np.array(uvCounts, dtype=np.int64) > 0
+
+    # A face vertex is found from its face and vertex id, as a face only
+    # uses each of its vertices once
+    faceIds = np.repeat(np.arange(nFaces), np.array(counts, dtype=np.int64))
+    keys = (faceIds * nVerts + np.array(vertexIds, dtype=np.int64))
+    keys = keys[hasUVs[faceIds]]
+    order = np.argsort(keys)
+    triFaces = np.repeat(np.arange(nFaces), 
+                         np.array(triCounts, dtype=np.int64))
+    triKeys = (triFaces[:, None] * nVerts + 
+               np.array(triVertices, dtype=np.int64).reshape(-1, 3))
+    triKeys = triKeys[hasUVs[triFaces]]
+    return order[np.searchsorted(keys[order], triKeys)]
+
+
+def set_vertex_colours(pObject, colours, colourSet=None):
+    '''Sets the colour of every vertex of a polygonal object with a single
+    API call and turns on the display of vertex colours.
+
+    Parameters:
+        pObject [str]          : The name of a polygonal object from the 
+                                 scene.
+        colours [array]        : A (n, 3) or (n, 4) array of colours, one for
+                                 each vertex.
+        colourSet [None][str]  : If not None, the colour set the colours will
+                                 be stored in. It is created if it doesn't 
+                                 exist and made the current colour set.
+    
+    On Exit:
+        The vertices of 'pObject' are coloured with 'colours'.
+        
+    '''
+    if colourSet is not None:
+        colourSets = cmds.polyColorSet(pObject, q=True, allColorSets=True)
+        if colourSets is None or colourSet not in colourSets:
+            cmds.polyColorSet(pObject, create=True, colorSet=colourSet)
+        cmds.polyColorSet(pObject, currentColorSet=True, colorSet=colourSet)
+    meshFn = get_mesh_fn(pObject)
+    colourArray = om2.MColorArray([om2.MColor(c) for c in 
+                                   np.asarray(colours).tolist()])
+    meshFn.setVertexColors(colourArray, range(len(colourArray)))
+    cmds.setAttr('%s.displayColors' % meshFn.fullPathName(), True)
+
+
+def delete_colour_set(pObject, colourSet):
+    '''Removes a colour set from a polygonal object if it exists.
+
+    Parameters:
+        pObject [str]   : The name of a polygonal object from the scene.
+        colourSet [str] : The name of the colour set to remove.
+    
+    On Exit:
+        Deletes the colour set and returns True if it existed, else False.
+        
+    '''
+    colourSets = cmds.polyColorSet(pObject, q=True, allColorSets=True)
+    if colourSets is None or colourSet not in colourSets:
+        return False
+    cmds.polyColorSet(pObject, delete=True, colorSet=colourSet)
+    return True
+
+
 def soft_selection():
     '''Returns the currently selected or influenced vertex points from the use
     of soft select.
@@ -0,0 +1,218 @@
+'''Module for counting and timing the Maya commands called by scripts.
+
+   The idea behind this module is to find out which Maya commands a tool
+   spends its time in on real scenes, so that the slowest bulk procedures
+   can be worked on first. 'enable' swaps the 'cmds' of the chosen modules
+   for a 'ProfiledCommands', which counts and times every command called
+   through it into 'STATS'. 'disable' puts the real 'cmds' back, so nothing
+   is slowed down while profiling is off. The only cost while it is on is a
+   timer call and a dictionary update for each command, which is small next
+   to the command itself, so it can be left on for a whole session.
+
+   'profile' prints a table of the commands called during an operation,
+   ordered by their total time or by how often they were called.
+
+       >>> class Commands(object):
+       ...     def select(self, *args, **kwargs):
+       ...         pass
+       >>> cmds = ProfiledCommands(Commands())
+       >>> STATS.reset()
+       >>> for i in xrange(3):
+       ...     cmds.select('pCube1.vtx[%d]' % i, replace=True)
+       >>> STATS.counts['select']
+       3
+       >>> [(name, calls) for name, calls, seconds in STATS.top(by='calls')]
+       [('select', 3)]
+
+    To test/execute the examples in the module documentation, once you have
+    imported the mayaProfile module:
+    import doctest
+    nfail, ntests = doctest.testmod(mayaProfile)
+
+'''
+
+import sys
+import contextlib
+from timeit import default_timer as timer
+
+# The modules whose 'cmds' are profiled by default
+MODULES = ('mtgMain', 'mayaFuncs', 'mtgGUI')
+
+# Functions called with the name and the time taken of every profiled
+# command, such as 'mtgTrace' counting the commands into its trace
+LISTENERS = []
+
+_originals = {}
+
+
+class CommandStats(object):
+    '''Keeps how many times each command was called and the total time spent
+    in it.
+
+    Attributes:
+        counts [dict] : The number of calls of each command by name.
+        times [dict]  : The total seconds spent in each command by name.
+
+    '''
+    def __init__(self, counts=None, times=None):
+        self.counts = dict(counts or {})
+        self.times = dict(times or {})
+
+    def record(self, name, seconds):
+        '''Adds a call of the command 'name' that took 'seconds'.'''
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def reset(self):
+        '''Forgets every command recorded.'''
+        self.counts.clear()
+        self.times.clear()
+
+    def copy(self):
+        '''Returns a copy of the stats as they are now.'''
+        return CommandStats(self.counts, self.times)
+
+    def since(self, before):
+        '''Returns the stats of the commands called since 'before', a copy
+        of these stats made earlier.'''
+        counts = {}
+        times = {}
+        for name, calls in self.counts.items():
+            if calls != before.counts.get(name, 0):
+                counts[name] = calls - before.counts.get(name, 0)
+                times[name] = self.times[name] - before.times.get(name, 0.0)
+        return CommandStats(counts, times)
+
+    def total(self):
+        '''Returns a 2 tuple of the number of calls and the seconds spent in
+        all of the commands.'''
+        return sum(self.counts.values()), sum(self.times.values())
+
+    def top(self, n=10, by='time'):
+        '''Lists the commands called the most.
+
+        Parameters:
+            n [None][int] : The number of commands listed. If None, every
+                            command is listed.
+            by [str]      : Either 'time' to order the commands by their
+                            total time or 'calls' to order them by how
+                            often they were called.
+
+        On Exit:
+            Returns a list of 3 tuples of the name, the number of calls and
+            the total seconds of each command, the most first.
+
+        '''
+        if by not in ('time', 'calls'):
+            raise ValueError("%s is not a valid order. Must be 'time' or "
+                             "'calls'" % by)
+        stats = [(name, calls, self.times[name])
+                 for name, calls in self.counts.items()]
+        stats.sort(key=lambda s: (s[2], s[1]) if by == 'time'
+                   else (s[1], s[2]), reverse=True)
+        return stats[:n]
+
+    def report(self, n=10, by='time', title='Maya Commands'):
+        '''Returns a table of the 'n' commands called the most, ordered
+        'by' their 'time' or 'calls' (see 'top').'''
+        calls, seconds = self.total()
+        lines = ['%s: %d commands in %.3fs' % (title, calls, seconds),
+                 '    %-28s %9s %10s %7s %11s' % ('command', 'calls', 'time',
+                                                 'share', 'per call')]
+        for name, calls, taken in self.top(n, by):
+            lines.append('    %-28s %9d %9.3fs %6.1f%% %9.1fus' % (
+                         name, calls, taken, 100.0 * taken / (seconds or 1),
+                         1e6 * taken / calls))
+        return '\n'.join(lines)
+
+
+# The stats of every command profiled since the session started
+STATS = CommandStats()
+
+
+class ProfiledCommands(object):
+    '''Stands in for the 'maya.cmds' module, counting and timing each
+    command called through it into 'STATS'. Each command is wrapped the
+    first time it is used and then kept, so later calls do not have to look
+    it up again.
+
+    Parameters:
+        cmds [module] : The 'maya.cmds' module being profiled.
+
+    '''
+    def __init__(self, cmds):
+        self._cmds = cmds
+
+    def __getattr__(self, name):
+        command = getattr(self._cmds, name)
+        if not callable(command):
+            return command
+
+        def profiled(*args, **kwargs):
+            start = timer()
+            try:
+                return command(*args, **kwargs)
+            finally:
+                seconds = timer() - start
+                STATS.record(name, seconds)
+                for listener in LISTENERS:
+                    listener(name, seconds)
+        profiled.__name__ = name
+        profiled.__doc__ = command.__doc__
+        setattr(self, name, profiled)
+        return profiled
+
+
+def enabled():
+    '''Returns True if the 'cmds' of any module is being profiled.'''
+    return bool(_originals)
+
+
+def enable(modules=MODULES):
+    '''Profiles the Maya commands called by the modules already imported.
+
+    Parameters:
+        modules [tuple] : The names of the modules to profile, without their
+                          package names.
+
+    On Exit:
+        The 'cmds' of each module is swapped for a 'ProfiledCommands', and
+        a list of the full names of the modules now profiled is returned.
+
+    '''
+    for name, module in sys.modules.items():
+        if (module is not None and name.split('.')[-1] in modules and
+                hasattr(module, 'cmds') and
+                not isinstance(module.cmds, ProfiledCommands)):
+            _originals[name] = module.cmds
+            module.cmds = ProfiledCommands(module.cmds)
+    return sorted(_originals)
+
+
+def disable():
+    '''Stops profiling, putting back the real 'cmds' of every module. The
+    stats recorded are kept.'''
+    for name, cmds in _originals.items():
+        module = sys.modules.get(name)
+        if module is not None:
+            module.cmds = cmds
+    _originals.clear()
+
+
+@contextlib.contextmanager
+def profile(title, n=10, by='time'):
+    '''Prints a table of the commands called while the 'with' statement
+    runs, if profiling is on.
+
+    Parameters:
+        title [str] : The name of the operation shown above the table.
+        n [int]     : The number of commands shown.
+        by [str]    : Either 'time' or 'calls', the order of the commands.
+
+    '''
+    before = STATS.copy()
+    try:
+        yield
+    finally:
+        if enabled():
+            print STATS.since(before).report(n, by, title)
@@ -58,11 +58,22 @@ class multi_key_dict(object):
         k['kilo'] = 'kilo'
         print k[1000] # will print 'kilo' as value was updated
     """
+    __slots__ = ('items_dict', '_key_types', '_item_keys', '_next_key')
+
+    def __init__(self):
+        # maps each direct key to its value
+        self.items_dict = dict()
+        # maps each type of key to a dictionary of its keys and direct keys
+        self._key_types = dict()
+        # the reverse index, mapping each direct key to the tuple of its keys
+        self._item_keys = dict()
+        self._next_key = 0
+
     def __getitem__(self, key):
         """ Return the value at index specified as key."""
-        if self.has_key(key):
-            return self.items_dict[self.__dict__[str(type(key))][key]]
-        else:
+        try:
+            return self.items_dict[self._key_types[type(key)][key]]
+        except KeyError:
             raise KeyError(key)
 
     def __setitem__(self, keys, value):
@@ -73,81 +84,47 @@ class multi_key_dict(object):
                   (item update)
             If this is not the case - KeyError is raised. """
         if(type(keys) in [tuple, list]):
-            num_of_keys_we_have = reduce(lambda x, y: x+y, map(lambda x : self.has_key(x), keys))
-            if num_of_keys_we_have:
-                all_select_same_item = True
-                direct_key = None
-                for key in keys:
-                    key_type = str(type(key))
-                    try:
-                        if not direct_key:
-                            direct_key = self.__dict__[key_type][key]
-                        else:
-                            new = self.__dict__[key_type][key]
-                            if new != direct_key:
-                                all_select_same_item = False
-                                break
-                    except Exception, err:
-                        all_select_same_item = False
-                        break;
-
-                if not all_select_same_item:
-                    raise KeyError(', '.join(str(key) for key in keys))
-
+            direct_keys = set(self.__direct_key(key) for key in keys)
+            if direct_keys != set([None]) and (len(direct_keys) != 1 or
+                                               None in direct_keys):
+                raise KeyError(', '.join(str(key) for key in keys))
             first_key = keys[0] # combination if keys is allowed, simply use the first one
         else:
             first_key = keys
+            keys = [keys]
 
-        key_type = str(type(first_key)) # find the intermediate dictionary..
-        if self.has_key(first_key):
-            self.items_dict[self.__dict__[key_type][first_key]] = value # .. and update the object if it exists..
+        direct_key = self.__direct_key(first_key)
+        if direct_key is not None:
+            self.items_dict[direct_key] = value # update the object if it exists..
         else:
-            if(type(keys) not in [tuple, list]):
-                key = keys
-                keys = [keys]
             self.__add_item(value, keys) # .. or create it - if it doesn't
 
     def __delitem__(self, key):
         """ Called to implement deletion of self[key]."""
-        key_type = str(type(key))
-        if (self.has_key(key) and
-            self.items_dict and
-            self.items_dict.has_key(self.__dict__[key_type][key])):
-            intermediate_key = self.__dict__[key_type][key]
-
-            # remove the item in main dictionary 
-            del self.items_dict[intermediate_key]
-
-            # remove all references (also pointed by other types of keys)
-            # for the item that this key pointed to.
-            for name, reference_dict in self.__dict__.iteritems():
-                if(type(name) == str and name.find('<type') == 0):
-                    ref_key = None
-                    for temp_key, value in reference_dict.iteritems():
-                        if value == intermediate_key:
-                            ref_key = temp_key
-                            break
-                    if ref_key:
-                        del reference_dict[ref_key]
-        else:
+        direct_key = self.__direct_key(key)
+        if direct_key is None:
             raise KeyError(key)
+        # remove the item in main dictionary and all of its keys,
+        # found straight away from the reverse index
+        del self.items_dict[direct_key]
+        for other_key in self._item_keys.pop(direct_key):
+            key_dict = self._key_types[type(other_key)]
+            del key_dict[other_key]
+            if not key_dict:
+                del self._key_types[type(other_key)]
 
     def has_key(self, key):
         """ Returns True if this object contains an item referenced by the key."""
-        key_type = str(type(key))
-        if self.__dict__.has_key(key_type):
-            if self.__dict__[key_type].has_key(key):
-                return True
-        return False
+        return self.__direct_key(key) is not None
 
     def get_other_keys(self, key, including_current=False):
         """ Returns list of other keys that are mapped to the same value as specified key. 
             @param key - key for which other keys should be returned.
             @param including_current if set to True - key will also appear on this list."""
         other_keys = []
-        if self.has_key(key):
-            intermediate_key = self.__dict__[str(type(key))][key]
-            other_keys.extend(self.__all_keys_from_intermediate_key(intermediate_key))
+        direct_key = self.__direct_key(key)
+        if direct_key is not None:
+            other_keys.extend(self._item_keys[direct_key])
             if not including_current:
                 other_keys.remove(key)
         return other_keys
@@ -159,18 +136,14 @@ class multi_key_dict(object):
                    i.e. (tuple of keys, values) pairs for all items in this dictionary will be generated.
             @param return_all_keys if set to True - tuple of keys is retuned instead of a key of this type."""
         if key_type is not None:
-            key = str(key_type)
-            if self.__dict__.has_key(key):
-                for key, intermediate_key in self.__dict__[key].iteritems():
-                    if return_all_keys:
-                        keys = self.__all_keys_from_intermediate_key(intermediate_key)
-                        yield keys, self.items_dict[intermediate_key]
-                    else:
-                        yield key, self.items_dict[intermediate_key]
+            for key, direct_key in self._key_types.get(key_type, {}).iteritems():
+                if return_all_keys:
+                    yield self._item_keys[direct_key], self.items_dict[direct_key]
+                else:
+                    yield key, self.items_dict[direct_key]
         else:
-            for multi_key_type, value in self.items_dict.iteritems():
-                keys = self.__all_keys_from_intermediate_key(multi_key_type)
-                yield keys, value
+            for direct_key, value in self.items_dict.iteritems():
+                yield self._item_keys[direct_key], value
 
     def iterkeys(self, key_type=None, return_all_keys=False):
         """ Returns an iterator over the dictionary's keys.
@@ -179,28 +152,22 @@ class multi_key_dict(object):
                    for this dictionary will be generated.
             @param return_all_keys if set to True - tuple of keys is retuned instead of a key of this type."""
         if(key_type is not None):
-            the_key = str(key_type)
-            if self.__dict__.has_key(the_key):
-                for key in self.__dict__[the_key].iterkeys():
-                    if return_all_keys:
-                        intermediate_key = self.__dict__[the_key][key]
-                        keys = self.__all_keys_from_intermediate_key(intermediate_key)
-                        yield keys
-                    else:
-                        yield key            
+            for key, direct_key in self._key_types.get(key_type, {}).iteritems():
+                if return_all_keys:
+                    yield self._item_keys[direct_key]
+                else:
+                    yield key
         else:
-            for multi_key_type in self.items_dict.keys():
-                yield self.__all_keys_from_intermediate_key(multi_key_type)
+            for direct_key in self.items_dict.iterkeys():
+                yield self._item_keys[direct_key]
 
     def itervalues(self, key_type=None):
         """ Returns an iterator over the dictionary's values.
             @param key_type if specified, iterator will be returning only values pointed by keys of this type.
                    Otherwise (if not specified) all values in this dictinary will be generated."""
         if(key_type is not None):
-            intermediate_key = str(key_type)
-            if self.__dict__.has_key(intermediate_key):
-                for direct_key in self.__dict__[intermediate_key].itervalues():
-                    yield self.items_dict[direct_key]
+            for direct_key in self._key_types.get(key_type, {}).itervalues():
+                yield self.items_dict[direct_key]
         else:
             for value in self.items_dict.itervalues():
                 yield value
@@ -213,19 +180,16 @@ class multi_key_dict(object):
         all_items = []
         if key_type is not None:
             keys_used_so_far = set()
-            direct_key = str(key_type)
-            if self.__dict__.has_key(direct_key):
-                for key, intermediate_key in self.__dict__[direct_key].iteritems():
-                    if not intermediate_key in keys_used_so_far:
-                        keys_used_so_far.add(intermediate_key)
-                        if return_all_keys:
-                            keys = self.__all_keys_from_intermediate_key(intermediate_key)
-                            all_items.append((keys, self.items_dict[intermediate_key]))
-                        else:
-                            all_items.append((key, self.items_dict[intermediate_key]))
+            for key, direct_key in self._key_types.get(key_type, {}).iteritems():
+                if not direct_key in keys_used_so_far:
+                    keys_used_so_far.add(direct_key)
+                    if return_all_keys:
+                        all_items.append((self._item_keys[direct_key], self.items_dict[direct_key]))
+                    else:
+                        all_items.append((key, self.items_dict[direct_key]))
         else:
-            for multi_key_type, value in self.items_dict.iteritems():
-                all_items.append((self.__all_keys_from_intermediate_key(multi_key_type), value))
+            for direct_key, value in self.items_dict.iteritems():
+                all_items.append((self._item_keys[direct_key], value))
         return all_items
 
     def keys(self, key_type=None):
@@ -233,15 +197,11 @@ class multi_key_dict(object):
             @param key_type if specified, only keys for this type will be returned.
                  Otherwise list of tuples containing all (multiple) keys will be returned."""
         if key_type is not None:
-            intermediate_key = str(key_type)
-            if self.__dict__.has_key(intermediate_key):
-                return self.__dict__[intermediate_key].keys()
+            if key_type in self._key_types:
+                return self._key_types[key_type].keys()
         else:
             # keys will contain lists of keys
-            all_keys = []
-            for multi_key_type in self.items_dict.keys():
-                all_keys.append(self.__all_keys_from_intermediate_key(multi_key_type))
-            return all_keys
+            return [self._item_keys[direct_key] for direct_key in self.items_dict]
 
     def values(self, key_type=None):
         """ Returns a copy of the dictionary's values.
@@ -250,72 +210,60 @@ class multi_key_dict(object):
         if(key_type is not None):
             all_items = []
             keys_used = set()
-            direct_key = str(key_type)
-            if self.__dict__.has_key(direct_key):
-                for intermediate_key in self.__dict__[direct_key].itervalues():
-                    if not intermediate_key in keys_used:
-                        all_items.append(self.items_dict[intermediate_key])
-                        keys_used.add(intermediate_key)
+            for direct_key in self._key_types.get(key_type, {}).itervalues():
+                if not direct_key in keys_used:
+                    all_items.append(self.items_dict[direct_key])
+                    keys_used.add(direct_key)
             return all_items
         else:
             return self.items_dict.values()
 
     def __len__(self):
         """ Returns number of objects in dictionary."""
-        length = 0
-        if self.__dict__.has_key('items_dict'):
-            length = len(self.items_dict)
-        return length
+        return len(self.items_dict)
+
+    def __direct_key(self, key):
+        """ Internal method to find the direct key of the item a key maps to, or None if it doesn't."""
+        key_dict = self._key_types.get(type(key))
+        if key_dict is None:
+            return None
+        return key_dict.get(key)
 
     def __add_item(self, item, keys=None):        
         """ Internal method to add an item to the multi-key dictionary"""
         if(not keys or not len(keys)):
             raise Exception('Error in %s.__add_item(%s, keys=tuple/list of items): need to specify a tuple/list containing at least one key!'
                             % (self.__class__.__name__, str(item)))
-        # joined values of keys will be used as a direct key. We'll encode type and key too..
-        direct_key = '`'.join([key.__class__.__name__+':' +str(key) for key in keys])
+        # a new number is used as the direct key, with the keys kept in
+        # the reverse index so that they never need to be searched for
+        direct_key = self._next_key
+        self._next_key += 1
+        # the keys are kept grouped by type and in dictionary order, the 
+        # order they were found in when they were searched for
+        groups = dict()
         for key in keys:
-            key_type = str(type(key))
-
             # store direct key as a value in an intermediate dictionary
-            if(not self.__dict__.has_key(key_type)):
-                self.__setattr__(key_type, dict())
-            self.__dict__[key_type][key] = direct_key
-         
-            # store the value in the actual dictionary
-            if(not self.__dict__.has_key('items_dict')):
-                self.items_dict = dict()            
-            self.items_dict[direct_key] = item
-
-    def __all_keys_from_intermediate_key(self, intermediate_key):
-        """ Internal method to find the tuple containing multiple keys"""
-        keys = []
-        # since we're trying to reverse-find keys for a value in number of dicts,
-        # (which is far from optimal, but re-creating objects from the intermediate keys
-        # doesn't work for more complex types loaded from sub-modules) - at least we'll
-        # try do that only for a correct dictionary (and not all of them)
-        key_types = set([tv.split(':', 1)[0] for tv in intermediate_key.split('`')])
-        is_correct_dict = lambda key: True in [str(key).startswith('<type \'%s' % k) for k in key_types]
-        for key, val in self.__dict__.items():
-            if type(val) == dict and is_correct_dict(key):
-                keys.extend([k for k, v in val.items() if v == intermediate_key])
-        return(tuple(keys))
+            self._key_types.setdefault(type(key), dict())[key] = direct_key
+            groups.setdefault(str(type(key)), dict())[key] = None
+        self._item_keys[direct_key] = tuple(key for group in groups.itervalues()
+                                            for key in group)
+        # store the value in the actual dictionary
+        self.items_dict[direct_key] = item
 
     def get(self, key, default=None):
         """ Return the value at index specified as key."""
-        if self.has_key(key):
-            return self.items_dict[self.__dict__[str(type(key))][key]]
-        else:
+        direct_key = self.__direct_key(key)
+        if direct_key is None:
             return default
+        return self.items_dict[direct_key]
 
     def __str__(self):
         items = []
         str_repr = lambda x: '\'%s\'' % x if type(x) == str else str(x)
-        if hasattr(self, 'items_dict'):
-            for (keys, value) in self.items():
-                keys_str = [str_repr(k) for k in keys]
-                items.append('(%s): %s' % (', '.join(keys_str),
-                                           str_repr(value)))
+        for (keys, value) in self.items():
+            keys_str = [str_repr(k) for k in keys]
+            items.append('(%s): %s' % (', '.join(keys_str),
+                                       str_repr(value)))
         dict_str = '{%s}' % ( ', '.join(items))
         return dict_str
 
@@ -0,0 +1,8 @@
+'''Makes the heightmaps of many songs at once, run with 'python -m mtg' from
+the 'scripts' directory (see 'mtgBatch').'''
+import sys
+
+from mtg.mtgBatch import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,332 @@
+r'''Module for making the heightmaps of many songs at once, without Maya.
+
+   The idea behind this module is to make the terrain heights of a whole
+   album or sound library in one go, from the command line, instead of
+   loading one song at a time into the interface. Each song is summed with
+   'terrainWave.SongSummary', which makes the same heights as
+   'TerrainWaveFile.createheightvals', and its heights are written as a
+   NumPy '.npy' array and/or a 32 bit float OpenEXR heightmap. The songs are
+   shared out over a pool of processes and each heightmap is written as soon
+   as its song is done. Songs whose heightmaps are newer than the song are
+   skipped, so a run that was stopped can be started again. With '--start' 
+   and '--end', only that part of each song is read.
+
+   The heights are a (rows, columns) array for a grid of vertices, such as
+   those of a Maya poly plane with 'columns - 1' and 'rows - 1'
+   subdivisions, with the first row being the first vertices moved and the
+   bottom row of the heightmap.
+
+   It is run from the 'scripts' directory with:
+   python -m mtg SONGS [SONGS ...] --grid 256x256 [--height 16] [--negative]
+                 [--output DIR] [--format npy,exr] [--jobs N] [--force]
+                 [--start SECONDS] [--end SECONDS]
+
+   where each of the SONGS is a WAV file, a directory of them or a glob.
+
+       >>> parse_grid('256x128')
+       (256, 128)
+       >>> parse_grid('64')
+       (64, 64)
+       >>> os.path.basename(output_path('album/01 Intro.wav', 'maps',
+       ...                              (256, 128), 16.0, False, 'npy'))
+       '01 Intro_256x128_h16.npy'
+       >>> os.path.basename(output_path('album/01 Intro.wav', 'maps',
+       ...                              (256, 128), 16.0, True, 'exr', 20, None))
+       '01 Intro_256x128_h16_neg_t20-end.exr'
+
+    To test/execute the examples in the module documentation, once you have
+    imported the mtgBatch module:
+    import doctest
+    nfail, ntests = doctest.testmod(mtgBatch)
+
+'''
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+
+import terrainWave as tw
+import terrainImage as ti
+import mtgMemory as mm
+
+FORMATS = ('npy', 'exr')
+WAV_PATTERNS = ('*.wav', '*.WAV')
+MB = 1024.0 * 1024.0
+
+
+def parse_grid(spec):
+    '''Reads a grid spec of the columns and rows of vertices, such as
+    '256x128', or '256' for a square grid, into a 2 tuple.'''
+    try:
+        size = tuple(int(n) for n in spec.lower().split('x'))
+    except ValueError:
+        size = ()
+    if len(size) == 1:
+        size *= 2
+    if len(size) != 2 or min(size) < 1:
+        raise argparse.ArgumentTypeError('%s is not a valid grid. Must be '
+                                         'COLUMNSxROWS or SIZE' % spec)
+    return size
+
+
+def parse_formats(spec):
+    '''Reads a comma separated list of output formats, such as 'npy,exr'.'''
+    formats = tuple(f.strip().lower() for f in spec.split(',') if f.strip())
+    for f in formats:
+        if f not in FORMATS:
+            raise argparse.ArgumentTypeError('%s is not a valid format. Must '
+                                             'be one of %s' %
+                                             (f, ', '.join(FORMATS)))
+    return formats
+
+
+def find_songs(inputs):
+    '''Lists the WAV files of 'inputs', a list of files, directories and
+    globs, in order and without repeats.'''
+    songs = []
+    for name in inputs:
+        if os.path.isdir(name):
+            found = sorted(set(path for pattern in WAV_PATTERNS
+                               for path in glob.glob(os.path.join(name,
+                                                                  pattern))))
+        elif os.path.isfile(name):
+            found = [name]
+        else:
+            found = sorted(glob.glob(name))
+        for path in found:
+            if os.path.isfile(path) and path not in songs:
+                songs.append(path)
+    return songs
+
+
+def output_path(song, outDir, grid, height, negative, fmt, start=None,
+                end=None):
+    '''Returns the path of the heightmap of 'song' in 'outDir', named after
+    the song and the options it was made with.'''
+    name = os.path.splitext(os.path.basename(song))[0]
+    songRange = ''
+    if start is not None or end is not None:
+        songRange = '_t%g-%s' % (start or 0, 'end' if end is None else
+                                 '%g' % end)
+    return os.path.join(outDir, '%s_%dx%d_h%g%s%s.%s' % (
+                        name, grid[0], grid[1], height,
+                        '_neg' if negative else '', songRange, fmt))
+
+
+def up_to_date(song, paths):
+    '''Returns True if every one of 'paths' exists and is newer than
+    'song'.'''
+    songTime = os.path.getmtime(song)
+    return all(os.path.exists(path) and os.path.getmtime(path) >= songTime
+               for path in paths)
+
+
+def song_heights(song, grid, height, negative=False, start=None, end=None):
+    '''Makes the heights of a song for a grid of vertices.
+
+    Parameters:
+        song [str]          : The path of the WAV file.
+        grid [tuple]        : The columns and rows of vertices.
+        height [float]      : The highest and/or lowest height value.
+        negative [bool]     : If True, the heights include negative values.
+        start [None][float] : The second of the song the heights start at.
+                              Only the frames from 'start' to 'end' are read.
+        end [None][float]   : The second of the song the heights end at.
+
+    On Exit:
+        Returns a (rows, columns) float32 array of the heights.
+
+    '''
+    columns, rows = grid
+    summary = tw.SongSummary(song, start=start, end=end)
+    summary.run()
+    if summary.error is not None:
+        raise summary.error
+    heights = summary.heightvals(columns * rows, height, negative)
+    return np.array(heights, dtype=np.float32).reshape(rows, columns)
+
+
+def write_heightmap(path, heights):
+    '''Writes 'heights' to 'path' in the format of its extension, replacing
+    the old file only once the new one is written so that a run that is
+    stopped part way never leaves a cut short file that looks up to date.'''
+    tmpPath = path + '.tmp'
+    try:
+        if path.endswith('.npy'):
+            with open(tmpPath, 'wb') as f:
+                np.save(f, heights)
+        else:
+            ti.write_exr(tmpPath, heights, channels='Y')
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+    return path
+
+
+def make_heightmap(job):
+    '''Makes and writes the heightmaps of one song. This is run by the
+    processes of the pool, so it returns any error instead of raising it.
+
+    Parameters:
+        job [tuple] : A 7 tuple of the song path, the heightmap paths, the
+                      grid, the height, 'negative' and the start and end
+                      of the song range.
+
+    On Exit:
+        Returns a dictionary of the song, the bytes read, the seconds taken,
+        the error message, if there was one, and the memory used as a 2 
+        tuple of the bytes and how they were measured (see 'mtgMemory'), or
+        None if it couldn't be measured.
+
+    '''
+    song, paths, grid, height, negative, songStart, songEnd = job
+    result = {'song': song, 'bytes': os.path.getsize(song), 'error': None,
+              'memory': None}
+    start = time.time()
+    mm.reset()
+    try:
+        with mm.tracing(), mm.stage(song):
+            heights = song_heights(song, grid, height, negative, songStart,
+                                   songEnd)
+            for path in paths:
+                write_heightmap(path, heights)
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    result['time'] = time.time() - start
+    if mm.STAGES:
+        result['memory'] = mm.STAGES[-1][1:]
+    return result
+
+
+def run(songs, outDir, grid, height=16.0, negative=False, formats=('npy',),
+        jobs=None, force=False, out=sys.stdout, songStart=None,
+        songEnd=None):
+    '''Makes the heightmaps of every song, sharing the songs out over a pool
+    of processes.
+
+    Parameters:
+        songs [list]     : The paths of the WAV files.
+        outDir [str]     : The directory the heightmaps are written to.
+        grid [tuple]     : The columns and rows of vertices.
+        height [float]   : The highest and/or lowest height value.
+        negative [bool]  : If True, the heights include negative values.
+        formats [tuple]  : The formats written, from 'FORMATS'.
+        jobs [None][int] : The number of processes. If None, one for each
+                           CPU. If 1, the songs are made in this process.
+                           The memory budget (see 'mtgMemory') is shared
+                           between the processes.
+        force [bool]     : If True, songs are made even when their
+                           heightmaps are up to date.
+        out [file]       : Where each song is reported as it is finished.
+        songStart [None][float] : The second of each song the heights start
+                                  at.
+        songEnd [None][float]   : The second of each song the heights end at.
+
+    On Exit:
+        Returns a dictionary of the results of each song, the songs skipped
+        and the seconds taken.
+
+    '''
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    work = []
+    skipped = []
+    for song in songs:
+        paths = [output_path(song, outDir, grid, height, negative, f,
+                             songStart, songEnd) for f in formats]
+        if not force and up_to_date(song, paths):
+            skipped.append(song)
+        else:
+            work.append((song, paths, grid, height, negative, songStart,
+                         songEnd))
+
+    start = time.time()
+    results = []
+    pool = None
+    if jobs != 1 and len(work) > 1:
+        processes = jobs or multiprocessing.cpu_count()
+        limit = mm.budget()
+        pool = multiprocessing.Pool(processes, mm.set_budget, (
+            None if limit is None else float(limit) / mm.MB / processes,))
+        made = pool.imap_unordered(make_heightmap, work)
+    else:
+        made = (make_heightmap(job) for job in work)
+    try:
+        for result in made:
+            results.append(result)
+            if result['error']:
+                status = result['error']
+            elif result['memory']:
+                status = '%.2fs %.1f MB %s' % (
+                         result['time'], float(result['memory'][0]) / MB, 
+                         result['memory'][1])
+            else:
+                status = '%.2fs' % result['time']
+            out.write('[%d/%d] %s %s\n' % (len(results), len(work), 
+                                            result['song'], status))
+            out.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return {'results': results, 'skipped': skipped,
+            'time': time.time() - start}
+
+
+def summary(run):
+    '''Returns the throughput of a run in songs and megabytes a second.'''
+    made = [r for r in run['results'] if r['error'] is None]
+    taken = max(run['time'], 1e-9)
+    return ('%d songs made, %d skipped, %d failed in %.2fs: %.2f songs/s, '
+            '%.1f MB/s' % (len(made), len(run['skipped']),
+                           len(run['results']) - len(made), run['time'],
+                           len(made) / taken,
+                           sum(r['bytes'] for r in made) / MB / taken))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m mtg',
+                                     description=__doc__.split('\n')[0])
+    parser.add_argument('songs', nargs='+',
+                        help='WAV files, directories of them or globs')
+    parser.add_argument('--grid', type=parse_grid, required=True,
+                        help='the columns and rows of vertices, COLUMNSxROWS')
+    parser.add_argument('--height', type=float, default=16.0,
+                        help='the highest height value')
+    parser.add_argument('--negative', action='store_true',
+                        help='include negative heights')
+    parser.add_argument('--output', default='heightmaps',
+                        help='the directory the heightmaps are written to')
+    parser.add_argument('--format', type=parse_formats, default=('npy',),
+                        help='the formats written, from %s' %
+                        ', '.join(FORMATS))
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='the number of processes, one per CPU if not '
+                        'given')
+    parser.add_argument('--force', action='store_true',
+                        help='make heightmaps that are already up to date')
+    parser.add_argument('--start', type=float, default=None,
+                        help='the second of each song the heights start at')
+    parser.add_argument('--end', type=float, default=None,
+                        help='the second of each song the heights end at')
+    options = parser.parse_args(args)
+    if (options.start is not None and options.end is not None and
+            options.start >= options.end):
+        parser.error('--start must be before --end')
+
+    songs = find_songs(options.songs)
+    if not songs:
+        parser.error('no WAV files found in %s' % ' '.join(options.songs))
+    result = run(songs, options.output, options.grid, options.height,
+                 options.negative, options.format, options.jobs,
+                 options.force, songStart=options.start,
+                 songEnd=options.end)
+    print summary(result)
+    return 1 if any(r['error'] for r in result['results']) else 0
@@ -2,9 +2,8 @@ import os
 import sys
 import time
 import subprocess
+import contextlib
 from functools import partial as par
-import threading
-import Queue
 
 try:
     import maya.cmds as cmds
@@ -15,13 +14,20 @@ except:
     pass
 
 import mayaSnippet.mayaFuncs as Mf
+import mayaSnippet.mayaProfile as Mprof
 import mtg.terrainWave as Tw
 import mtg.mtgMain as Main
+import mtg.mtgProgress as Mp
+import mtg.mtgTrace as Tr
+import mtg.mtgMemory as Mm
+import mtg.mtgSongIndex as Si
 
 CLIFF_COLOUR = (0.41, 0.311468, 0.26937)
 GRASS_COLOUR = (0.15478, 0.494, 0.138814)
 SNOW_COLOUR = (1, 1, 1)
 
+DISPLACEMENT_SIZES = (256, 512, 1024, 2048, 4096)
+
 
 if sys.platform == 'win32':
     def open_file(fileDir):
@@ -67,35 +73,167 @@ else:
             return False, None, e.args
 
 
-class GenerateTerrainThread(threading.Thread):
-    def __init__(self, queue, songInfo, deformMag, pObjectNam, axis, sSelect, falloffCurve, falloffMode, falloffRadius,
-                 negativeValues, separateDeformDirection, reverseSong, refresh):
-        threading.Thread.__init__(self)
-        self.daemon = False
-        self.q = queue
-        self.signal = False
-        self.songInfo = songInfo
-        self.deformMag = deformMag
-        self.pObjectNam = pObjectNam
-        self.axis = axis
-        self.sSelect = sSelect
-        self.falloffCurve = falloffCurve
-        self.falloffMode = falloffMode
-        self.falloffRadius = falloffRadius
-        self.negativeValues = negativeValues
-        self.separateDeformDir = separateDeformDirection
-        self.reverse = reverseSong
-        self.refresh = refresh
-
-
-    def run(self):
-        mu.executeInMainThreadWithResult(Main.music_displace, self.songInfo, self.deformMag, self.pObjectNam, self.axis, self.sSelect, self.falloffCurve,
-                            self.falloffMode, self.falloffRadius, self.negativeValues, self.separateDeformDir,
-                            self.reverse, self.refresh, self.q)
+class ChunkedTask:
+    """Runs a generator of steps on Maya's idle events, one step each time
+    Maya is idle, so that the interface keeps working while it runs. The
+    progress window can be cancelled between any two steps, which undoes the
+    changes the task has made to the scene. Each step is its own undo chunk,
+    named after the task, so edits made in the scene while the task runs are
+    not part of it. Only the task's chunks on top of the undo queue are
+    undone, so if the scene was edited while the task ran, the task's steps
+    from before that edit are kept along with it. Files the task has already
+    written, such as EXR textures and height caches, are not removed.
+
+    Parameters:
+        title [str]      : The title of the progress window.
+        steps [iterator] : The generator of steps, yielding a 3 tuple of the
+                           message, the amount done and the total amount of
+                           the current stage after each step, such as
+                           'mtgMain.music_displace_steps'.
+
+    Attributes:
+        title [str]       : The title of the progress window.
+        steps [iterator]  : The generator of steps being run.
+        progress [object] : The 'mtgProgress.CallbackReporter' limiting how
+                            often the progress window is redrawn.
+        finished [bool]   : True once the task has finished or been
+                            cancelled.
+        cancelled [bool]  : True if the task was cancelled or failed and its
+                            changes undone.
+        commands [object] : The 'mayaProfile.CommandStats' from when the task
+                            started, so the commands it called can be
+                            reported when it finishes.
+        undoName [str]    : The name of the undo chunk of each step.
+        undoSteps [int]   : The number of steps run, the most undo chunks
+                            the task can have made.
+
+    """
+    def __init__(self, title, steps):
+        self.title = title
+        self.steps = steps
+        self.commands = Mprof.STATS.copy()
+        Mm.reset()
+        Mm.start_tracing()
+        self.progress = Mp.CallbackReporter(self.show_progress)
+        self.finished = False
+        self.cancelled = False
+        self.undoName = 'mtgTask%d' % id(self)
+        self.undoSteps = 0
+        cmds.progressWindow(title=title, progress=0, status="Starting: 0%",
+                            isInterruptable=True)
+        mu.executeDeferred(self.run_step)
+
+    def run_step(self):
+        """Runs the next step of the task and queues the step after it to
+        run the next time Maya is idle.
+
+        On Exit:
+            Updates the progress window, or finishes the task if there are no
+            steps left or the progress window was cancelled.
+
+        """
+        if self.finished:
+            return
+        if cmds.progressWindow(q=True, isCancelled=True):
+            self.progress.cancel()
+        if self.progress.cancelled:
+            self.finish(cancelled=True)
+            return
+        try:
+            with self.undo_chunk():
+                msg, done, total = next(self.steps)
+        except StopIteration:
+            self.finish()
+            return
+        except Exception:
+            self.finish(cancelled=True)
+            raise
+        if msg != self.progress.msg:
+            self.progress.start(msg, total)
+        self.progress.update(done)
+        mu.executeDeferred(self.run_step)
+
+    @contextlib.contextmanager
+    def undo_chunk(self):
+        """Puts the Maya commands called in a 'with' statement into one undo
+        chunk named 'undoName', so they can be undone as one and told apart
+        from the artist's own edits."""
+        self.undoSteps += 1
+        cmds.undoInfo(openChunk=True, chunkName=self.undoName)
+        try:
+            yield
+        finally:
+            cmds.undoInfo(closeChunk=True)
+
+    def undo(self):
+        """Undoes the task's undo chunks from the top of the undo queue,
+        stopping at the first one that is not the task's.
+
+        On Exit:
+            The scene changes made by the task since the last edit made
+            outside of it are undone.
+
+        """
+        for _ in xrange(self.undoSteps):
+            if cmds.undoInfo(q=True, undoName=True) != self.undoName:
+                break
+            cmds.undo()
+
+    def show_progress(self, msg, done, total):
+        """Shows the progress of the current stage in the progress window.
+
+        Parameters:
+            msg [str]   : The message of the current stage.
+            done [int]  : The amount done of the current stage.
+            total [int] : The total amount of the current stage.
+
+        On Exit:
+            Updates the progress window.
+
+        """
+        progress = int(done * 100.0 / max(total, 1))
+        cmds.progressWindow(edit=True, progress=progress,
+                            status="{}: {}%".format(msg, progress))
+
+    def finish(self, cancelled=False):
+        """Ends the task, closing the progress window.
+
+        Parameters:
+            cancelled [bool] : If True, the steps are stopped and the task's
+                               changes to the scene are undone (see 'undo').
+
+        On Exit:
+            The task is finished and, if cancelled, the scene is back to how
+            it was before the task started, apart from any edits made while
+            it ran.
+
+        """
+        self.finished = True
+        self.cancelled = cancelled
+        with self.undo_chunk():
+            self.steps.close()
+        cmds.progressWindow(endProgress=1)
+        if cancelled:
+            self.undo()
+        Mm.stop_tracing()
+        if Tr.enabled():
+            Tr.dump()
+        if Mprof.enabled():
+            print Mprof.STATS.since(self.commands).report(title=self.title)
+        if Mm.over_budget():
+            print Mm.report(title=self.title)
+            cmds.warning('MTG used more memory than its budget, see the '
+                         'Script Editor')
 
 class MTGGui:
     """Creates the Music Terrain Generator
 
+    If the 'MTG_PROFILE' environment variable is set, the Maya commands
+    called by MTG are profiled (see 'mayaSnippet.mayaProfile') and a table of
+    the commands called the most is printed each time a terrain or texture is
+    made. Profiling can also be turned on and off at any time with
+    'mayaProfile.enable' and 'mayaProfile.disable'.
+
     Parameters:
         winID [str] : The window name. This is to ensure that no two of the
                       same window exist at the same time.
@@ -126,9 +264,12 @@ class MTGGui:
                                    group
         songText [str]           : The name of the currently loaded song text
                                    label
+        analysisPB [str]         : The name of the progress bar of the song
+                                   analysis run in the background
         musicLoadGrp [str]       : The name of the Music Location text field
                                    button group
         loadMusicB [str]         : The name of the load music button
+        libraryMusicB [str]      : The name of the music library button
         playMusicB [str]         : The name of the play music button
         reloadMusicB [str]       : The name of the reload music button
         clearMusicB [str]        : The name of the clear music button
@@ -142,6 +283,28 @@ class MTGGui:
                                    group
         otherOptCBGrp [str]      : The name of the Other Options Check Box
                                    group
+        songRangeFFGrp [str]     : The name of the Song Range float field
+                                   group of the start and end seconds
+        livePreviewCB [str]      : The name of the Live Preview check box
+        dispMapCB [str]          : The name of the Displacement Map check
+                                   box
+        dispSizeOMGrp [str]      : The name of the displacement map
+                                   resolution option menu group
+        animatedCB [str]         : The name of the Animated check box
+        animWindowFFGrp [str]    : The name of the animation Window float
+                                   field group
+        thermalISlGrp [str]      : The name of the Thermal erosion
+                                   iterations int slider group
+        hydraulicISlGrp [str]    : The name of the Hydraulic erosion
+                                   iterations int slider group
+        erosionFSlGrp [str]      : The name of the erosion Strength float
+                                   slider group
+        smoothISlGrp [str]       : The name of the Smooth Iterations int
+                                   slider group
+        smoothFSlGrp [str]       : The name of the smooth Strength float
+                                   slider group
+        cotangentCB [str]        : The name of the Cotangent Weights check
+                                   box
         sSelectCB [str]          : The name of the Soft Select check box
         sSelectReset [str]       : The name of the Soft Select reset button
         falloffModeOMGrp [str]   : The name of the soft select Falloff mode
@@ -172,6 +335,7 @@ class MTGGui:
         texNoiseV [str]          : The name of the texture noise V float
                                    slider
         bDepth [str]             : The name of the bump depth float slider
+        splatMapCB [str]         : The name of the splat map blend check box
         texPosFrame [str]        : The name of the texture positioning frame
         ramp [str]               : The name of the current ramp preview name in
                                    the interface
@@ -195,7 +359,29 @@ class MTGGui:
         vWaveSl [str]            : The name of the ramp V Wave float slider
         noiseSl [str]            : The name of the ramp noise float slider
         freqSl [str]             : The name of the ramp noise frequency slider
+        previewBandsB [str]      : The name of the preview bands button
+        scatterBandOMGrp [str]   : The name of the scatter band option menu
+                                   group
+        nOfInstancesISlGrp [str] : The name of the number of scatter
+                                   instances integer slider group
+        songDensityCB [str]      : The name of the song driven scatter
+                                   density check box
+        scatterB [str]           : The name of the scatter button
+        clearPreviewB [str]      : The name of the clear band preview button
         generateTerrainB [str]   : The name of the generate terrain button
+        task [None][object]      : The 'ChunkedTask' generating the terrain,
+                                   run on Maya's idle events
+        livePreview [None][object] : The 'mtgMain.TerrainPreview' moving the
+                                     polygon object while the options are
+                                     changed
+        livePreviewPending [bool]  : True if a live preview update is waiting
+                                     for Maya to be idle
+        livePreviewWaiting [bool]  : True if the live preview is waiting for
+                                     the song analysis to finish
+        songIndex [None][object]   : The 'mtgSongIndex.SongIndex' of the
+                                     music library being picked from
+        libraryList [None][str]    : The name of the song list of the music
+                                     library window
 
     """
     def __init__(self, winID='mtgScriptWindow'):
@@ -212,8 +398,16 @@ class MTGGui:
         self.create_interface()
         self.newFileJob = cmds.scriptJob(event=['deleteAll', self.end], 
                                          protected=True)
-        self.queue = Queue.Queue()
-        self.complete = False
+        self.task = None
+        self.livePreview = None
+        self.livePreviewPending = False
+        self.livePreviewWaiting = False
+        self.songIndex = None
+        self.libraryList = None
+        if os.environ.get('MTG_PROFILE'):
+            Mprof.enable()
+        if Tr.enabled():
+            Tr.count_commands()
         cmds.showWindow(self.win)
         
     def end(self):
@@ -235,9 +429,9 @@ class MTGGui:
         specific error.
 
         Parameters:
-            errNo [None][int] : The number pertaining to the error message.
-            value [str]       : The value pertaining to the error message.
-                                Usually the cause of the error.
+            errNo [None][int]  : The number pertaining to the error message.
+            value [str][tuple] : The value pertaining to the error message.
+                                 Usually the cause of the error.
         On Exit:
             Creates a error message dialog for the user to be notified of the
             problem with the program.
@@ -286,6 +480,33 @@ class MTGGui:
                                message='You have not loaded a song into the'\
                                ' program.\nPlease do this before continuing.', 
                                icon="warning")
+        elif errNo == 8:
+            cmds.confirmDialog(title='Error', 
+                               message='Erosion only works with grid objects'\
+                               ' such as a polyPlane. "%s" is not.\nPlease '\
+                               'set the erosion iterations to 0 or select '\
+                               'another object.' % value, icon="warning")
+        elif errNo == 9:
+            cmds.confirmDialog(title='Error', 
+                               message='The start of the song range is not '\
+                               'before its end or the end of the song.\n'\
+                               'Please change the range or set the end to 0 '\
+                               'to use the rest of the song.', 
+                               icon="warning")
+        elif errNo == 10:
+            cmds.confirmDialog(title='Error', 
+                               message='The song range has %d frames, fewer '\
+                               'than the %d heights needed.\nPlease use a '\
+                               'longer song range, an object with fewer '\
+                               'vertices or a smaller displacement map.' % 
+                               value, 
+                               icon="warning")
+        elif errNo == 11:
+            cmds.confirmDialog(title='Error', 
+                               message='A terrain is still being generated.'\
+                               '\nPlease wait for it to finish or cancel it '\
+                               'from the progress window before generating '\
+                               'another.', icon="warning")
         else:
             if 'RIFF' in value[0]:
                 cmds.confirmDialog(title='Error', 
@@ -315,6 +536,76 @@ class MTGGui:
             cmds.textFieldButtonGrp(self.musicLoadGrp, e=True, 
                                     fileName=filename[0])
         
+    def music_library(self, *args):
+        """Opens a window listing the songs of a directory with their length
+        and format, read from the directory's song index so that the songs
+        don't have to be opened or imported (see 'mtgSongIndex').
+
+        Parameters:
+            args [tuple] : Ignore value. The value is returned by the button
+                           and is unused.
+
+        On Exit:
+            Opens the song library window for the chosen directory. Picking
+            a song in it sets the Music Location text field to the song.
+
+        """
+        folder = cmds.fileDialog2(fileMode=3, caption="Music Library")
+        if folder == None:
+            return
+        self.songIndex = Si.SongIndex(folder[0])
+        self.songIndex.refresh()
+        
+        winID = 'mtgSongLibrary'
+        if cmds.window(winID, exists=True):
+            cmds.deleteUI(winID)
+        cmds.window(winID, title='MTG :: Music Library', 
+                    widthHeight=(520, 400))
+        cmds.paneLayout()
+        self.libraryList = cmds.textScrollList(font='fixedWidthFont', 
+                                               selectCommand=self.pick_library_song, 
+                                               doubleClickCommand=par(self.pick_library_song, 
+                                                                      True))
+        labels = []
+        names = []
+        for name, song in self.songIndex.entries():
+            if 'error' in song:
+                labels.append('%-40s  %s' % (name, song['error']))
+            else:
+                labels.append('%-40s %10s  %5dHz %dch %2dbit' % (
+                              name, song['lengthtime'].split('.')[0], 
+                              song['framerate'], song['nchannels'], 
+                              song['sampwidth'] * 8))
+            names.append(name)
+        # All of the songs are added with one command, as each command 
+        # redraws the list
+        if names:
+            cmds.textScrollList(self.libraryList, e=True, append=labels, 
+                                uniqueTag=names)
+        cmds.showWindow(winID)
+        
+    def pick_library_song(self, load=False):
+        """Sets the Music Location text field to the song selected in the
+        song library window.
+
+        Parameters:
+            load [bool] : If True, the song is also loaded and the library
+                          window closed.
+
+        On Exit:
+            The Music Location text field is set to the selected song.
+
+        """
+        names = cmds.textScrollList(self.libraryList, q=True, 
+                                    selectUniqueTagItem=True)
+        if not names:
+            return
+        cmds.textFieldButtonGrp(self.musicLoadGrp, e=True, 
+                                fileName=self.songIndex.path(names[0]))
+        if load:
+            cmds.deleteUI('mtgSongLibrary')
+            self.load_song()
+        
     def load_song(self, *args):
         """Loads the song in the musicLoadGrp field and loads it into maya and
         creates a TerrainWaveFile with it.
@@ -336,7 +627,8 @@ class MTGGui:
         else:
             self.clear_song()
             try:
-                self.songInfo = Tw.TerrainWaveFile(os.path.abspath(filename), self.queue)
+                self.songInfo = Tw.TerrainWaveFile(os.path.abspath(filename))
+                self.start_analysis()
             except IOError:
                 self.error_message(2, filename)
             except Exception as e:
@@ -365,8 +657,12 @@ class MTGGui:
             the self.songInfo variable.
 
         """
+        self.end_live_preview()
+        if self.songInfo is not None:
+            self.songInfo.close()
         try:
-            self.songInfo = Tw.TerrainWaveFile(self.currentSongDir, self.queue)
+            self.songInfo = Tw.TerrainWaveFile(self.currentSongDir)
+            self.start_analysis()
         except IOError:
             self.error_message(3, self.currentSong)
             self.clear_song()
@@ -395,6 +691,42 @@ class MTGGui:
         if not(check):
             self.error_message(errNo, msg)
         
+    def start_analysis(self):
+        """Starts decoding and summing the loaded song on a background
+        thread while the options are being set, so that generating the
+        terrain does not have to read the song.
+
+        On Exit:
+            The analysis is started and its progress is shown on the song
+            analysis progress bar as Maya becomes idle.
+
+        """
+        cmds.progressBar(self.analysisPB, e=True, progress=0)
+        self.songInfo.startsummary(par(mu.executeDeferred, 
+                                       self.show_analysis))
+        
+    def show_analysis(self, done, total):
+        """Shows the progress of the song analysis. This is called through
+        'maya.utils.executeDeferred' from the analysis thread.
+
+        Parameters:
+            done [int]  : The number of song frames read.
+            total [int] : The number of frames in the song.
+
+        On Exit:
+            Updates the song analysis progress bar if it still exists, and
+            updates a live preview that was waiting for the analysis once it
+            has finished.
+
+        """
+        if cmds.progressBar(self.analysisPB, exists=True):
+            cmds.progressBar(self.analysisPB, e=True, 
+                             progress=int(done * 100.0 / max(total, 1)))
+        if (self.livePreviewWaiting and self.songInfo is not None and 
+                self.songInfo.summary.finished.is_set()):
+            self.livePreviewWaiting = False
+            self.schedule_live_preview()
+        
     def clear_song(self, *args):
         """Clears the currently loaded song in the program.
 
@@ -408,11 +740,13 @@ class MTGGui:
             song.
 
         """
+        self.end_live_preview()
         if self.currentSong != '...':
             cmds.delete(self.currentSong)
             self.currentSong = '...'
             self.currentSongDir = None
             cmds.text(self.songText, e=True, label=self.currentSong)
+            cmds.progressBar(self.analysisPB, e=True, progress=0)
             self.songInfo.close()
             self.songInfo = None
             self.enable_disable_widgets((self.reloadMusicB, self.playMusicB, 
@@ -475,6 +809,137 @@ class MTGGui:
                    self.curvePresetsRow)
         self.enable_disable_widgets(widgets, state)
         
+    def toggle_dispmap_widgets(self, state, *args):
+        """Used to change the enable state of the displacement map widgets.
+
+        Parameters:
+            state [bool] : The state for which the widgets will be turned to.
+            args [tuple] : Ignore value. The value is returned by the button
+                           and is unused.
+
+        On Exit:
+            The displacement map resolution option menu will be enabled or
+            disabled.
+
+        """
+        self.enable_disable_widgets(self.dispSizeOMGrp, state)
+        
+    def toggle_animated_widgets(self, state, *args):
+        """Used to change the enable state of the animated terrain widgets.
+
+        Parameters:
+            state [bool] : The state for which the widgets will be turned to.
+            args [tuple] : Ignore value. The value is returned by the button
+                           and is unused.
+
+        On Exit:
+            The animation window float field will be enabled or disabled.
+
+        """
+        self.enable_disable_widgets(self.animWindowFFGrp, state)
+        
+    def toggle_live_preview(self, state, *args):
+        """Starts or ends the live preview of the terrain on the polygon
+        object.
+
+        Parameters:
+            state [bool] : If True, the live preview is started. Else, the
+                           object is moved back to where it was.
+            args [tuple] : Ignore value. The value is returned by the button
+                           and is unused.
+
+        On Exit:
+            The polygon object shows the terrain with the current options, or
+            is restored.
+
+        """
+        if not(state):
+            self.end_live_preview()
+            return
+        pObjectNam = cmds.textFieldButtonGrp(self.polygonObjTFGrp, q=True, 
+                                             tx=True)
+        if self.songInfo is None:
+            self.error_message(7)
+        elif not(cmds.objExists(pObjectNam)):
+            self.error_message(4, pObjectNam)
+        else:
+            self.end_live_preview()
+            self.livePreview = Main.TerrainPreview(self.songInfo, pObjectNam)
+            self.schedule_live_preview()
+            return
+        cmds.checkBox(self.livePreviewCB, e=True, value=False)
+        
+    def schedule_live_preview(self, *args):
+        """Used by the terrain option controls to update the live preview the
+        next time Maya is idle. Any changes made before then, such as from
+        dragging the magnitude slider, are shown by the same update so the
+        object is moved at most once for each redraw of the viewport.
+
+        Parameters:
+            args [tuple] : Ignore value. The value is returned by the control
+                           and is unused.
+
+        On Exit:
+            Queues 'update_live_preview' if there is a live preview and it is
+            not already queued.
+
+        """
+        if self.livePreview is not None and not(self.livePreviewPending):
+            self.livePreviewPending = True
+            mu.executeDeferred(self.update_live_preview)
+            
+    def update_live_preview(self):
+        """Moves the live preview object to the current terrain options.
+
+        On Exit:
+            The polygon object shows the terrain with the current magnitude,
+            direction, negative values, reverse song and song range options.
+            If the song is still being analysed, the object is moved when the
+            analysis finishes instead (see 'show_analysis').
+
+        """
+        self.livePreviewPending = False
+        if self.livePreview is None:
+            return
+        axis = ''.join(a for val, a in enumerate(('x', 'y', 'z', 'n'), 1) 
+                       if cmds.checkBoxGrp(self.deformDirCBGrp, 
+                                           **{"q": True, "v%d" % val: True}))
+        start, end = self.song_range()
+        if start >= (end or self.livePreview.songInfo.getsonglength()):
+            return
+        self.livePreviewWaiting = not(self.livePreview.update(
+            cmds.floatSliderGrp(self.deformMagFSlGrp, q=True, v=True), axis, 
+            negative=cmds.checkBoxGrp(self.otherOptCBGrp, q=True, v1=True),
+            reverse=cmds.checkBoxGrp(self.otherOptCBGrp, q=True, v3=True), 
+            start=start, end=end))
+        
+    def song_range(self):
+        """Reads the Song Range fields.
+
+        On Exit:
+            Returns a 2 tuple of the start and end of the song range in
+            seconds, with the end as None if it is 0 so that the rest of the
+            song is used.
+
+        """
+        start, end = cmds.floatFieldGrp(self.songRangeFFGrp, q=True, 
+                                        value=True)
+        return max(start, 0.0), (end if end > 0 else None)
+        
+    def end_live_preview(self):
+        """Ends the live preview, moving the object back to where it was.
+
+        On Exit:
+            The polygon object is restored and the Live Preview check box is
+            turned off.
+
+        """
+        if self.livePreview is not None:
+            self.livePreview.restore()
+            self.livePreview = None
+        if cmds.checkBox(self.livePreviewCB, exists=True):
+            cmds.checkBox(self.livePreviewCB, e=True, value=False)
+        
     def select_obj(self):
         """Used for the polygonObjTFGrp. Stores the first currently selected
         object in the Maya scene if it is a polygon object.
@@ -764,6 +1229,72 @@ class MTGGui:
                          type='double3')
             cmds.setAttr('%s.colorEntryList[2].position' % ramp, 0)
             
+    def get_ramp_positions(self, ramp):
+        """Gathers the positions of the cliff, grass and snow entries of the
+        texture positioning ramp.
+
+        Parameters:
+            ramp [str] : The name of the texture positioning ramp.
+
+        On Exit:
+            Resets the ramp entry colours and returns a 3 tuple of the cliff,
+            grass and snow position lists.
+
+        """
+        self.reset_ramp_colours(ramp)
+        
+        rampInfo = self.get_tex_ramp_info(ramp)
+        cliffPos = []
+        grassPos = []
+        snowPos = []
+        for key,value in rampInfo.items():
+            if key == 'ramp':
+                continue
+            v = Mf.closest_colour(value[1], (GRASS_COLOUR,CLIFF_COLOUR,SNOW_COLOUR))
+            if v == CLIFF_COLOUR:
+                cliffPos.append(value[0])
+            elif v == GRASS_COLOUR:
+                grassPos.append(value[0])
+            elif v == SNOW_COLOUR:
+                snowPos.append(value[0])
+            else:
+                raise ValueError('Something has gone wrong with ramp colours')
+        return cliffPos, grassPos, snowPos
+        
+    def preview_bands(self, clear=False, *args):
+        """Colours the vertices of the selected polygon object to preview
+        where the cliff, grass and snow textures will land with the current
+        texture positioning ramp.
+
+        Parameters:
+            clear [bool] : If True, the preview colours will be removed
+                           instead.
+            args [tuple] : Ignore value. The value is returned by the button
+                           and is unused.
+
+        On Exit:
+            Sets or clears the band preview colours on the polygon object.
+
+        """
+        pObjectNam = cmds.textFieldButtonGrp(self.polygonObjTFGrp, q=True, 
+                                             tx=True)
+        if not(cmds.objExists(pObjectNam)):
+            self.error_message(4, pObjectNam)
+        elif clear:
+            Main.clear_terrain_band_preview(pObjectNam)
+        else:
+            snow = cmds.checkBox(self.snowTexCB, q=True, value=True)
+            grass = cmds.checkBox(self.grassTexCB, q=True, value=True)
+            cliffPos, grassPos, snowPos = self.get_ramp_positions(self.ramp)
+            Main.preview_terrain_bands(pObjectNam, 
+                                       (CLIFF_COLOUR, GRASS_COLOUR, 
+                                        SNOW_COLOUR), 
+                                       cliffPos=cliffPos, 
+                                       grassPos=grassPos if grass else (), 
+                                       snowPos=snowPos if snow else (), 
+                                       rampInterp=cmds.getAttr('%s.interpolation' 
+                                                               % self.ramp))
+        
     def create_entry(self, entryType, ramp, *args):
         eType = cmds.optionMenuGrp(entryType, q=True, value=True)
         entriesLs = cmds.getAttr('%s.colorEntryList' % ramp, mi=True)
@@ -806,6 +1337,26 @@ class MTGGui:
                                             v=True)
         falloffCurve = ",".join(cmds.optionVar(q='softSelectCurve'))
         
+        dispMap = cmds.checkBox(self.dispMapCB, q=True, v=True)
+        dispSize = int(cmds.optionMenuGrp(self.dispSizeOMGrp, q=True, 
+                                          value=True))
+        thermalIter = cmds.intSliderGrp(self.thermalISlGrp, q=True, v=True)
+        hydraulicIter = cmds.intSliderGrp(self.hydraulicISlGrp, q=True, 
+                                          v=True)
+        erosionStrength = cmds.floatSliderGrp(self.erosionFSlGrp, q=True, 
+                                              v=True)
+        smoothIter = cmds.intSliderGrp(self.smoothISlGrp, q=True, v=True)
+        smoothStrength = cmds.floatSliderGrp(self.smoothFSlGrp, q=True, 
+                                             v=True)
+        cotangent = cmds.checkBox(self.cotangentCB, q=True, v=True)
+        animated = cmds.checkBox(self.animatedCB, q=True, v=True)
+        animWindow = cmds.floatFieldGrp(self.animWindowFFGrp, q=True, 
+                                        value1=True)
+        songStart, songEnd = self.song_range()
+        
+        if not(self.task is None or self.task.finished):
+            self.error_message(11)
+            return
         if self.currentSongDir is not None and not(os.path.exists(self.currentSongDir)):
             self.error_message(6)
             check = False
@@ -818,43 +1369,37 @@ class MTGGui:
         if checkBoxOpt['axis'] == '':
             self.error_message(5)
             check = False
+        if (self.songInfo is not None and 
+                songStart >= (songEnd or self.songInfo.getsonglength())):
+            self.error_message(9)
+            check = False
+        elif check and not(animated):
+            # every height needs at least one frame of the song range
+            nframes = self.songInfo.songrange(songStart, songEnd)[1]
+            nHeights = (dispSize**2 if dispMap else 
+                        cmds.polyEvaluate(pObjectNam, v=True))
+            if nframes < nHeights:
+                self.error_message(10, (nframes, nHeights))
+                check = False
+        if (check and (thermalIter > 0 or hydraulicIter > 0) and 
+            not(dispMap or animated) and Main.grid_shape(pObjectNam) is None):
+            self.error_message(8, pObjectNam)
+            check = False
 
         if check:
-            msg = "Starting"
-            ratio = 1
-            currentProgress = 0
-            completeMessage = "{}: {}%".format(msg, currentProgress)
-            cmds.progressWindow(title='Generating Terrain', progress=currentProgress,
-                                status=completeMessage, isInterruptable=False)
-
-            thread = GenerateTerrainThread(self.queue, self.songInfo, deformMag, pObjectNam,
-                                           checkBoxOpt['axis'], sSelect, falloffCurve, falloffMode, falloffRadius,
-                                           checkBoxOpt['negativeValues'], checkBoxOpt['separateDeformDirection'],
-                                           checkBoxOpt['reverseSong'], checkBoxOpt['refresh'])
-            mu.processIdleEvents()
-            thread.start()
-            self.complete = False
-            while not self.complete:
-                while not self.queue.empty():
-                    getM = self.queue.get(block=False)
-
-                    if type(getM) == tuple:
-                        ratio = 100.0/getM[1]
-                        msg = getM[0]
-                        currentProgress = 0
-                        completeMessage = "{}: {}%".format(msg, currentProgress)
-                    elif type(getM) == str and getM.lower() == "complete":
-                        self.complete=True
-                    elif getM == None:
-                        pass
-                    else:
-                        currentProgress = int(getM * ratio)
-                        completeMessage = "{}: {}%".format(msg, currentProgress)
-
-                    cmds.progressWindow(edit=True, progress=currentProgress, status=completeMessage)
-                cmds.pause(seconds=0.001)
-                mu.processIdleEvents()
-            cmds.progressWindow(endProgress=1)
+            self.end_live_preview()
+            steps = Main.music_displace_steps(
+                self.songInfo, deformMag, pObjectNam, checkBoxOpt['axis'],
+                sSelect, falloffCurve, falloffMode, falloffRadius,
+                checkBoxOpt['negativeValues'],
+                checkBoxOpt['separateDeformDirection'],
+                checkBoxOpt['reverseSong'], checkBoxOpt['refresh'],
+                dispMap=dispMap, dispSize=dispSize, thermalIter=thermalIter,
+                hydraulicIter=hydraulicIter, erosionStrength=erosionStrength,
+                smoothIter=smoothIter, smoothStrength=smoothStrength,
+                cotangent=cotangent, animated=animated, animWindow=animWindow,
+                start=songStart, end=songEnd)
+            self.task = ChunkedTask('Generating Terrain', steps)
             
     def generate_texture(self, *args):
         check=True
@@ -887,30 +1432,30 @@ class MTGGui:
         rampNoise = cmds.getAttr('%s.noise' % self.ramp)
         rampNoiseFreq = cmds.getAttr('%s.noiseFreq' % self.ramp)
         
-        self.reset_ramp_colours(self.ramp)
+        splatMap = cmds.checkBox(self.splatMapCB, q=True, value=True)
         
-        rampInfo = self.get_tex_ramp_info(self.ramp)
-        cliffPos = []
-        grassPos = []
-        snowPos = []
-        for key,value in rampInfo.items():
-            if key == 'ramp':
-                continue
-            v = Mf.closest_colour(value[1], (GRASS_COLOUR,CLIFF_COLOUR,SNOW_COLOUR))
-            if v == CLIFF_COLOUR:
-                cliffPos.append(value[0])
-            elif v == GRASS_COLOUR:
-                grassPos.append(value[0])
-            elif v == SNOW_COLOUR:
-                snowPos.append(value[0])
-            else:
-                raise ValueError('Something has gone wrong with ramp colours')
+        cliffPos, grassPos, snowPos = self.get_ramp_positions(self.ramp)
             
         if not(cmds.objExists(pObjectNam)):
             self.error_message(4, pObjectNam)
             check = False
         
-        if check:
+        commands = Mprof.STATS.copy()
+        if check and splatMap:
+            tInfo = Main.create_splat_texture(pObjectNam, cTexType, 
+                                nOfCTex=cNumOfTex, cRandTexs=cRandomTex, 
+                                cliffPos=cliffPos, snow=snowTex, 
+                                snowPos=snowPos, grass=grassTex, 
+                                grassPos=grassPos, grassType=gTexType, 
+                                nOfGTex=gNumofTex, gRandTexs=gRandomTex, 
+                                uRep=texRepU, vRep=texRepV, uNoise=texNoiseU, 
+                                vNoise=texNoiseV, bDepth=bDepth, 
+                                rampInterp=rampInterp)
+            
+            Main.assign_terrain_shader(tInfo['lambert'][1], pObjectNam,
+                                       tInfo['placements'])
+            cmds.select(tInfo['lambert'][0])
+        elif check:
             tInfo = Main.create_texture(cTexType, nOfCTex=cNumOfTex,
                                 cRandTexs=cRandomTex, cliffPos=cliffPos, 
                                 snow=snowTex, snowPos=snowPos,
@@ -927,6 +1472,55 @@ class MTGGui:
             Main.assign_terrain_shader(tInfo['lambert'][1], pObjectNam,
                                        tInfo['placements'])
             cmds.select(tInfo['lambert'][0])
+        if check and Tr.enabled():
+            Tr.dump()
+        if check and Mprof.enabled():
+            print Mprof.STATS.since(commands).report(title='Generate Texture')
+        
+    def scatter_instances(self, *args):
+        """Scatters instances of rocks or grass tufts over the selected
+        polygon object using the current texture positioning ramp and
+        texture types. Rocks are scattered on the cliff band and grass tufts
+        on the grass and snow bands (see 'mtgMain.scatter_instances').
+
+        Parameters:
+            args [tuple] : Ignore value. The value is returned by the button
+                           and is unused.
+
+        On Exit:
+            Creates a particle instancer of the scattered objects.
+
+        """
+        pObjectNam = cmds.textFieldButtonGrp(self.polygonObjTFGrp, q=True, 
+                                             tx=True)
+        band = cmds.optionMenuGrp(self.scatterBandOMGrp, q=True, 
+                                  value=True).lower()
+        nInstances = cmds.intSliderGrp(self.nOfInstancesISlGrp, q=True, 
+                                       value=True)
+        songDensity = cmds.checkBox(self.songDensityCB, q=True, value=True)
+        if band == 'cliff':
+            texType = cmds.optionMenuGrp(self.cliffTypesOMGrp, q=True, 
+                                         value=True)
+        else:
+            texType = cmds.optionMenuGrp(self.grassTypesOMGrp, q=True, 
+                                         value=True)
+        
+        if not(cmds.objExists(pObjectNam)):
+            self.error_message(4, pObjectNam)
+        elif songDensity and self.songInfo is None:
+            self.error_message(7)
+        else:
+            snow = cmds.checkBox(self.snowTexCB, q=True, value=True)
+            grass = cmds.checkBox(self.grassTexCB, q=True, value=True)
+            cliffPos, grassPos, snowPos = self.get_ramp_positions(self.ramp)
+            scatter = Main.scatter_instances(pObjectNam, nInstances, band, 
+                                             texType=texType, 
+                                             cliffPos=cliffPos, 
+                                             grassPos=grassPos if grass else (), 
+                                             snowPos=snowPos if snow else (), 
+                                             songInfo=self.songInfo if songDensity 
+                                             else None)
+            cmds.select(scatter['particle'][0])
         
     def create_interface(self):
         mainForm = cmds.formLayout()
@@ -975,6 +1569,8 @@ class MTGGui:
         
         cmds.setParent('..')
         cmds.columnLayout(adjustableColumn=True)
+        self.analysisPB = cmds.progressBar(maxValue=100, height=6, 
+                                           annotation='Song analysis')
         self.musicLoadGrp = cmds.textFieldButtonGrp(label='Music Location', 
                                                     buttonLabel='Browse', 
                                                     buttonCommand=self.music_browse, 
@@ -983,6 +1579,8 @@ class MTGGui:
         
         musicForm = cmds.formLayout(numberOfDivisions=100)
         
+        self.libraryMusicB = cmds.button(label='Library', 
+                                         command=self.music_library, width=70)
         self.loadMusicB = cmds.button(label='Load', command=self.load_song, 
                                       width=70)
         self.playMusicB = cmds.button(label='Play', command=self.play_song, 
@@ -993,19 +1591,23 @@ class MTGGui:
                                        width=70, enable=False)
         
         cmds.formLayout(musicForm, edit=True, 
-                        attachForm=[(self.loadMusicB, "bottom", 5), 
+                        attachForm=[(self.libraryMusicB, "bottom", 5), 
+                                    (self.loadMusicB, "bottom", 5), 
                                     (self.playMusicB, "bottom", 5), 
                                     (self.reloadMusicB, "bottom", 5), 
                                     (self.clearMusicB, "bottom", 5)], 
-                        attachControl=[(self.loadMusicB, 'right', 5, self.playMusicB), 
+                        attachControl=[(self.libraryMusicB, 'right', 5, self.loadMusicB), 
+                                       (self.loadMusicB, 'right', 5, self.playMusicB), 
                                        (self.playMusicB, 'right', 5, self.reloadMusicB), 
                                        (self.reloadMusicB, 'right', 5, self.clearMusicB)], 
-                        attachPosition=[(self.loadMusicB, "left", 5, 15), 
-                                        (self.playMusicB, "left", 5, 34), 
-                                        (self.reloadMusicB, "left", 5, 53), 
-                                        (self.clearMusicB, "left", 5, 71), 
-                                        (self.clearMusicB, "right", 5, 90)], 
-                        attachNone=[(self.loadMusicB, "top"), 
+                        attachPosition=[(self.libraryMusicB, "left", 5, 5), 
+                                        (self.loadMusicB, "left", 5, 24), 
+                                        (self.playMusicB, "left", 5, 43), 
+                                        (self.reloadMusicB, "left", 5, 62), 
+                                        (self.clearMusicB, "left", 5, 81), 
+                                        (self.clearMusicB, "right", 5, 99)], 
+                        attachNone=[(self.libraryMusicB, "top"), 
+                                    (self.loadMusicB, "top"), 
                                     (self.playMusicB, "top"), 
                                     (self.reloadMusicB, "top"), 
                                     (self.clearMusicB, "top")])
@@ -1027,19 +1629,113 @@ class MTGGui:
                                                    fieldMaxValue=100000, 
                                                    value=10, adj=3, 
                                                    cw=[(1,100)], 
-                                                   cat=[(2,'left', 5)])
+                                                   cat=[(2,'left', 5)], 
+                                                   dc=self.schedule_live_preview, 
+                                                   cc=self.schedule_live_preview)
         self.deformDirCBGrp = cmds.checkBoxGrp(numberOfCheckBoxes=4, 
                                                label='Deform Direction:', 
                                                labelArray4=['X', 'Y', 'Z', 'N'], 
                                                cw=[(1,100),(2,50),(3,50),(4,50)], 
-                                               cat=[(2,'left', 7)], value2=True)
+                                               cat=[(2,'left', 7)], value2=True, 
+                                               cc=self.schedule_live_preview)
         self.otherOptCBGrp = cmds.checkBoxGrp(numberOfCheckBoxes=4,
                                               label='Other Options:',
                                               labelArray4=['Negative Values',
                                                            'Separate Deform Direction',
                                                            'Reverse Song', 'Refresh on Deform'],
                                               height=23, cw=[(1,100),(3,150),(4,90)],
-                                              cat=[(2,'left', 7)])
+                                              cat=[(2,'left', 7)], 
+                                              cc=self.schedule_live_preview)
+        self.songRangeFFGrp = cmds.floatFieldGrp(numberOfFields=2, 
+                                                 label='Song Range (s):', 
+                                                 value1=0.0, value2=0.0, 
+                                                 precision=2, 
+                                                 cw=[(1,100)], 
+                                                 cat=[(2,'left', 5)], 
+                                                 annotation='The start and '\
+                                                 'end of the song used. An '\
+                                                 'end of 0 is the end of the '\
+                                                 'song.', 
+                                                 cc=self.schedule_live_preview)
+        
+        cmds.rowLayout(numberOfColumns=2, columnWidth2=(100, 30), 
+                       columnAlign=[(1, 'right'), (2, 'left')], 
+                       columnAttach=[(1, 'right', 0), (2, 'left', 5)], 
+                       height=25)
+        cmds.text(label='Live Preview:')
+        self.livePreviewCB = cmds.checkBox(label='', value=0, 
+                                           cc=self.toggle_live_preview)
+        cmds.setParent('..')
+        
+        cmds.rowLayout(numberOfColumns=3, columnWidth3=(100, 30, 200), 
+                       columnAlign=[(1, 'right'), (2, 'left'), (3, 'left')], 
+                       columnAttach=[(1, 'right', 0), (2, 'left', 5), (3, 'left', 5)], 
+                       height=25)
+        cmds.text(label='Displacement Map:')
+        self.dispMapCB = cmds.checkBox(label='', value=0, 
+                                       cc=self.toggle_dispmap_widgets)
+        self.dispSizeOMGrp = cmds.optionMenuGrp(label='Resolution:', 
+                                                cw=[(1,60)], enable=False)
+        for size in DISPLACEMENT_SIZES:
+            cmds.menuItem(label=str(size))
+        cmds.optionMenuGrp(self.dispSizeOMGrp, e=True, select=3)
+        cmds.setParent('..')
+        
+        cmds.rowLayout(numberOfColumns=3, columnWidth3=(100, 30, 200), 
+                       columnAlign=[(1, 'right'), (2, 'left'), (3, 'left')], 
+                       columnAttach=[(1, 'right', 0), (2, 'left', 5), (3, 'left', 5)], 
+                       height=25)
+        cmds.text(label='Animated:')
+        self.animatedCB = cmds.checkBox(label='', value=0, 
+                                        cc=self.toggle_animated_widgets)
+        self.animWindowFFGrp = cmds.floatFieldGrp(label='Window (s):', 
+                                                  value1=10.0, precision=1, 
+                                                  cw=[(1,60)], enable=False)
+        cmds.setParent('..')
+        
+        cmds.frameLayout(label='Erosion Options', borderStyle='in', 
+                         cll=True, cl=True)
+        cmds.columnLayout(adj=True)
+        self.thermalISlGrp = cmds.intSliderGrp(label='Thermal Iterations:', 
+                                               field=True, minValue=0, 
+                                               maxValue=200, 
+                                               fieldMaxValue=10000, value=0, 
+                                               adj=3, cw=[(1,110)], 
+                                               cat=[(2,'left', 5)])
+        self.hydraulicISlGrp = cmds.intSliderGrp(label='Hydraulic Iterations:', 
+                                                 field=True, minValue=0, 
+                                                 maxValue=200, 
+                                                 fieldMaxValue=10000, value=0, 
+                                                 adj=3, cw=[(1,110)], 
+                                                 cat=[(2,'left', 5)])
+        self.erosionFSlGrp = cmds.floatSliderGrp(label='Strength:', 
+                                                 field=True, minValue=0, 
+                                                 maxValue=1, value=0.5, 
+                                                 adj=3, cw=[(1,110)], 
+                                                 cat=[(2,'left', 5)])
+        cmds.setParent(terrainOptColLayout)
+        
+        cmds.frameLayout(label='Smoothing Options', borderStyle='in', 
+                         cll=True, cl=True)
+        cmds.columnLayout(adj=True)
+        self.smoothISlGrp = cmds.intSliderGrp(label='Smooth Iterations:', 
+                                              field=True, minValue=0, 
+                                              maxValue=50, 
+                                              fieldMaxValue=10000, value=0, 
+                                              adj=3, cw=[(1,110)], 
+                                              cat=[(2,'left', 5)])
+        self.smoothFSlGrp = cmds.floatSliderGrp(label='Strength:', 
+                                                field=True, minValue=0, 
+                                                maxValue=1, value=0.5, 
+                                                adj=3, cw=[(1,110)], 
+                                                cat=[(2,'left', 5)])
+        cmds.rowLayout(numberOfColumns=2, columnWidth2=(115, 15), 
+                       columnAlign=[(1, 'right'), (2, 'left')], 
+                       columnAttach=[(1, 'right', 0), (2, 'left', 5)], 
+                       height=25)
+        cmds.text(label='Cotangent Weights:')
+        self.cotangentCB = cmds.checkBox(label='', value=0)
+        cmds.setParent(terrainOptColLayout)
         
         cmds.frameLayout(label='Soft Select Options', borderStyle='in', 
                          cll=True)
@@ -1338,6 +2034,14 @@ class MTGGui:
                                           fieldMinValue=-100000, value=0.4, 
                                           precision=3, adj=3, cw=[(1,110)], 
                                           cat=[(2,'left', 5)])
+        
+        cmds.rowLayout(numberOfColumns=2, columnWidth2=(115, 15), 
+                       columnAlign=[(1, 'right'), (2, 'left')], 
+                       columnAttach=[(1, 'right', 0), (2, 'left', 5)], 
+                       height=25)
+        cmds.text(label='Splat Map Blend:')
+        self.splatMapCB = cmds.checkBox(label='', value=0)
+        cmds.setParent('..')
 
         cmds.rowLayout(nc=2, cw=[(1, 210)], cal=[(1, 'right')], cat=[(1, 'right', 0), (2, 'left', 5)])
 
@@ -1426,10 +2130,44 @@ class MTGGui:
                                               cw=[(1,110),(3,150)], 
                                               cat=[(2,'left', 5)])
         
+        previewRow = cmds.rowLayout(nc=2, cw=[(1,275)], cal=[(1,'right')], 
+                                    cat=[(1,'right',5)])
+        self.previewBandsB = cmds.button(label='Preview Bands', width=100, 
+                                         command=par(self.preview_bands, 
+                                                     False))
+        self.clearPreviewB = cmds.button(label='Clear Preview', width=100, 
+                                         command=par(self.preview_bands, True))
+        
         cmds.setParent(mainTexturingTab)
         self.generateTerrainB = cmds.button(label='Generate Texture!', 
                                             height=29, 
                                             command=self.generate_texture)
+        cmds.frameLayout(label='Scatter Instances', borderStyle='in', 
+                         cll=True, cl=True)
+        cmds.columnLayout(adj=True)
+        self.scatterBandOMGrp = cmds.optionMenuGrp(label='Scatter On:', 
+                                                   cw=[(1,110),(3,150)], 
+                                                   cat=[(2,'left', 5)])
+        cmds.menuItem(label='Grass')
+        cmds.menuItem(label='Cliff')
+        cmds.menuItem(label='Snow')
+        self.nOfInstancesISlGrp = cmds.intSliderGrp(label='Instances:', 
+                                                    field=True, minValue=1, 
+                                                    maxValue=100000, 
+                                                    fieldMaxValue=10000000, 
+                                                    value=10000, adj=3, 
+                                                    cw=[(1,110)], 
+                                                    cat=[(2,'left', 5)])
+        cmds.rowLayout(numberOfColumns=2, columnWidth2=(115, 15), 
+                       columnAlign=[(1, 'right'), (2, 'left')], 
+                       columnAttach=[(1, 'right', 0), (2, 'left', 5)], 
+                       height=25)
+        cmds.text(label='Song Density:')
+        self.songDensityCB = cmds.checkBox(label='', value=0)
+        cmds.setParent('..')
+        self.scatterB = cmds.button(label='Scatter!', height=29, 
+                                    command=self.scatter_instances)
+        
         cmds.tabLayout(tabs, edit=True, 
                        tabLabel=((mainTerrainTab, 'Terrain'), 
                                  (mainTexturingTab, 'Texturing')) )
@@ -0,0 +1,132 @@
+r'''Maya plug-in of the 'mtgHeightCache' deformer, which moves the vertices of
+   a terrain by the heights stored in an MTG height cache.
+
+   The idea behind this plug-in is to animate a terrain with a song without
+   any keyframes. The heights of every frame are written to a cache file by
+   'mtgMain.create_animated_terrain' and the deformer only reads the frame
+   for the current time from the cache when the scene is evaluated, so
+   scrubbing the timeline only reads the frames that are looked at.
+
+   The plug-in is loaded by 'mtgMain.load_cache_plugin', or it can be loaded
+   from the Plug-in Manager as long as the 'mtg' package can be imported.
+
+       >>> import maya.cmds as cmds
+       >>> import mtg.mtgMain as Main
+       >>> Main.load_cache_plugin()
+       >>> obj = cmds.polyPlane(w=24, h=24, sx=30, sy=30)
+       >>> deformer = cmds.deformer(obj[0], type='mtgHeightCache')
+       >>> cmds.getAttr('%s.magnitude' % deformer[0])
+       1.0
+
+'''
+import numpy as np
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as om2a
+
+import mtg.terrainCache as tc
+
+NODE_NAME = 'mtgHeightCache'
+NODE_ID = om2.MTypeId(0x0007F4C1)
+
+
+def maya_useNewAPI():
+    '''Tells Maya that this plug-in uses the Python API 2.0.'''
+    pass
+
+
+class MTGHeightCache(om2a.MPxDeformerNode):
+    '''Deformer that adds the heights of the current frame of a height cache
+    to the points of the geometry along one of the object axes.
+
+    Attributes:
+        cachePath [MObject]  : The file path of the height cache.
+        time [MObject]       : The scene time, connected to 'time1.outTime'.
+        magnitude [MObject]  : The value the cached heights are multiplied by.
+        axis [MObject]       : The object axis the points are moved along.
+        cache [None][object] : The 'terrainCache.HeightCache' opened by
+                               this node, kept open between evaluations.
+
+    '''
+    cachePath = None
+    time = None
+    magnitude = None
+    axis = None
+
+    def __init__(self):
+        om2a.MPxDeformerNode.__init__(self)
+        self.cache = None
+
+    def open_cache(self, path):
+        '''Returns the height cache for 'path', only opening the file again
+        when the path has changed.'''
+        if self.cache is None or self.cache.path != path:
+            if self.cache is not None:
+                self.cache.close()
+            self.cache = tc.HeightCache(path)
+        return self.cache
+
+    def deform(self, dataBlock, geomIter, matrix, multiIndex):
+        envelope = dataBlock.inputValue(om2a.MPxDeformerNode.envelope).asFloat()
+        path = dataBlock.inputValue(MTGHeightCache.cachePath).asString()
+        if envelope == 0 or path == '':
+            return
+        seconds = dataBlock.inputValue(MTGHeightCache.time).asTime().asUnits(
+            om2.MTime.kSeconds)
+        magnitude = dataBlock.inputValue(MTGHeightCache.magnitude).asFloat()
+        axis = dataBlock.inputValue(MTGHeightCache.axis).asShort()
+
+        try:
+            cache = self.open_cache(path)
+        except (IOError, ValueError):
+            return
+        heights = cache.frame(cache.frame_at(seconds)) * (envelope * magnitude)
+
+        # The points are moved as one array and handed back to Maya in one
+        # go, rather than getting and setting each MPoint in Python
+        points = np.array(geomIter.allPositions(), dtype=np.float64)
+        nPoints = min(len(points), len(heights))
+        points[:nPoints, axis] += heights[:nPoints]
+        geomIter.setAllPositions(om2.MPointArray(points.tolist()))
+
+
+def creator():
+    return MTGHeightCache()
+
+
+def initialize():
+    typedAttr = om2.MFnTypedAttribute()
+    MTGHeightCache.cachePath = typedAttr.create('cachePath', 'cp',
+                                                om2.MFnData.kString)
+    typedAttr.usedAsFilename = True
+
+    unitAttr = om2.MFnUnitAttribute()
+    MTGHeightCache.time = unitAttr.create('time', 'tm',
+                                          om2.MFnUnitAttribute.kTime, 0.0)
+
+    numAttr = om2.MFnNumericAttribute()
+    MTGHeightCache.magnitude = numAttr.create('magnitude', 'mag',
+                                              om2.MFnNumericData.kFloat, 1.0)
+    numAttr.keyable = True
+
+    enumAttr = om2.MFnEnumAttribute()
+    MTGHeightCache.axis = enumAttr.create('axis', 'ax', 1)
+    for i, name in enumerate(('X', 'Y', 'Z')):
+        enumAttr.addField(name, i)
+    enumAttr.keyable = True
+
+    outputGeom = om2a.MPxDeformerNode.outputGeom
+    for attr in (MTGHeightCache.cachePath, MTGHeightCache.time,
+                 MTGHeightCache.magnitude, MTGHeightCache.axis):
+        om2a.MPxDeformerNode.addAttribute(attr)
+        om2a.MPxDeformerNode.attributeAffects(attr, outputGeom)
+
+
+def initializePlugin(plugin):
+    pluginFn = om2.MFnPlugin(plugin, 'Jon Flynn', '1.0')
+    pluginFn.registerNode(NODE_NAME, NODE_ID, creator, initialize,
+                          om2.MPxNode.kDeformerNode)
+
+
+def uninitializePlugin(plugin):
+    pluginFn = om2.MFnPlugin(plugin)
+    pluginFn.deregisterNode(NODE_ID)
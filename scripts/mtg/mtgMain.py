@@ -38,23 +38,40 @@ r'''Module of procedures and variables for creating terrain from music.
 
 
 import os
+import array
 import random as rand
 
 try:
     import maya.cmds as cmds
     import mayaSnippet.mayaFuncs as mf
     import maya.utils as mu
-    mf.mel_file_import('AEplace3dTextureTemplate')  
 except:
     print 'ERROR importing modules'
     
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 import terrainWave as tw
+import terrainBands as tb
+import terrainImage as ti
+import terrainScatter as ts
+import terrainErosion as te
+import terrainSmooth as tsm
+import terrainGrid as tg
+import terrainCache as tc
+import mtgProgress as mp
+import mtgTrace as tr
+import mtgMemory as mm
 
 FILE_DIR = os.path.abspath(__file__)
 MTG_DIRECTORY = os.path.split(FILE_DIR)[0]
 TEX_DIRECTORY = os.path.join(MTG_DIRECTORY, 'textures')
 CLIFF_TEX_DIR = os.path.join(TEX_DIRECTORY, 'cliff_Textures')
 GRASS_TEX_DIR = os.path.join(TEX_DIRECTORY, 'grass_Textures')
+CACHE_PLUGIN = os.path.join(MTG_DIRECTORY, 'mtgHeightCacheDeformer.py')
+CACHE_NODE = 'mtgHeightCache'
 
 class COLOUR_SPACES:
     linear = 1
@@ -62,6 +79,12 @@ class COLOUR_SPACES:
 
 COLOUR_SPACE_VALUES = {1: 1.0, 2: 2.2}
 
+SPLAT_SIZE_RANGE = (64, 4096)
+BAND_PREVIEW_SET = 'mtgBandPreview'
+SCATTER_BANDS = {'cliff': tb.CLIFF, 'grass': tb.GRASS, 'snow': tb.SNOW}
+
+# The most vertices read or moved in each step of the terrain generation
+VERTEX_CHUNK = 250
 
 
 def terrain_random_noise():
@@ -280,6 +303,8 @@ def create_texture(cliffType, nOfCTex=5, cliffPos=(0.75, 0.5), cRandTexs=False,
             Creates all of the texture files and returns a texture dictionary 
             of all the texture files created by this function.
         '''
+    # sourced here rather than when MTG is imported to keep importing fast
+    mf.mel_file_require('AEplace3dTextureTemplate')
 
     texInfo = {'placements': []}
     ramp = mf.create_shader_node('ramp', asTexture=True, uWave=rampUWave,
@@ -294,8 +319,9 @@ def create_texture(cliffType, nOfCTex=5, cliffPos=(0.75, 0.5), cRandTexs=False,
     cliffTexImgs = tex_types(('cliff_Textures',cliffType), nOfCTex,
                           cRandTexs)
     cLayeredTex = mf.create_shader_node('layeredTexture', asTexture=True)
-    cFileNodes = create_files(cliffTexImgs, cLayeredTex, nOfCTex, 
-                           'cliff', uRep, vRep, uNoise, vNoise)
+    with tr.span('Creating Cliff Files', textures=nOfCTex):
+        cFileNodes = create_files(cliffTexImgs, cLayeredTex, nOfCTex, 
+                                  'cliff', uRep, vRep, uNoise, vNoise)
 
     if snow:
         snowTex = mf.create_shader_node('snow', asTexture=True, threshold=0.25)
@@ -311,8 +337,9 @@ def create_texture(cliffType, nOfCTex=5, cliffPos=(0.75, 0.5), cRandTexs=False,
         grassTexImgs = tex_types(('grass_Textures',grassType), nOfGTex, 
                                  gRandTexs)
         gLayeredTex = mf.create_shader_node('layeredTexture', asTexture=True)
-        gFileNodes = create_files(grassTexImgs, gLayeredTex, nOfGTex, 
-                                  'grass', uRep, vRep, uNoise, vNoise)
+        with tr.span('Creating Grass Files', textures=nOfGTex):
+            gFileNodes = create_files(grassTexImgs, gLayeredTex, nOfGTex, 
+                                      'grass', uRep, vRep, uNoise, vNoise)
         texInfo['grass'] = [gLayeredTex, gFileNodes]
     else:
         texInfo['grass'] = [None, None]
@@ -382,6 +409,405 @@ def create_texture(cliffType, nOfCTex=5, cliffPos=(0.75, 0.5), cRandTexs=False,
     return texInfo
     
 
+def terrain_band_weights(pObject, cliffPos=(0.75, 0.5), grassPos=(0,), 
+                         snowPos=(1,), axis='y', cliffSlope=0.6, 
+                         slopeFalloff=0.15, rampInterp=4):
+    '''Used to work out how much cliff, grass and snow each vertex of a
+    terrain has from its height and slope. All of the points and normals are
+    read from the object at once and the weights worked out in one pass.
+    
+    Parameters:
+        pObject [str]        : The name of the poly object in the scene.
+        cliffPos [tuple]     : The positions of the cliff texture on the 
+                               terrain ramp. Ranges from 0.0 to 1.0.
+        grassPos [tuple]     : The positions of the grass texture on the 
+                               terrain ramp. Ranges from 0.0 to 1.0.
+        snowPos [tuple]      : The positions of the snow texture on the 
+                               terrain ramp. Ranges from 0.0 to 1.0.
+        axis [str]           : The up axis of the terrain (x,y or z).
+        cliffSlope [float]   : The slope (0.0 flat to 1.0 vertical) from which
+                               the terrain starts to turn into cliff.
+        slopeFalloff [float] : The slope range over which the terrain blends
+                               into being fully cliff.
+        rampInterp [int]     : The interpolation between ramp entries. The 
+                               value used relates to the location in the 
+                               option menu in the ramp options.
+    
+    On Exit:
+        Returns a (n, 3) NumPy array of the cliff, grass and snow weights for
+        each vertex.
+        
+    '''
+    heights = tb.normalise_heights(mf.point_array(pObject), axis)
+    slopes = tb.slope_values(mf.normal_array(pObject), axis)
+    return tb.band_weights(heights, cliffPos, grassPos, snowPos, slopes, 
+                           cliffSlope, slopeFalloff, rampInterp)
+
+
+def source_image_path(pObject, suffix, ext, folder='sourceimages'):
+    '''Used to find where an image made for an object should be saved.
+    
+    Parameters:
+        pObject [str] : The name of the object the image is made for.
+        suffix [str]  : The text added to the end of the image name.
+        ext [str]     : The file extension of the image.
+        folder [str]  : The folder of the project the file is saved in.
+    
+    On Exit:
+        Returns the image path inside of the projects 'folder' folder,
+        creating the folder if it doesn't exist.
+        
+    '''
+    imgDir = os.path.join(cmds.workspace(q=True, rootDirectory=True), 
+                          folder)
+    if not(os.path.exists(imgDir)):
+        os.makedirs(imgDir)
+    return os.path.join(imgDir, '%s_%s.%s' 
+                        % (pObject.replace('|', '_').strip('_'), suffix, ext))
+
+
+def texture_size(nValues):
+    '''Picks a power of two texture size that has at least one texel for 
+    each of the values, within SPLAT_SIZE_RANGE.
+    
+    Parameters:
+        nValues [int] : The number of values, usually vertices, the texture 
+                        should hold.
+    
+    On Exit:
+        Returns the width and height of the texture.
+        
+    '''
+    size = SPLAT_SIZE_RANGE[0]
+    while size*size < nValues and size < SPLAT_SIZE_RANGE[1]:
+        size *= 2
+    return size
+
+
+def write_splat_map(pObject, weights, path=None, size=None):
+    '''Writes the texture weights of a terrain into an RGBA splat texture 
+    using the UV layout of the object. Grid objects with 'polyPlane' UVs are 
+    resized straight into the texture as a 2-D array.
+    
+    Parameters:
+        pObject [str]      : The name of the poly object in the scene.
+        weights [array]    : The (n, 3) weights from 'terrain_band_weights'.
+        path [None][str]   : The file path of the texture. If None, the 
+                             texture is written to the projects 
+                             'sourceimages' folder.
+        size [None][int]   : The width and height of the texture. If None, 
+                             it is picked from the number of vertices.
+    
+    On Exit:
+        Writes the splat texture to the disc drive and returns its path.
+        
+    '''
+    if path is None:
+        path = source_image_path(pObject, 'splat', 'tga')
+    if size is None:
+        size = texture_size(len(weights))
+    uvs, uvVertexIds = mf.face_vertex_uvs(pObject)
+    shape = grid_shape(pObject)
+    if shape is not None and tg.regular_grid_uvs(uvs, uvVertexIds, shape):
+        image = tg.resample_grid(tg.grid_view(weights, shape), size)
+    else:
+        image = ti.rasterise_uvs(weights, uvs, uvVertexIds, size, 
+                                 mf.face_vertex_triangles(pObject))
+    return ti.write_tga(path, tb.splat_pixels(image))
+
+
+def preview_terrain_bands(pObject, colours, cliffPos=(0.75, 0.5), 
+                          grassPos=(0,), snowPos=(1,), axis='y', 
+                          cliffSlope=0.6, slopeFalloff=0.15, rampInterp=4):
+    '''Used to preview where the cliff, grass and snow textures will land on
+    the terrain by colouring its vertices instead of creating the whole 
+    shading network. The colours are set in one go in their own colour set so
+    they can be quickly updated as the ramp positions are changed.
+    
+    Parameters:
+        pObject [str]    : The name of the poly object in the scene.
+        colours [tuple]  : A 3 tuple of the RGB colours used for the cliff, 
+                           grass and snow textures.
+        
+        The rest of the parameters are the same as in 'terrain_band_weights'.
+    
+    On Exit:
+        Colours the vertices of 'pObject' in the BAND_PREVIEW_SET colour set.
+        
+    '''
+    weights = terrain_band_weights(pObject, cliffPos, grassPos, snowPos, axis,
+                                   cliffSlope, slopeFalloff, rampInterp)
+    mf.set_vertex_colours(pObject, tb.band_colours(weights, colours), 
+                          BAND_PREVIEW_SET)
+
+
+def clear_terrain_band_preview(pObject):
+    '''Removes the texture preview colours made by 'preview_terrain_bands'.
+    
+    Parameters:
+        pObject [str] : The name of the poly object in the scene.
+        
+    On Exit:
+        Deletes the BAND_PREVIEW_SET colour set from 'pObject'.
+        
+    '''
+    if mf.delete_colour_set(pObject, BAND_PREVIEW_SET):
+        cmds.setAttr('%s.displayColors' % pObject, False)
+
+
+def create_splat_texture(pObject, cliffType, nOfCTex=5, cliffPos=(0.75, 0.5), 
+                         cRandTexs=False, snow=True, snowPos=(1,), grass=True, 
+                         grassPos=(0,), grassType='lush', nOfGTex=5, 
+                         gRandTexs=False, uRep=1.25, vRep=1.25, uNoise=0.01, 
+                         vNoise=0.01, bDepth=0.3, rampInterp=4, axis='y', 
+                         cliffSlope=0.6, slopeFalloff=0.15, size=None, 
+                         path=None):
+    '''Creates a lambert material for the terrain in the same style as 
+    'create_texture', but instead of positioning the textures with a 
+    projected ramp which is worked out on every render sample, the cliff, 
+    grass and snow weights are worked out once from the height and slope of 
+    the terrain and stored in a splat texture that a layered texture samples.
+    
+    Parameters:
+        pObject [str]        : The name of the poly object in the scene that
+                               the splat texture is made for.
+        cliffType [str]      : The type of cliff texture the terrain will 
+                               have. The valid values for this are the names 
+                               of the folders in CLIFF_TEX_DIR.
+        slopeFalloff [float] : The slope range over which the terrain blends
+                               into being fully cliff.
+        size [None][int]     : The width and height of the splat texture. If
+                               None, it is picked from the number of vertices.
+        path [None][str]     : The file path of the splat texture. If None, 
+                               it is written to the projects 'sourceimages' 
+                               folder.
+        axis [str]           : The up axis of the terrain (x,y or z).
+        cliffSlope [float]   : The slope (0.0 flat to 1.0 vertical) from which
+                               the terrain starts to turn into cliff.
+        
+        The rest of the parameters are the same as in 'create_texture'.
+        
+    On Exit:
+        Creates all of the texture files and returns a texture dictionary 
+        of all the texture files created by this function.
+        
+    '''
+    texInfo = {'placements': []}
+    weights = terrain_band_weights(pObject, cliffPos, 
+                                   grassPos if grass else (), 
+                                   snowPos if snow else (), axis, cliffSlope, 
+                                   slopeFalloff, rampInterp)
+    splatPath = write_splat_map(pObject, weights, path, size)
+    splat = create_file_node(splatPath, 'mtg_splat', 1, 1, 0, 0)
+    # The splat channels are weights rather than colours, so they are read
+    # without any colour management or mip map filtering
+    cmds.setAttr('%s.ignoreColorSpaceFileRules' % splat[0], True)
+    cmds.setAttr('%s.colorSpace' % splat[0], 'Raw', type='string')
+    cmds.setAttr('%s.filterType' % splat[0], 0)
+    texInfo['splat'] = [splat[0], splat[1], splatPath]
+    
+    layers = mf.create_shader_node('layeredTexture', asTexture=True)
+    layerNum = 0
+    
+    if snow:
+        cmds.setAttr('%s.inputs[%d].color' % (layers, layerNum), 1, 1, 1, 
+                     type='double3')
+        mf.connect_attributes(splat[0], layers, 
+                              ('outColorB', 'inputs[%d].alpha' % layerNum))
+        texInfo['snow'] = '%s.inputs[%d]' % (layers, layerNum)
+        layerNum += 1
+    else:
+        texInfo['snow'] = None
+    
+    if grass:
+        grassTexImgs = tex_types(('grass_Textures',grassType), nOfGTex, 
+                                 gRandTexs)
+        gLayeredTex = mf.create_shader_node('layeredTexture', asTexture=True)
+        gFileNodes = create_files(grassTexImgs, gLayeredTex, nOfGTex, 
+                                  'grass', uRep, vRep, uNoise, vNoise)
+        mf.connect_attributes(gLayeredTex, layers, 
+                              ('outColor', 'inputs[%d].color' % layerNum))
+        mf.connect_attributes(splat[0], layers, 
+                              ('outAlpha', 'inputs[%d].alpha' % layerNum))
+        texInfo['grass'] = [gLayeredTex, gFileNodes]
+        layerNum += 1
+    else:
+        texInfo['grass'] = [None, None]
+    
+    cliffTexImgs = tex_types(('cliff_Textures',cliffType), nOfCTex,
+                          cRandTexs)
+    cLayeredTex = mf.create_shader_node('layeredTexture', asTexture=True)
+    cFileNodes = create_files(cliffTexImgs, cLayeredTex, nOfCTex, 
+                           'cliff', uRep, vRep, uNoise, vNoise)
+    mf.connect_attributes(cLayeredTex, layers, 
+                          ('outColor', 'inputs[%d].color' % layerNum))
+    
+    luminance = mf.create_shader_node('luminance', asUtility=True)
+    mf.connect_attributes(layers, luminance, ('outColor', 'value'))
+    bump = mf.create_shader_node('bump3d', asUtility=True, bumpDepth=bDepth)
+    mf.connect_attributes(luminance, bump, ('outValue', 'bumpValue'))
+    
+    lambert = mf.create_shader_node('lambert', asShader=True, 
+                                    name='mtg_terrainMaterial')
+    lambertSG = mf.create_shading_group(lambert)
+    mf.connect_attributes(lambert, lambertSG, ('outColor', 'surfaceShader'))
+    mf.connect_attributes(bump, lambert, ('outNormal', 'normalCamera'))
+    mf.connect_attributes(layers, lambert, ('outColor', 'color'))
+    
+    texInfo['layers'] = layers
+    texInfo['cliff'] = [cLayeredTex, cFileNodes]
+    texInfo['bump'] = bump
+    texInfo['lambert'] = [lambert, lambertSG]
+    return texInfo
+    
+
+def create_instance_set(band, texType, nOfObjs=3, randTexs=False):
+    '''Creates a set of simple objects to be scattered over the terrain, each
+    one textured with an image from the matching texture category so that 
+    they fit in with the terrain material. Rocks are made for the cliff 
+    textures and tufts for the grass textures.
+    
+    Parameters:
+        band [str]      : The texture band the objects are made for. Valid
+                          values are 'cliff' and 'grass'.
+        texType [str]   : The texture category, which is the name of one of 
+                          the folders in CLIFF_TEX_DIR or GRASS_TEX_DIR.
+        nOfObjs [int]   : The number of different objects to make.
+        randTexs [bool] : If True, the textures will be from all of the 
+                          categories of the band.
+    
+    On Exit:
+        Creates the hidden objects and returns a list of their names.
+        
+    '''
+    if band == 'cliff':
+        texImgs = tex_types(('cliff_Textures', texType), nOfObjs, randTexs)
+    else:
+        texImgs = tex_types(('grass_Textures', texType), nOfObjs, randTexs)
+    objs = []
+    for img, positions in texImgs.items():
+        fileNode = create_file_node(img, 'mtg_%sInstanceFile' % band, 1, 1, 
+                                    0, 0)
+        material = mf.create_shader_node('lambert', asShader=True, 
+                                         name='mtg_%sInstanceMaterial' % band)
+        mf.connect_attributes(fileNode[0], material, ('outColor', 'color'))
+        materialSG = mf.create_shading_group(material)
+        mf.connect_attributes(material, materialSG, 
+                              ('outColor', 'surfaceShader'))
+        for _ in positions:
+            if band == 'cliff':
+                obj = cmds.polySphere(name='mtg_rockInstance', radius=0.5, 
+                                      subdivisionsX=6, subdivisionsY=4)[0]
+                cmds.setAttr('%s.scaleY' % obj, rand.uniform(0.4, 0.8))
+            else:
+                obj = cmds.polyCone(name='mtg_tuftInstance', radius=0.1, 
+                                    height=1, subdivisionsX=5)[0]
+                cmds.move(0, 0.5, 0, obj)
+            cmds.makeIdentity(obj, apply=True, translate=True, scale=True)
+            mf.apply_shader(materialSG, obj)
+            cmds.setAttr('%s.visibility' % obj, False)
+            objs.append(obj)
+    return objs
+
+
+def scatter_instances(pObject, nInstances, band='grass', instances=None, 
+                      texType='lush', cliffPos=(0.75, 0.5), grassPos=(0,), 
+                      snowPos=(1,), axis='y', songInfo=None, 
+                      scaleRange=(0.5, 1.5), seed=None, name='mtg_scatter'):
+    '''Scatters instanced objects over the terrain through a single particle
+    instancer. The positions are picked all at once with NumPy, weighted by 
+    the area of each face and by how much of the 'band' texture the terrain 
+    has there, and the per instance scale and rotation are set as arrays on
+    the particle object.
+    
+    Parameters:
+        pObject [str]           : The name of the poly object in the scene.
+        nInstances [int]        : The number of instances to scatter.
+        band [str]              : The texture band the instances grow on.
+                                  Valid values are 'cliff', 'grass' and 
+                                  'snow'.
+        instances [None][list]  : The objects to instance. If None, a set is
+                                  made with 'create_instance_set' from the
+                                  'texType' textures, of rocks for the 
+                                  'cliff' band and of grass tufts for the 
+                                  'grass' and 'snow' bands, as there are no
+                                  snow textures to make a set from.
+        texType [str]           : The texture category used to make the 
+                                  instance set, a cliff category for the
+                                  'cliff' band and a grass category for the
+                                  others.
+        cliffPos [tuple]        : The positions of the cliff texture on the 
+                                  terrain ramp. Ranges from 0.0 to 1.0.
+        grassPos [tuple]        : The positions of the grass texture on the 
+                                  terrain ramp. Ranges from 0.0 to 1.0.
+        snowPos [tuple]         : The positions of the snow texture on the 
+                                  terrain ramp. Ranges from 0.0 to 1.0.
+        axis [str]              : The up axis of the terrain (x,y or z).
+        songInfo [None][object] : If not None, a 'TerrainWaveFile' whose 
+                                  amplitudes make the instances denser and 
+                                  larger where the song is louder.
+        scaleRange [tuple]      : The lowest and highest instance scale.
+        seed [None][int]        : The random seed so the same scatter can be 
+                                  made again. One random state is used for 
+                                  the positions, the transforms and the 
+                                  objects picked, so that they are not 
+                                  alike.
+        name [str]              : The name of the particle object.
+        
+    On Exit:
+        Creates the particle object and instancer and returns a dictionary 
+        of the nodes created.
+        
+    '''
+    if band not in SCATTER_BANDS:
+        raise ValueError('%s is not a valid band. Must be one of %s' 
+                         % (band, str(SCATTER_BANDS.keys())[1:-1]))
+    points = mf.point_array(pObject)
+    counts, vertexIds = mf.mesh_connectivity(pObject)
+    tris = ts.triangulate(counts, vertexIds)
+    
+    weights = terrain_band_weights(pObject, cliffPos, grassPos, snowPos, axis)
+    density = weights[:, SCATTER_BANDS[band]]
+    amplitudes = None
+    if songInfo is not None:
+        amplitudes = np.array(songInfo.createheightvals(len(points), 1.0))
+        density = density * amplitudes
+    
+    random = ts.random_state(seed)
+    positions, triIds, bary = ts.sample_points(points, tris, nInstances, 
+                                               density, random)
+    if amplitudes is not None:
+        amplitudes = ts.interpolate(amplitudes, tris, triIds, bary)
+    scales, rotations = ts.instance_transforms(len(positions), scaleRange, 
+                                               amplitudes, random, axis)
+    
+    if instances is None:
+        instances = create_instance_set('cliff' if band == 'cliff' else 
+                                        'grass', texType)
+    objectIndex = random.randint(0, len(instances), len(positions))
+    
+    particle = cmds.particle(position=positions.tolist(), name=name)
+    cmds.setAttr('%s.isDynamic' % particle[1], False)
+    # a vectorArray is set from the number of vectors followed by each
+    # vector, where a doubleArray is set from a single list
+    for attr, values, dataType in (
+            ('scalePP', [len(scales)] + scales.tolist(), 'vectorArray'), 
+            ('rotationPP', [len(rotations)] + rotations.tolist(), 
+             'vectorArray'),
+            ('indexPP', [objectIndex.tolist()], 'doubleArray')):
+        for ln in (attr, attr+'0'):
+            cmds.addAttr(particle[1], ln=ln, dt=dataType)
+            cmds.setAttr('%s.%s' % (particle[1], ln), *values, 
+                         type=dataType)
+    
+    instancer = cmds.particleInstancer(particle[1], addObject=True, 
+                                       object=instances, cycle='None', 
+                                       scale='scalePP', rotation='rotationPP',
+                                       objectIndex='indexPP')
+    return {'particle': particle, 'instancer': instancer, 
+            'instances': instances}
+
+
 def assign_terrain_shader(sg, object, placements):
     '''Used to assign a material to an object to the shading group, fit and 
     parent any necessary 3d placements to the objects so they resize when the 
@@ -396,20 +822,390 @@ def assign_terrain_shader(sg, object, placements):
                              
     On Exit:
         Applies the shader to the object and parents the placements under it.
+        Any displacement map on the objects old shading group is carried over
+        to the new one.
         
     '''
+    for oldSG in cmds.listConnections(cmds.listRelatives(object, 
+                                      shapes=True, fullPath=True) or object,
+                                      type='shadingEngine') or []:
+        displacement = cmds.listConnections('%s.displacementShader' % oldSG,
+                                            source=True, destination=False,
+                                            plugs=True)
+        if displacement and oldSG != sg and not(cmds.listConnections(
+                '%s.displacementShader' % sg, source=True, destination=False)):
+            cmds.connectAttr(displacement[0], '%s.displacementShader' % sg)
     mf.apply_shader(sg, object)
     if isinstance(placements, (str,unicode)):
-        placer=[placements]
+        placements=[placements]
     for placer in placements:
         mf.fit_to_group_bbox(placer, sg)
-    cmds.parent(placements, object)
+    if placements:
+        cmds.parent(placements, object)
 
 
-def move_vtx_positions(vals, pObject, axis='y', reverse=False, 
-                       seprAxisMv=False, refresh=True, queue=None):
+def terrain_shading_group(pObject):
+    '''Finds the shading group used by an object. If the object only uses 
+    Maya's default shading group, a new lambert material is made for it so 
+    the default is never changed.
+    
+    Parameters:
+        pObject [str] : The name of the object in the scene.
+    
+    On Exit:
+        Returns the name of the objects shading group.
+        
+    '''
+    shapes = cmds.listRelatives(pObject, shapes=True, fullPath=True) or \
+             [pObject]
+    shadingGroups = cmds.listConnections(shapes, type='shadingEngine') or []
+    shadingGroups = [sg for sg in shadingGroups 
+                     if sg != 'initialShadingGroup']
+    if shadingGroups:
+        return shadingGroups[0]
+    lambert = mf.create_shader_node('lambert', asShader=True, 
+                                    name='mtg_terrainMaterial')
+    lambertSG = mf.create_shading_group(lambert)
+    mf.connect_attributes(lambert, lambertSG, ('outColor', 'surfaceShader'))
+    mf.apply_shader(lambertSG, pObject)
+    return lambertSG
+
+
+def create_displacement_map(songInfo, terrainHeight, pObject, size=None, 
+                            dips=False, reverse=False, path=None, 
+                            thermalIter=0, hydraulicIter=0, 
+                            erosionStrength=0.5, start=None, end=None):
+    '''Used to create the terrain at render time instead of moving the 
+    vertices of the object. The song is turned into a grid of heights which
+    is saved as a float displacement texture and connected through a 
+    displacement shader into the objects shading group. The texture is 
+    placed over the UV area used by the object.
+    
+    Parameters:
+        songInfo [object]     : 'TerrainWaveFile' class object from the 
+                                'terrainWave' file.
+        terrainHeight [float] : The maximum height of the displacement and 
+                                the value to which all other values will 
+                                range from.
+        pObject [str]         : The name of the poly object in the scene.
+        size [None][int]      : The width and height of the displacement 
+                                texture, which sets how many heights are made
+                                from the song. If None, it is picked from the
+                                number of vertices of the object.
+        dips [bool]           : If True, negative values from the 'songInfo' 
+                                will be used. Else, all the values created 
+                                will be positive.
+        reverse [bool]        : If True, the song will be reverse, starting 
+                                from the end rather than the beginning.
+        path [None][str]      : The file path of the texture. If None, it is 
+                                written to the projects 'sourceimages' folder.
+        thermalIter [int]     : The number of thermal erosion iterations run 
+                                on the heights (see 'terrainErosion').
+        hydraulicIter [int]   : The number of hydraulic erosion iterations 
+                                run on the heights.
+        erosionStrength [float] : The strength of the erosion from 0.0 to 1.0.
+        start [None][float]   : The time in seconds of the song the heights 
+                                start at. If None, the start of the song.
+        end [None][float]     : The time in seconds of the song the heights 
+                                end at. If None, the end of the song.
+    
+    On Exit:
+        Writes the displacement texture, connects it to the objects shading 
+        group and returns a dictionary of the nodes created. Raises a 
+        ValueError if the song has fewer frames than the texture has texels.
+        
+    '''
+    if size is None:
+        size = texture_size(cmds.polyEvaluate(pObject, v=True))
+    nframes = songInfo.songrange(start, end)[1]
+    if size*size > nframes:
+        raise ValueError('the song has %d frames, fewer than the %d texels '
+                         'of a %dx%d displacement map' % 
+                         (nframes, size*size, size, size))
+    if path is None:
+        path = source_image_path(pObject, 'displacement', 'exr')
+    
+    with tr.span('Displacement Heights', size=size):
+        heights = np.array(songInfo.summaryheightvals(size*size, 
+                                                      terrainHeight, dips, 
+                                                      start, end))
+    if reverse:
+        heights = heights[::-1]
+    heights = heights.reshape(size, size)
+    if thermalIter > 0 or hydraulicIter > 0:
+        heights = te.erode(heights, thermalIter, hydraulicIter, 
+                           erosionStrength)
+    ti.write_exr(path, heights)
+    
+    dispFile = create_file_node(path, 'mtg_displacement', 1, 1, 0, 0)
+    cmds.setAttr('%s.alphaIsLuminance' % dispFile[0], True)
+    cmds.setAttr('%s.filterType' % dispFile[0], 0)
+    
+    uvs = mf.face_vertex_uvs(pObject)[0]
+    uvMin = uvs.min(axis=0)
+    uvMax = uvs.max(axis=0)
+    cmds.setAttr('%s.coverage' % dispFile[1], *(uvMax - uvMin).tolist())
+    cmds.setAttr('%s.translateFrame' % dispFile[1], *uvMin.tolist())
+    cmds.setAttr('%s.wrapU' % dispFile[1], False)
+    cmds.setAttr('%s.wrapV' % dispFile[1], False)
+    
+    displacement = mf.create_shader_node('displacementShader', asShader=True)
+    mf.connect_attributes(dispFile[0], displacement, 
+                          ('outAlpha', 'displacement'))
+    shadingGroup = terrain_shading_group(pObject)
+    mf.connect_attributes(displacement, shadingGroup, 
+                          ('displacement', 'displacementShader'))
+    return {'file': dispFile, 'displacement': displacement, 
+            'shadingGroup': shadingGroup, 'path': path}
+    
+
+def scene_fps():
+    '''Finds the number of frames per second of the scene from its time 
+    unit.
+    
+    On Exit:
+        Returns the frames per second as a float. Time units that are not 
+        frame rates, such as 'sec', return 24.0.
+    
+    '''
+    try:
+        return tw.unit_fps(cmds.currentUnit(query=True, time=True))
+    except ValueError:
+        return 24.0
+
+
+def song_frame_values(songInfo, sound=None, startFrame=None, endFrame=None, 
+                      bands=1, negative=False):
+    '''Used to get a value for each frame of the timeline from the song, 
+    lined up with the sound node playing the song (see 
+    'terrainWave.TerrainWaveFile.frameanalysis').
+    
+    Parameters:
+        songInfo [object]      : 'TerrainWaveFile' class object from the 
+                                 'terrainWave' file.
+        sound [None][str]      : The sound node of the song. If not None, its 
+                                 'offset' is used as the frame the song 
+                                 starts on. Else, the song starts on frame 0.
+        startFrame [None][int] : The first frame. If None, the start of the 
+                                 playback range is used.
+        endFrame [None][int]   : The last frame. If None, the frame the song 
+                                 ends on is used.
+        bands [int]            : The number of frequency bands for each 
+                                 frame, with 1 being the average amplitude.
+        negative [bool]        : If True, the signed amplitudes are averaged.
+    
+    On Exit:
+        Returns a 2 tuple of the array of frames and the array of values for 
+        each frame.
+        
+    '''
+    offset = cmds.getAttr('%s.offset' % sound) if sound else 0
+    if startFrame is None:
+        startFrame = int(cmds.playbackOptions(q=True, minTime=True))
+    return songInfo.frameanalysis(scene_fps(), startFrame, endFrame, offset, 
+                                  bands, negative)
+
+
+def load_cache_plugin():
+    '''Loads the 'mtgHeightCache' deformer plug-in if it isn't loaded.'''
+    if not(cmds.pluginInfo(CACHE_PLUGIN, q=True, loaded=True)):
+        cmds.loadPlugin(CACHE_PLUGIN, quiet=True)
+
+
+def create_animated_terrain(songInfo, terrainHeight, pObject, axis='y', 
+                            window=10.0, dips=False, fps=None, 
+                            dtype='float16', delta=False, path=None, 
+                            queue=None, start=None, end=None):
+    '''Used to make the terrain move with the song over the timeline. The 
+    heights of every vertex on every frame are made from one analysis of the 
+    song and written to a height cache (see 'terrainCache'), which is read 
+    by a 'mtgHeightCache' deformer on the object one frame at a time. No 
+    keyframes are made.
+    
+    Parameters:
+        songInfo [object]     : 'TerrainWaveFile' class object from the 
+                                'terrainWave' file.
+        terrainHeight [float] : The maximum height of the vertex movement on 
+                                any frame.
+        pObject [str]         : The name of the poly object in the scene.
+        axis [str]            : The object axis the vertices move along. 
+                                Valid values are x,y,z.
+        window [float]        : The number of seconds of the song shown over 
+                                the vertices on each frame.
+        dips [bool]           : If True, negative values from the 'songInfo' 
+                                will be used.
+        fps [None][float]     : The frames per second of the cache. If None, 
+                                the frames per second of the scene is used.
+        dtype [str]           : Either 'float16' or 'float32', how precisely 
+                                the heights are stored.
+        delta [bool]          : If True, the frames are stored as 8 bit 
+                                deltas, making the cache about half the size.
+        path [None][str]      : The file path of the cache. If None, it is 
+                                written to the projects 'cache' folder.
+        queue [None][object]  : If not None, the 'Queue' or 
+                                'mtgProgress.ProgressReporter' the progress 
+                                is reported to.
+        start [None][float]   : The time in seconds of the song shown on the 
+                                first frame of the cache, so that only part 
+                                of the song is read. If None, the start of 
+                                the song.
+        end [None][float]     : The time in seconds of the song the cache 
+                                ends at. If None, the end of the song.
+    
+    On Exit:
+        Writes the height cache, adds a 'mtgHeightCache' deformer driven by 
+        the scene time to 'pObject' and returns the name of the deformer.
+        
+    '''
+    if fps is None:
+        fps = scene_fps()
+    if path is None:
+        path = source_image_path(pObject, 'heights', 'mtgc', 'cache')
+    nVtx = cmds.polyEvaluate(pObject, vertex=True)
+    
+    progress = mp.reporter(queue)
+    progress.start('Analysing Song', 1)
+    first, nframes = songInfo.songrange(start, end)
+    frames = tc.song_frames(songInfo.getsamples(first, nframes), 
+                            songInfo.getframerate(), nVtx, terrainHeight, fps, 
+                            window, dips)
+    progress.start('Writing Height Cache', 1)
+    tc.write_height_cache(path, frames, fps, dtype, delta)
+    
+    load_cache_plugin()
+    deformer = cmds.deformer(pObject, type=CACHE_NODE, 
+                             name='%s_mtgHeights' 
+                             % pObject.replace('|', '_').strip('_'))[0]
+    cmds.setAttr('%s.cachePath' % deformer, path, type='string')
+    cmds.setAttr('%s.axis' % deformer, 'xyz'.index(axis))
+    cmds.connectAttr('time1.outTime', '%s.time' % deformer)
+    return deformer
+
+
+def grid_shape(pObject):
+    '''Used to find if an object is a regular grid of vertices, such as one 
+    made by a 'polyPlane', so that its per vertex values can be worked on as 
+    a (rows, cols) array. The 'polyPlane' construction history is checked 
+    first and then the faces of the object (see 'terrainGrid.grid_shape').
+    
+    Parameters:
+        pObject [str] : The name of the poly object in the scene.
+    
+    On Exit:
+        Returns a 2 tuple of the number of rows and columns of vertices, in 
+        the same order as the vertex ids. If the object is not a grid, None 
+        is returned.
+        
+    '''
+    nVtx = cmds.polyEvaluate(pObject, vertex=True)
+    planes = cmds.listHistory(pObject, type='polyPlane') or []
+    if planes != [] and len(cmds.listHistory(pObject)) == 2:
+        cols = cmds.getAttr('%s.subdivisionsWidth' % planes[0]) + 1
+        rows = cmds.getAttr('%s.subdivisionsHeight' % planes[0]) + 1
+        if rows * cols == nVtx:
+            return (rows, cols)
+    counts, vertexIds = mf.mesh_connectivity(pObject)
+    return tg.grid_shape(counts, vertexIds, nVtx)
+
+
+def erode_heights(vals, pObject, thermalIter=0, hydraulicIter=0, 
+                  strength=0.5):
+    '''Used to erode the song heights as a grid before they are used to 
+    move the vertices of the object.
+    
+    Parameters:
+        vals [list]         : The height values, one for each vertex.
+        pObject [str]       : The name of the poly object in the scene, which 
+                              must be a grid (see 'grid_shape').
+        thermalIter [int]   : The number of thermal erosion iterations.
+        hydraulicIter [int] : The number of hydraulic erosion iterations.
+        strength [float]    : The strength of the erosion from 0.0 to 1.0.
+    
+    On Exit:
+        Returns a list of the eroded height values for each vertex.
+        
+    '''
+    shape = grid_shape(pObject)
+    if shape is None:
+        raise ValueError('Erosion only works with grid objects such as a '
+                         'polyPlane. %s is not' % pObject)
+    heights = np.array(vals[:shape[0]*shape[1]], dtype=np.float64)
+    heights = te.erode(heights.reshape(shape), thermalIter, hydraulicIter, 
+                       strength)
+    return heights.ravel().tolist()
+
+
+def smooth_heights(vals, pObject, iterations=1, strength=0.5, 
+                   cotangent=False):
+    '''Used to smooth the song heights over the vertices of any polygonal 
+    object, so that neighbouring vertices don't make harsh spikes. The 
+    vertex adjacency is only made once for each topology (see 
+    'terrainSmooth'). Grid objects without cotangent weights are smoothed 
+    as a 2-D array instead.
+    
+    Parameters:
+        vals [list]       : The height values, one for each vertex in vertex 
+                            id order.
+        pObject [str]     : The name of the poly object in the scene.
+        iterations [int]  : The number of smoothing iterations.
+        strength [float]  : The strength of each iteration from 0.0 to 1.0.
+        cotangent [bool]  : If True, the neighbours are weighted by the 
+                            cotangent weights of the mesh, which keeps the 
+                            smoothing even over faces of different sizes.
+    
+    On Exit:
+        Returns a list of the smoothed height values for each vertex.
+        
+    '''
+    shape = grid_shape(pObject)
+    if shape is not None and not cotangent:
+        grid = tg.grid_view(vals[:shape[0]*shape[1]], shape)
+        heights = tg.grid_smooth(grid, iterations, strength)
+        return heights.ravel().tolist()
+    counts, vertexIds = mf.mesh_connectivity(pObject)
+    nVtx = cmds.polyEvaluate(pObject, vertex=True)
+    adjacency = tsm.cached_adjacency(counts, vertexIds, nVtx)
+    weights = None
+    if cotangent:
+        weights = tsm.cotangent_weights(adjacency, 
+                                        mf.point_array(pObject, world=False), 
+                                        counts, vertexIds)
+    heights = tsm.laplacian_smooth(vals[:nVtx], adjacency, iterations, 
+                                   strength, weights)
+    return heights.tolist()
+    
+
+def run_steps(steps, queue=None):
+    '''Used to run all of the steps of a step generator such as 
+    'music_displace_steps' in one go.
+    
+    Parameters:
+        steps [generator]    : A generator that yields a 3 tuple of the 
+                               message, the amount done and the total amount 
+                               of the current stage after each step.
+        queue [None][object] : If not None, the 'Queue' or 
+                               'mtgProgress.ProgressReporter' the progress 
+                               is reported to. The steps are stopped if the 
+                               reporter is cancelled.
+    
+    On Exit:
+        Runs every step of 'steps'.
+        
+    '''
+    progress = mp.reporter(queue)
+    for msg, done, total in steps:
+        if progress.cancelled:
+            steps.close()
+            break
+        if msg != progress.msg:
+            progress.start(msg, total)
+        progress.update(done)
+
+
+def move_vtx_steps(vals, pObject, axis='y', reverse=False, seprAxisMv=False, 
+                   refresh=True, chunk=VERTEX_CHUNK):
     '''Used to move the vertex positions of an object 'pObject' in an axis
-    direction.
+    direction, a chunk of vertices at a time.
     
     Parameters:
         vals [list]         : A list of float values for the relative move 
@@ -422,10 +1218,20 @@ def move_vtx_positions(vals, pObject, axis='y', reverse=False,
         seprAxisMv [bool]   : If True, each of the move axis values will be
                               moved separately instead of in one move command 
                               apart from 'n' which is always done separately.
+        refresh [bool]      : If True, the viewport is refreshed after each 
+                              vertex is moved.
+        chunk [int]         : The number of vertices moved for each step.
+                              The memory budget (see 'mtgMemory') isn't 
+                              used, as every value and normal is held 
+                              before the first vertex is moved, since 
+                              moving a vertex changes the normals next to 
+                              it.
                               
     On Exit:
-        Moves each of the vertexes of of 'pObject' with relative values from
-        'vals' in the direction(s) of 'axis'.
+        A generator that moves each of the vertexes of of 'pObject' with 
+        relative values from 'vals' in the direction(s) of 'axis', yielding 
+        a 3 tuple of the message, the number of vertices moved and the 
+        number of vertices after each chunk.
     
     '''
     
@@ -450,56 +1256,98 @@ def move_vtx_positions(vals, pObject, axis='y', reverse=False,
         vals = list(vals)
     if reverse:
         vals.reverse()
+    vals = vals[:nVtx]
     
     if 'n' in nAxis:
-        if queue:
-            queue.put(('Moving Terrain in Normal direction', nVtx))
-        normalDirs = mf.get_vertex_normals(pObject)
+        msg = 'Moving Terrain in Normal direction'
+        # the normals are kept as a flat array of doubles, a sixth of the
+        # memory of a list of lists on big meshes
+        normalDirs = array.array('d')
+        with tr.span('Finding Normals', nvtx=nVtx), \
+                mm.stage('Finding Normals'):
+            for normal in mf.iter_vertex_normals(pObject):
+                normalDirs.extend(normal)
          
-        for i,val in enumerate(vals[:nVtx]):
-            if queue:
-                queue.put(i)
-            cmds.select('%s.vtx[%d]' % (pObject, i), replace=True)
-            dir_ = normalDirs[i]
-            nOfVerts = len(mf.soft_selection())
-            cmds.moveVertexAlongDirection(direction=[dir_]*nOfVerts,
-                                          magnitude=[val]*nOfVerts)
-            if refresh:
-                cmds.refresh(cv=True)
+        with tr.span(msg, nvtx=nVtx), mm.stage(msg):
+            for i,val in enumerate(vals):
+                cmds.select('%s.vtx[%d]' % (pObject, i), replace=True)
+                dir_ = normalDirs[3*i:3*i+3].tolist()
+                nOfVerts = len(mf.soft_selection())
+                cmds.moveVertexAlongDirection(direction=[dir_]*nOfVerts,
+                                              magnitude=[val]*nOfVerts)
+                if refresh:
+                    cmds.refresh(cv=True)
+                    tr.count('viewport refreshes')
+                if (i+1) % chunk == 0:
+                    tr.count('vertices moved', chunk)
+                    yield (msg, i+1, nVtx)
+            tr.count('vertices moved', len(vals) % chunk)
+        yield (msg, nVtx, nVtx)
 
     if any([True if l in ('x','y','z') else False for l in nAxis]):
         tmpAxis = nAxis.replace('n', '')
         if seprAxisMv:
-            for a in tmpAxis:
-                if queue:
-                    queue.put(('Moving Terrain in %s axis' % a, nVtx))
-                move = {'move'+a.upper(): True}
-                for i,val in enumerate(vals[:nVtx]):
-                    queue.put(i)
+            moves = [(a, (a,)) for a in tmpAxis]
+        else:
+            moves = [(tmpAxis.upper(), tmpAxis)]
+        for name, axes in moves:
+            msg = 'Moving Terrain in %s axis' % name
+            move = {'move'+''.join(axes).upper(): True}
+            with tr.span(msg, nvtx=nVtx), mm.stage(msg):
+                for i,val in enumerate(vals):
+                    val = (val,)*len(axes)
                     cmds.select('%s.vtx[%d]' % (pObject, i), replace=True)
-                    cmds.move(val, relative=True, **move)
+                    cmds.move(*val, relative=True, **move)
                     if refresh:
                         cmds.refresh(cv=True)
-        else:
-            if queue:
-                queue.put(('Moving Terrain in %s axis' % tmpAxis.upper(), nVtx))
-            move = {'move'+tmpAxis.upper(): True}
-            for i,val in enumerate(vals[:nVtx]):
-                if queue:
-                    queue.put(i)
-                val = (val,)*len(tmpAxis)
-                cmds.select('%s.vtx[%d]' % (pObject, i), replace=True)
-                cmds.move(*val, relative=True, **move)
-                if refresh:
-                    cmds.refresh(cv=True)
+                        tr.count('viewport refreshes')
+                    if (i+1) % chunk == 0:
+                        tr.count('vertices moved', chunk)
+                        yield (msg, i+1, nVtx)
+                tr.count('vertices moved', len(vals) % chunk)
+            yield (msg, nVtx, nVtx)
 
 
-def music_displace(songInfo, terrainHeight, pObject, vtxDire='n', 
-                   sSelect=False, sSelectCurve=None, sSelectMode=0,
-                   sSelectRadius=5, dips=False, seprAxisMv=False, 
-                   reverse=False, refresh=True, queue=None):
+def move_vtx_positions(vals, pObject, axis='y', reverse=False, 
+                       seprAxisMv=False, refresh=True, queue=None):
+    '''Used to move the vertex positions of an object 'pObject' in an axis
+    direction.
+    
+    Parameters:
+        vals [list]         : A list of float values for the relative move 
+                              positions.
+        pObject [str]       : The name of the polygonal object in the scene.
+        axis [str]          : The direction for the moved vertex for the value.
+                              Valid values are x,y,z,n with 'n' being normals.
+        reverse [bool]      : If True, the values in the list 'vals' will be 
+                              reversed.
+        seprAxisMv [bool]   : If True, each of the move axis values will be
+                              moved separately instead of in one move command 
+                              apart from 'n' which is always done separately.
+                              
+    On Exit:
+        Moves each of the vertexes of of 'pObject' with relative values from
+        'vals' in the direction(s) of 'axis' (see 'move_vtx_steps'). The 
+        memory used by each stage is added to 'mtgMemory.STAGES'.
+    
+    '''
+    run_steps(move_vtx_steps(vals, pObject, axis, reverse, seprAxisMv, 
+                             refresh), queue)
+
+
+def music_displace_steps(songInfo, terrainHeight, pObject, vtxDire='n', 
+                         sSelect=False, sSelectCurve=None, sSelectMode=0,
+                         sSelectRadius=5, dips=False, seprAxisMv=False, 
+                         reverse=False, refresh=True, dispMap=False, 
+                         dispSize=None, thermalIter=0, hydraulicIter=0, 
+                         erosionStrength=0.5, smoothIter=0, 
+                         smoothStrength=0.5, cotangent=False, animated=False, 
+                         animWindow=10.0, chunk=VERTEX_CHUNK, start=None, 
+                         end=None):
     '''Used to gather the song values from the songInfo 'TerrainWaveFile' 
-    class file and then use the values to move the 'pObjects' vertices.
+    class file and then use the values to move the 'pObjects' vertices, or 
+    to displace the object at render time with a displacement map, a chunk 
+    of vertices at a time.
     
     Parameters:
         songInfo [object]      : 'TerrainWaveFile' class object from the 
@@ -534,26 +1382,239 @@ def music_displace(songInfo, terrainHeight, pObject, vtxDire='n',
                                  the options x, y, and z.
         reverse [bool]         : If True, the song will be reverse, starting 
                                  from the end rather than the beginning.
+        dispMap [bool]         : If True, the vertices are not moved and a 
+                                 displacement map is made instead (see 
+                                 'create_displacement_map') with the 
+                                 following option:
+                                 
+            dispSize [None][int] : The width and height of the displacement 
+                                   map. If None, it is picked from the 
+                                   number of vertices.
+        
+        thermalIter [int]      : The number of thermal erosion iterations run 
+                                 on the heights before the terrain is made.
+        hydraulicIter [int]    : The number of hydraulic erosion iterations 
+                                 run on the heights before the terrain is 
+                                 made.
+        erosionStrength [float] : The strength of the erosion from 0.0 to 1.0.
+                                 Erosion needs the object to be a grid (see 
+                                 'grid_shape').
+        smoothIter [int]       : The number of Laplacian smoothing iterations 
+                                 run on the heights after any erosion (see 
+                                 'smooth_heights'). Works on any polygonal 
+                                 object.
+        smoothStrength [float] : The strength of the smoothing from 0.0 to 
+                                 1.0.
+        cotangent [bool]       : If True, the smoothing uses cotangent 
+                                 weights.
+        animated [bool]        : If True, the terrain moves with the song 
+                                 over the timeline instead (see 
+                                 'create_animated_terrain'), moving along 
+                                 the first of x, y or z in 'vtxDire' (y if 
+                                 there are none) with the following option:
+                                 
+            animWindow [float] : The number of seconds of the song shown 
+                                 over the vertices on each frame.
+        chunk [int]            : The number of vertices read or moved for 
+                                 each step.
+        start [None][float]    : The time in seconds of the song the terrain 
+                                 starts at, so that only part of the song is 
+                                 read. If None, the start of the song.
+        end [None][float]      : The time in seconds of the song the terrain 
+                                 ends at. If None, the end of the song.
+        
+    On Exit:
+        A generator that does the work one step at a time so that it can be 
+        run on Maya's idle events and stopped between steps, yielding a 3 
+        tuple of the message, the amount done and the total amount of the 
+        current stage after each step. The 'pObject's vertices will be moved 
+        in relation to the song's amplitude, in relation to the 
+        'terrainHeight'. With 'dispMap' the object is displaced along its 
+        normals at render time instead.
+    '''
+    if animated:
+        yield ('Making Animated Terrain', 0, 1)
+        axes = [a for a in vtxDire.lower() if a in 'xyz'] or ['y']
+        with tr.span('Making Animated Terrain'):
+            create_animated_terrain(songInfo, terrainHeight, pObject, 
+                                    axes[0], animWindow, dips, start=start, 
+                                    end=end)
+        yield ('Making Animated Terrain', 1, 1)
+    elif dispMap:
+        yield ('Making Displacement Map', 0, 1)
+        with tr.span('Making Displacement Map'):
+            create_displacement_map(songInfo, terrainHeight, pObject, 
+                                    dispSize, dips, reverse, 
+                                    thermalIter=thermalIter, 
+                                    hydraulicIter=hydraulicIter, 
+                                    erosionStrength=erosionStrength, 
+                                    start=start, end=end)
+        yield ('Making Displacement Map', 1, 1)
+    else:
+        nVtx = cmds.polyEvaluate(pObject, v=True)
+        if sSelect:
+            if sSelectCurve == None:
+                cmds.softSelect(sse=1,ssc=mf.SSELECT_CURVES[0], 
+                                ssf=sSelectMode, ssd=sSelectRadius)
+            else:
+                cmds.softSelect(sse=1,ssc=sSelectCurve, ssf=sSelectMode, 
+                                ssd=sSelectRadius)
+        else:
+            cmds.softSelect(sse=0)
+        with mm.stage('Reading WAV Data'):
+            for step in songInfo.heightvalsteps(nVtx, terrainHeight, dips, 
+                                                chunk*4, start, end):
+                yield step
+        heights = songInfo.heightvals
+        if thermalIter > 0 or hydraulicIter > 0 or smoothIter > 0:
+            # the heights are reversed here so that they are eroded and 
+            # smoothed over the vertices they will be moving
+            heights = list(heights)
+            if reverse:
+                heights.reverse()
+                reverse = False
+            heights = heights[:nVtx]
+        if thermalIter > 0 or hydraulicIter > 0:
+            yield ('Eroding Terrain', 0, 1)
+            with tr.span('Eroding Terrain', nvtx=nVtx), \
+                    mm.stage('Eroding Terrain'):
+                heights = erode_heights(heights, pObject, thermalIter, 
+                                        hydraulicIter, erosionStrength)
+        if smoothIter > 0:
+            yield ('Smoothing Terrain', 0, 1)
+            with tr.span('Smoothing Terrain', nvtx=nVtx), \
+                    mm.stage('Smoothing Terrain'):
+                heights = smooth_heights(heights, pObject, smoothIter, 
+                                         smoothStrength, cotangent)
+        for step in move_vtx_steps(heights, pObject, vtxDire, reverse, 
+                                   seprAxisMv, refresh, chunk):
+            yield step
+
+
+def music_displace(songInfo, terrainHeight, pObject, vtxDire='n', 
+                   sSelect=False, sSelectCurve=None, sSelectMode=0,
+                   sSelectRadius=5, dips=False, seprAxisMv=False, 
+                   reverse=False, refresh=True, queue=None, **options):
+    '''Used to gather the song values from the songInfo 'TerrainWaveFile' 
+    class file and then use the values to move the 'pObjects' vertices in 
+    one go. The parameters are the same as 'music_displace_steps', with any 
+    of its other options passed as keywords in 'options'.
+    
+    Parameters:
+        queue [None][object] : If not None, the 'Queue' or 
+                               'mtgProgress.ProgressReporter' the progress 
+                               is reported to (see 'run_steps'), followed 
+                               by 'Complete' when finished.
         
     On Exit:
         The 'pObject's vertices will be moved in relation to the song's 
         amplitude, in relation to the 'terrainHeight'.
     '''
-    nVtx = cmds.polyEvaluate(pObject, v=True)
-    if sSelect:
-        if sSelectCurve == None:
-            cmds.softSelect(sse=1,ssc=mf.SSELECT_CURVES[0], ssf=sSelectMode, 
-                            ssd=sSelectRadius)
-        else:
-            cmds.softSelect(sse=1,ssc=sSelectCurve, ssf=sSelectMode, 
-                            ssd=sSelectRadius)
-    else:
-        cmds.softSelect(sse=0)
-    move_vtx_positions(songInfo.createheightvals(nVtx, terrainHeight, dips),
-                        pObject, vtxDire, reverse, seprAxisMv, refresh, queue)
-    if queue:
-        queue.put('Complete')
+    progress = mp.reporter(queue)
+    with tr.span('Music Displace', vtxDire=vtxDire), mm.tracing():
+        run_steps(music_displace_steps(songInfo, terrainHeight, pObject, 
+                                       vtxDire, sSelect, sSelectCurve, 
+                                       sSelectMode, sSelectRadius, dips, 
+                                       seprAxisMv, reverse, refresh, 
+                                       **options), progress)
+    progress.done()
     
+def preview_points(base, normals, heights, vtxDire, magnitude):
+    '''Works out where the vertices would be moved to by 'move_vtx_positions' 
+    without soft select, so that the whole terrain can be moved in one go.
+    
+    Parameters:
+        base [array]      : A (n, 3) array of the points before they are 
+                            moved.
+        normals [array]   : A (n, 3) array of the vertex normals.
+        heights [array]   : The height of each vertex for a magnitude of 1.
+        vtxDire [str]     : The direction(s) the points are moved in, a 
+                            combination of x, y, z and n.
+        magnitude [float] : The value the heights are multiplied by.
+    
+    On Exit:
+        Returns a new (n, 3) array of the moved points.
+        
+    '''
+    heights = np.asarray(heights, dtype=np.float64) * magnitude
+    points = np.array(base, dtype=np.float64)
+    for i, a in enumerate('xyz'):
+        if a in vtxDire:
+            points[:, i] += heights
+    if 'n' in vtxDire:
+        points += np.asarray(normals) * heights[:, None]
+    return points
+
+
+class TerrainPreview(object):
+    '''Moves a poly object live with the song heights while the terrain 
+    options are being changed. The original points of the object and the 
+    heights of the song are kept, so each update is worked out with NumPy 
+    and written to the object with a single API call. The preview is not 
+    undoable and does not use soft select, erosion or smoothing, so it 
+    should be restored before the terrain is generated.
+    
+    Parameters:
+        songInfo [object] : 'TerrainWaveFile' class object from the 
+                            'terrainWave' file.
+        pObject [str]     : The name of the poly object in the scene.
+    
+    Attributes:
+        base [array]    : The world space points of the object before the 
+                          preview.
+        normals [array] : The world space vertex normals of the object before 
+                          the preview.
+        heights [dict]  : The heights of the song for each vertex with a 
+                          magnitude of 1, by negative values and song range.
+        
+    '''
+    def __init__(self, songInfo, pObject):
+        self.songInfo = songInfo
+        self.pObject = pObject
+        self.base = mf.point_array(pObject)
+        self.normals = mf.normal_array(pObject)
+        self.heights = {}
+        
+    def unit_heights(self, negative=False, start=None, end=None):
+        '''Returns the heights of the song between 'start' and 'end' seconds 
+        for each vertex with a magnitude of 1, using the song summary if 
+        there is one. Returns None while the summary is still being made, 
+        rather than waiting for it on Maya's main thread.'''
+        key = (negative, start, end)
+        if key not in self.heights:
+            nVtx = len(self.base)
+            summary = self.songInfo.summary
+            if summary is not None and not(summary.finished.is_set()):
+                return None
+            if summary is not None and summary.ready():
+                heights = summary.heightvals(nVtx, 1.0, negative, start, end)
+            else:
+                heights = self.songInfo.createheightvals(nVtx, 1.0, negative, 
+                                                         start, end)
+            self.heights[key] = np.array(heights, dtype=np.float64)
+        return self.heights[key]
+    
+    def update(self, magnitude, vtxDire='y', negative=False, reverse=False, 
+               start=None, end=None):
+        '''Moves the object to show the terrain with the options given (see 
+        'music_displace' for the parameters). Returns False, without moving 
+        the object, if the song is still being analysed.'''
+        heights = self.unit_heights(negative, start, end)
+        if heights is None:
+            return False
+        if reverse:
+            heights = heights[::-1]
+        mf.set_point_array(self.pObject, 
+                           preview_points(self.base, self.normals, heights, 
+                                          vtxDire.lower(), magnitude))
+        return True
+        
+    def restore(self):
+        '''Moves the object back to where it was before the preview.'''
+        if cmds.objExists(self.pObject):
+            mf.set_point_array(self.pObject, self.base)
+    
+
 if __name__=='__main__': 
     obj = cmds.polyPlane(name='terrain', width=24, height=24, sx=30, sy=70)
     # change musicLocation to a song in your directory to test the functions
@@ -0,0 +1,203 @@
+r'''Module for keeping the memory used while making a terrain within a budget.
+
+   The idea behind this module is that MTG runs inside Maya sessions that
+   already hold a lot of scene data, so reading a long song for a big mesh
+   must not push the machine into swap. The procedures reading the song ask
+   'chunk_size' how many vertices they can work on at once, so that the
+   values they hold in memory fit within the budget. The memory each stage
+   of making a terrain used, including moving the vertices, is measured
+   with 'stage'.
+
+   The budget is 512 MB unless the 'MTG_MEMORY_BUDGET' environment variable
+   is set to another number of megabytes, and can be changed at any time
+   with 'set_budget'. A run of stages, such as making a terrain, starts
+   'tracemalloc' with 'start_tracing' when Python has it, and the memory of
+   each stage is then the peak memory Python allocated during it. Else, it
+   is how much the stage raised the peak resident memory (RSS) of Maya,
+   which is 0 when the stage stayed below a peak reached earlier, and the
+   report says so. Where neither can be measured, such as Python 2 on
+   Windows, stages are not recorded.
+
+       >>> set_budget(1)
+       >>> chunk_size(1024, 10000)
+       512
+       >>> chunk_size(1024, 100)
+       100
+       >>> set_budget(None)
+       >>> chunk_size(1024, 10000)
+       10000
+       >>> set_budget(BUDGET_MB)
+
+    To test/execute the examples in the module documentation, once you have
+    imported the mtgMemory module:
+    import doctest
+    nfail, ntests = doctest.testmod(mtgMemory)
+
+'''
+import os
+import sys
+import contextlib
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MB = 1024 * 1024
+# The default budget in megabytes
+BUDGET_MB = float(os.environ.get('MTG_MEMORY_BUDGET', 512))
+# The part of the budget the values of one chunk may use, leaving the rest
+# for everything else held while it is worked on
+CHUNK_SHARE = 0.5
+# The bytes used by each amplitude value unpacked from a song into a tuple,
+# the pointer in the tuple and the Python int it points to
+SAMPLE_BYTES = 32
+# The bytes used by each amplitude value decoded into NumPy arrays, with the
+# copies made while it is summed
+ARRAY_SAMPLE_BYTES = 24
+# The part of the budget the sums of a 'terrainWave.SongSummary' may use, as
+# they are held for as long as the song is loaded
+SUMMARY_SHARE = 0.05
+
+# How the memory of a stage was measured, either the peak memory traced by
+# 'tracemalloc' or the rise in the peak resident memory of the process
+TRACED = 'traced'
+RSS = 'RSS'
+
+# The memory used by each stage measured since 'reset', as 3 tuples of the
+# name of the stage, the bytes used and how they were measured
+STAGES = []
+
+_state = {'budget': BUDGET_MB, 'tracing': False}
+
+
+def set_budget(mb):
+    '''Sets the memory budget to 'mb' megabytes. If None, there is no
+    budget and every procedure works on all of its values at once.'''
+    _state['budget'] = mb
+
+
+def budget():
+    '''Returns the memory budget in bytes, or None if there is none.'''
+    if _state['budget'] is None:
+        return None
+    return int(_state['budget'] * MB)
+
+
+def chunk_size(itemBytes, total, share=CHUNK_SHARE):
+    '''Works out how many items can be held in memory at once.
+
+    Parameters:
+        itemBytes [int] : The bytes held for each item, such as the
+                          amplitudes read for one vertex.
+        total [int]     : The number of items to work on.
+        share [float]   : The part of the budget the items may use.
+
+    On Exit:
+        Returns the number of items that fit in 'share' of the budget, at
+        least 1 and at most 'total'.
+
+    '''
+    limit = budget()
+    if limit is None:
+        return max(total, 1)
+    return int(max(min(limit * share // max(itemBytes, 1), total), 1))
+
+
+def start_tracing():
+    '''Starts tracing the memory Python allocates with 'tracemalloc' for a
+    run of stages, if Python has it and it isn't already tracing.
+
+    On Exit:
+        Returns True if tracing was started, in which case 'stop_tracing'
+        stops it at the end of the run.
+
+    '''
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return False
+    tracemalloc.start()
+    _state['tracing'] = True
+    return True
+
+
+def stop_tracing():
+    '''Stops the tracing started by 'start_tracing', leaving any tracing
+    started elsewhere running.'''
+    if _state['tracing']:
+        _state['tracing'] = False
+        tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def tracing():
+    '''Traces the memory of the stages run in a 'with' statement (see 
+    'start_tracing').'''
+    start_tracing()
+    try:
+        yield
+    finally:
+        stop_tracing()
+
+
+def _usage():
+    '''Returns a 3 tuple of the bytes in use, the peak bytes so far and how
+    they were measured, either TRACED or RSS, or (None, None, None) if they
+    cannot be measured.'''
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory() + (TRACED,)
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on Mac OS and kilobytes elsewhere
+        peak *= 1 if sys.platform == 'darwin' else 1024
+        return peak, peak, RSS
+    return None, None, None
+
+
+def reset():
+    '''Forgets the stages measured so far.'''
+    del STAGES[:]
+
+
+@contextlib.contextmanager
+def stage(name):
+    '''Measures the memory used by a stage in a 'with' statement, adding it
+    to 'STAGES'.'''
+    current, _, measure = _usage()
+    if measure == TRACED:
+        # Before Python 3.9 the peak can only be reset by forgetting the
+        # memory already traced, which then counts from 0
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.clear_traces()
+            current = 0
+    try:
+        yield
+    finally:
+        if current is not None:
+            STAGES.append((name, max(_usage()[1] - current, 0), measure))
+
+
+def over_budget():
+    '''Returns True if any stage measured used more than the budget.'''
+    limit = budget()
+    return limit is not None and any(used > limit for _, used, _ in STAGES)
+
+
+def report(title='MTG Memory'):
+    '''Returns a table of the memory used by each stage measured, saying
+    for each whether it is traced memory or the rise in the peak RSS.'''
+    limit = budget()
+    lines = ['%s: budget %s' % (title, 'none' if limit is None
+                                 else '%.0f MB' % (float(limit) / MB))]
+    for name, used, measure in STAGES:
+        lines.append('    %-36s %9.1f MB %-6s%s' % (
+                     name, float(used) / MB, measure,
+                     '  OVER BUDGET' if limit is not None and used > limit
+                     else ''))
+    return '\n'.join(lines)
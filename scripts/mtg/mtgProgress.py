@@ -0,0 +1,171 @@
+r'''Module of classes for reporting the progress of long running procedures.
+
+   The idea behind this module is that the procedures making the terrain
+   only say when a stage starts and how far through it they are, and a
+   'ProgressReporter' works out when it is worth passing that on. Updates are
+   only emitted when the progress has moved on by at least 'percent' percent
+   or 'interval' seconds have passed, so a loop over millions of vertices
+   only sends around a hundred messages instead of one for each vertex.
+
+   'QueueReporter' passes the updates into a 'Queue' as the old progress
+   messages were, a 2 tuple of the message and total when a stage starts
+   followed by the amount done, and 'Complete' when everything is done.
+
+   None of the classes in this module need Maya, so they can be tested from
+   any Python interpreter.
+
+       >>> import Queue
+       >>> q = Queue.Queue()
+       >>> progress = QueueReporter(q, percent=25, interval=None)
+       >>> progress.start('Reading WAV Data', 1000)
+       >>> for i in xrange(1000):
+       ...     progress.advance()
+       >>> progress.done()
+       >>> [q.get() for _ in xrange(q.qsize())]
+       [('Reading WAV Data', 1000), 0, 250, 500, 750, 1000, 'Complete']
+
+    To test/execute the examples in the module documentation, once you have
+    imported the mtgProgress module:
+    import doctest
+    nfail, ntests = doctest.testmod(mtgProgress)
+
+'''
+import time
+
+
+class ProgressReporter(object):
+    '''Keeps track of the progress of a procedure and emits updates at a
+    limited rate. This reporter does nothing with the updates itself;
+    subclasses pass them on by overriding 'emit' and 'finish'.
+
+    Parameters:
+        percent [float]         : How many percent the progress has to move
+                                  on by before it is emitted again.
+        interval [None][float]  : If not None, the progress is also emitted
+                                  when this many seconds have passed since
+                                  the last update.
+
+    Attributes:
+        msg [None][str]  : The message of the current stage.
+        total [int]      : The total amount of the current stage.
+        count [int]      : The amount done of the current stage.
+        cancelled [bool] : True once 'cancel' has been called. Procedures
+                           check this to stop early.
+
+    '''
+    def __init__(self, percent=1.0, interval=0.1):
+        self.percent = percent
+        self.interval = interval
+        self.msg = None
+        self.total = 1
+        self.count = 0
+        self.cancelled = False
+        self._nextCount = 0
+        self._lastTime = 0.0
+
+    def start(self, msg, total):
+        '''Starts a new stage called 'msg' with 'total' amount to do.'''
+        self.msg = msg
+        self.total = max(int(total), 1)
+        self.count = 0
+        self.emit_stage(msg, self.total)
+        self._emit()
+
+    def advance(self, n=1):
+        '''Moves the current stage on by 'n', emitting the progress if it
+        has moved on far enough or enough time has passed.'''
+        self.count += n
+        if self.count >= self._nextCount or self.count >= self.total:
+            self._emit()
+        elif (self.interval is not None and
+              time.time() - self._lastTime >= self.interval):
+            self._emit()
+
+    def update(self, count):
+        '''Sets the amount done of the current stage to 'count'.'''
+        self.advance(count - self.count)
+
+    def done(self):
+        '''Says that everything has finished.'''
+        self.finish()
+
+    def cancel(self):
+        '''Asks the procedure being reported on to stop.'''
+        self.cancelled = True
+
+    def _emit(self):
+        self.emit(self.msg, self.count, self.total)
+        self._nextCount = self.count + max(self.total * self.percent / 100.0,
+                                           1)
+        self._lastTime = time.time()
+
+    def emit_stage(self, msg, total):
+        '''Called when a new stage is started.'''
+        pass
+
+    def emit(self, msg, count, total):
+        '''Called with the progress of the current stage when it has moved
+        on far enough.'''
+        pass
+
+    def finish(self):
+        '''Called when everything has finished.'''
+        pass
+
+
+class QueueReporter(ProgressReporter):
+    '''Puts the progress into a 'Queue' as a 2 tuple of the message and total
+    when a stage starts, the amount done after that and 'Complete' when
+    everything is done.
+
+    Parameters:
+        queue [object] : The 'Queue' the progress is put into.
+
+    '''
+    def __init__(self, queue, percent=1.0, interval=0.1):
+        ProgressReporter.__init__(self, percent, interval)
+        self.queue = queue
+
+    def emit_stage(self, msg, total):
+        self.queue.put((msg, total))
+
+    def emit(self, msg, count, total):
+        self.queue.put(count)
+
+    def finish(self):
+        self.queue.put('Complete')
+
+
+class CallbackReporter(ProgressReporter):
+    '''Calls a function with the message, the amount done and the total
+    of the current stage each time the progress is emitted.
+
+    Parameters:
+        callback [func] : The function called with the progress.
+
+    '''
+    def __init__(self, callback, percent=1.0, interval=0.1):
+        ProgressReporter.__init__(self, percent, interval)
+        self.callback = callback
+
+    def emit(self, msg, count, total):
+        self.callback(msg, count, total)
+
+
+def reporter(progress=None):
+    '''Makes a progress reporter out of what was passed to a procedure.
+
+    Parameters:
+        progress [None][object] : Either None, a 'ProgressReporter' or a
+                                  'Queue' for the old progress messages.
+
+    On Exit:
+        Returns a 'ProgressReporter', which does nothing if 'progress' was
+        None.
+
+    '''
+    if progress is None:
+        return ProgressReporter()
+    if isinstance(progress, ProgressReporter):
+        return progress
+    return QueueReporter(progress)
@@ -0,0 +1,212 @@
+r'''Module for indexing the details of the songs in a directory.
+
+   The idea behind this module is that picking a song out of a big library
+   should not need every song to be opened as a 'TerrainWaveFile' and
+   imported into Maya just to show how long it is. 'SongIndex' reads only
+   the RIFF header of each WAV file in a directory, which holds the number
+   of channels, the frame rate, the sample width and the number of frames,
+   and keeps them in a small JSON index file in the directory. The headers
+   are read by a pool of threads, since most of the time goes on waiting
+   for the disc. When the index is refreshed, only the songs whose size or
+   modification time has changed are read again, so opening a library that
+   was indexed before is instant.
+
+   None of this module needs Maya.
+
+       >>> import tempfile, shutil, wave
+       >>> folder = tempfile.mkdtemp()
+       >>> song = wave.open(os.path.join(folder, 'Intro.wav'), 'wb')
+       >>> song.setparams((2, 2, 44100, 0, 'NONE', 'not compressed'))
+       >>> song.writeframes('\0' * 4 * 44100 * 90)
+       >>> song.close()
+       >>> index = SongIndex(folder)
+       >>> index.refresh()
+       1
+       >>> for name, entry in index.entries():
+       ...     print name, entry['lengthtime'], entry['framerate']
+       Intro.wav 0:01:30 44100
+       >>> SongIndex(folder).refresh()
+       0
+       >>> shutil.copy(os.path.join(folder, 'Intro.wav'),
+       ...             os.path.join(folder, 'Chanson d\xc3\xa9t\xc3\xa9.wav'))
+       >>> SongIndex(folder).refresh()
+       1
+       >>> SongIndex(folder).refresh()
+       0
+       >>> shutil.rmtree(folder)
+
+    To test/execute the examples in the module documentation, once you have
+    imported the mtgSongIndex module:
+    import doctest
+    nfail, ntests = doctest.testmod(mtgSongIndex)
+
+'''
+import os
+import sys
+import json
+import wave
+from multiprocessing.pool import ThreadPool
+
+from terrainWave import length_time
+
+# The name of the index file kept in each directory
+INDEX_NAME = '.mtgSongIndex.json'
+# Changed whenever the details kept for each song change, so that old
+# index files are read again
+INDEX_VERSION = 1
+HEADER_THREADS = 8
+
+
+def song_header(path):
+    '''Reads the details of a song from its RIFF header, without reading any
+    of its frames.
+
+    Parameters:
+        path [str] : The path of the WAV file.
+
+    On Exit:
+        Returns a dictionary of the number of channels, the frame rate, the
+        sample width in bytes, the number of frames, the length in seconds
+        and the length as "h:mm:ss" (see 'TerrainWaveFile.
+        getsonglengthtime'), or of the error if the header can't be read.
+
+    '''
+    try:
+        song = wave.open(path, 'rb')
+        try:
+            nchannels, sampwidth, framerate, nframes = song.getparams()[:4]
+        finally:
+            song.close()
+    except (IOError, EOFError, wave.Error) as e:
+        return {'error': '%s: %s' % (type(e).__name__, e)}
+    length = float(nframes) / framerate
+    return {'nchannels': nchannels, 'sampwidth': sampwidth,
+            'framerate': framerate, 'nframes': nframes, 'length': length,
+            'lengthtime': length_time(length)}
+
+
+def _decode(name):
+    '''Returns a file name or path as unicode, the same as the keys of an
+    index read back from JSON, so that songs with non-ASCII names are found
+    in the index. Names are decoded with the file system encoding, or else
+    UTF-8 as 'json' does, and are returned as they are if neither works.'''
+    if isinstance(name, bytes):
+        for encoding in (sys.getfilesystemencoding(), 'utf-8'):
+            try:
+                return name.decode(encoding or 'utf-8')
+            except UnicodeDecodeError:
+                pass
+    return name
+
+
+def _read_header(job):
+    name, path, size, mtime = job
+    entry = song_header(path)
+    entry.update(size=size, mtime=mtime)
+    return name, entry
+
+
+class SongIndex(object):
+    '''The details of the WAV files in a directory, kept in an index file so
+    that they only need to be read again when a file changes.
+
+    Parameters:
+        directory [str]       : The directory of WAV files.
+        indexPath [None][str] : The index file. If None, 'INDEX_NAME' in
+                                'directory' is used.
+
+    Attributes:
+        songs [dict] : The details of each song by file name (see
+                       'song_header'), along with its size and modification
+                       time when it was read.
+        files [dict] : The file name of each song as listed by 
+                       'os.listdir', by the name it has in 'songs', from 
+                       the last time the index was refreshed.
+
+    '''
+    def __init__(self, directory, indexPath=None):
+        self.directory = os.path.abspath(directory)
+        self.indexPath = indexPath or os.path.join(self.directory, INDEX_NAME)
+        self.songs = {}
+        self.files = {}
+        self.load()
+
+    def load(self):
+        '''Reads the index file, if there is one for this version.'''
+        try:
+            with open(self.indexPath) as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            return
+        if index.get('version') == INDEX_VERSION:
+            self.songs = index['songs']
+
+    def save(self):
+        '''Writes the index file, replacing the old one only once the new one
+        is written.'''
+        tmpPath = self.indexPath + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'songs': self.songs}, f)
+        if os.path.exists(self.indexPath):
+            os.remove(self.indexPath)
+        os.rename(tmpPath, self.indexPath)
+
+    def refresh(self, threads=HEADER_THREADS):
+        '''Reads the headers of the songs added or changed since the index
+        was made and forgets the songs that were removed.
+
+        Parameters:
+            threads [int] : The most threads reading headers at once.
+
+        On Exit:
+            Updates 'songs' and the index file, and returns the number of
+            songs read. If the index file can't be written, such as in a
+            read only library, 'songs' is still updated.
+
+        '''
+        # The index keys are unicode while a byte string directory lists
+        # byte string names, so the names are decoded to find them in the
+        # index and the names as listed are kept to open the files
+        self.files = dict((_decode(n), n) for n in os.listdir(self.directory)
+                          if n.lower().endswith('.wav'))
+        names = list(self.files)
+        stale = []
+        for name in names:
+            path = self.path(name)
+            stat = os.stat(path)
+            entry = self.songs.get(name)
+            if (entry is None or entry['size'] != stat.st_size or
+                    entry['mtime'] != stat.st_mtime):
+                stale.append((name, path, stat.st_size, stat.st_mtime))
+        removed = set(self.songs) - set(names)
+
+        if stale:
+            pool = ThreadPool(min(threads, len(stale)))
+            try:
+                self.songs.update(pool.map(_read_header, stale))
+            finally:
+                pool.close()
+                pool.join()
+        for name in removed:
+            del self.songs[name]
+        if stale or removed:
+            try:
+                self.save()
+            except (IOError, OSError):
+                pass
+        return len(stale)
+
+    def entries(self):
+        '''Returns a list of 2 tuples of the file name and details of each
+        song, in name order.'''
+        return sorted(self.songs.items(), key=lambda e: e[0].lower())
+
+    def path(self, name):
+        '''Returns the full path of the song 'name'.'''
+        fileName = self.files.get(name, name)
+        directory = self.directory
+        # A unicode directory lists names it can't decode as byte strings
+        if isinstance(fileName, bytes) and not isinstance(directory, bytes):
+            directory = directory.encode(sys.getfilesystemencoding() or 
+                                         'utf-8')
+        return os.path.join(directory, fileName)
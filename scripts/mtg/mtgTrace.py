@@ -0,0 +1,200 @@
+r'''Module for tracing how long each stage of making a terrain takes.
+
+   The idea behind this module is that when making a terrain is slow on
+   someone's machine, they can turn tracing on, make the terrain again and
+   send the trace file, which shows how long reading the song, averaging the
+   amplitudes, finding the normals, moving the vertices and so on each took.
+   The trace is written in the Chrome 'trace_event' JSON format, so it can be
+   opened in 'chrome://tracing' or https://ui.perfetto.dev.
+
+   Stages are traced with 'span' and amounts such as the bytes read or the
+   vertices moved are added up with 'count'. Counts are only written to the
+   trace when a span ends, as how much each counter went up by during the
+   span and as one counter event with its total, so counting every Maya
+   command doesn't fill the trace with events. When tracing is off, 'span'
+   returns the same empty span every time and 'count' returns straight away,
+   so they cost next to nothing. Tracing is turned on with 'enable', or by
+   setting the 'MTG_TRACE' environment variable to the path of the trace file
+   before MTG is imported, in which case the interface also counts the Maya
+   commands and writes the trace each time a terrain or texture is made.
+
+       >>> enable()
+       >>> with span('Reading WAV Data', nvtx=100):
+       ...     for i in range(4):
+       ...         count('bytes read', 100)
+       >>> [(e['name'], e['ph']) for e in EVENTS]
+       [('bytes read', 'C'), ('Reading WAV Data', 'X')]
+       >>> sorted(EVENTS[1]['args'].items())
+       [('bytes read', 400), ('nvtx', 100)]
+       >>> disable()
+
+    To test/execute the examples in the module documentation, once you have
+    imported the mtgTrace module:
+    import doctest
+    nfail, ntests = doctest.testmod(mtgTrace)
+
+'''
+import os
+import json
+import time
+import threading
+
+try:
+    import mayaSnippet.mayaProfile as mayaProfile
+except ImportError:
+    mayaProfile = None
+
+# The events recorded since tracing was last turned on
+EVENTS = []
+# The running totals of each counter
+COUNTERS = {}
+# The totals of each counter when it was last written as a counter event
+_written = {}
+
+_state = {'enabled': False, 'path': None, 'start': 0.0}
+
+
+def enabled():
+    '''Returns True if tracing is on.'''
+    return _state['enabled']
+
+
+def enable(path=None, commands=False):
+    '''Turns tracing on, forgetting any events already recorded.
+
+    Parameters:
+        path [None][str] : The file the trace is written to by 'dump'.
+        commands [bool]  : If True, the Maya commands issued by the MTG 
+                           modules already imported are counted as well (see 
+                           'count_commands').
+
+    '''
+    del EVENTS[:]
+    COUNTERS.clear()
+    _written.clear()
+    _state.update(enabled=True, path=path, start=time.time())
+    if commands:
+        count_commands()
+
+
+def disable():
+    '''Turns tracing off. The recorded events are kept until tracing is
+    turned on again.'''
+    _state['enabled'] = False
+
+
+def _timestamp():
+    return (time.time() - _state['start']) * 1e6
+
+
+def _write_counters(timestamp):
+    '''Records a counter event for each counter that has gone up since it
+    was last recorded.'''
+    for name, total in COUNTERS.items():
+        if _written.get(name) != total:
+            _written[name] = total
+            EVENTS.append({'name': name, 'ph': 'C', 'ts': timestamp,
+                           'pid': os.getpid(), 'args': {'value': total}})
+
+
+class _Span(object):
+    '''A traced stage, recorded as a complete event when it ends along with
+    how much each counter went up by while it ran.'''
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.counters = dict(COUNTERS)
+        self.begin = _timestamp()
+        return self
+
+    def __exit__(self, *exc):
+        end = _timestamp()
+        args = dict(self.args)
+        for name, value in COUNTERS.items():
+            if value != self.counters.get(name, 0):
+                args[name] = value - self.counters.get(name, 0)
+        _write_counters(end)
+        EVENTS.append({'name': self.name, 'ph': 'X', 'ts': self.begin,
+                       'dur': end - self.begin, 'pid': os.getpid(),
+                       'tid': threading.current_thread().ident,
+                       'args': args})
+        return False
+
+
+class _NullSpan(object):
+    '''The span returned when tracing is off.'''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+    '''Traces a stage in a 'with' statement.
+
+    Parameters:
+        name [str] : The name of the stage shown in the trace.
+        args       : Any values to show with the stage, such as the number
+                     of vertices.
+
+    On Exit:
+        Returns the context manager tracing the stage.
+
+    '''
+    if not _state['enabled']:
+        return NULL_SPAN
+    return _Span(name, args)
+
+
+def count(name, value=1):
+    '''Adds 'value' to the counter 'name', such as 'bytes read'. The
+    counter is written to the trace when the span it is in ends.'''
+    if not _state['enabled']:
+        return
+    COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+
+def _count_command(name, seconds):
+    count('maya commands')
+
+
+def count_commands(modules=('mtgMain', 'mayaFuncs', 'mtgGUI')):
+    '''Profiles the 'cmds' of the MTG modules with 'mayaSnippet.mayaProfile'
+    and counts the commands they call into the 'maya commands' counter.'''
+    if mayaProfile is None:
+        return
+    if _count_command not in mayaProfile.LISTENERS:
+        mayaProfile.LISTENERS.append(_count_command)
+    mayaProfile.enable(modules)
+
+
+def dump(path=None):
+    '''Writes the recorded events as a Chrome trace, along with the totals
+    of any counters that have gone up since a span last ended.
+
+    Parameters:
+        path [None][str] : The file written to. If None, the path given to
+                           'enable' is used.
+
+    On Exit:
+        Returns the path written to, or None if there is no path.
+
+    '''
+    path = path or _state['path']
+    if path is None:
+        return None
+    if _state['enabled']:
+        _write_counters(_timestamp())
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': EVENTS, 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+if os.environ.get('MTG_TRACE'):
+    enable(os.environ['MTG_TRACE'])
@@ -0,0 +1,232 @@
+r'''Module of procedures for working out where the cliff, grass and snow
+   textures will land on a terrain.
+
+   The idea behind this module is to do the texture blending that the 'ramp'
+   and 'projection' network from 'mtgMain.create_texture' does, but only once
+   and for every point at the same time using NumPy arrays. The ramp positions
+   used are the same as the ones collected by the interface (cliffPos,
+   grassPos and snowPos) and range from 0.0 at the lowest point of the terrain
+   to 1.0 at the highest. Steep areas of the terrain can also be pushed
+   towards the cliff texture using the slope of each point.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import numpy as np
+       >>> heights = np.array([0.0, 0.25, 0.5, 0.75, 1.0])
+       >>> weights = band_weights(heights, cliffPos=(0.5,), grassPos=(0,),
+       ...                        snowPos=(1,), interpolation=1)
+       >>> weights[:, GRASS].tolist()
+       [1.0, 0.5, 0.0, 0.0, 0.0]
+       >>> weights[:, SNOW].tolist()
+       [0.0, 0.0, 0.0, 0.5, 1.0]
+       >>> splat = splat_pixels(weights)
+       >>> splat.shape
+       (5, 4)
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainBands module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainBands)
+
+'''
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The channel of the splat texture each of the textures are stored in
+CLIFF = 0
+GRASS = 1
+SNOW = 2
+MASK = 3
+
+AXIS_INDEX = {'x': 0, 'y': 1, 'z': 2}
+
+
+class RAMP_INTERPOLATION:
+    none = 0
+    linear = 1
+    smooth = 4
+
+
+def require_numpy():
+    '''Used to make sure NumPy is available before running any of the array
+    procedures.
+
+    On Exit:
+        Raises an ImportError if NumPy cannot be imported in this Python
+        session.
+
+    '''
+    if np is None:
+        raise ImportError('NumPy is needed for this part of MTG but could not '
+                          'be imported.')
+
+
+def normalise_heights(points, axis='y'):
+    '''Used to find how high each point is on the terrain as a value from
+    0.0 to 1.0, the same way the projected ramp sees the terrain.
+
+    Parameters:
+        points [array] : A (n, 3) array of point positions.
+        axis [str]     : The up axis of the terrain. Valid values are x,y,z.
+
+    On Exit:
+        Returns a float array of length n with the lowest point being 0.0 and
+        the highest being 1.0. A flat terrain will return all 0.0.
+
+    '''
+    require_numpy()
+    heights = np.asarray(points, dtype=np.float64)[:, AXIS_INDEX[axis]]
+    low = heights.min()
+    span = heights.max() - low
+    if span == 0:
+        return np.zeros_like(heights)
+    return (heights - low) / span
+
+
+def slope_values(normals, axis='y'):
+    '''Used to find how steep the terrain is at each point from the point
+    normals.
+
+    Parameters:
+        normals [array] : A (n, 3) array of point normals.
+        axis [str]      : The up axis of the terrain. Valid values are x,y,z.
+
+    On Exit:
+        Returns a float array of length n with 0.0 being flat and 1.0 being a
+        vertical wall.
+
+    '''
+    require_numpy()
+    normals = np.asarray(normals, dtype=np.float64)
+    lengths = np.sqrt((normals ** 2).sum(axis=1))
+    lengths[lengths == 0] = 1
+    return 1 - np.abs(normals[:, AXIS_INDEX[axis]]) / lengths
+
+
+def ramp_entries(cliffPos=(0.75, 0.5), grassPos=(0,), snowPos=(1,)):
+    '''Used to combine all the ramp positions into sorted entries.
+
+    Parameters:
+        cliffPos [tuple] : The ramp positions of the cliff texture.
+        grassPos [tuple] : The ramp positions of the grass texture.
+        snowPos [tuple]  : The ramp positions of the snow texture.
+
+    On Exit:
+        Returns a 2 tuple of the sorted positions array and a (n, 3) array of
+        the weights each entry gives to the cliff, grass and snow textures.
+        If there are no positions, a single cliff entry is returned.
+
+    '''
+    require_numpy()
+    entries = sorted([(float(p), CLIFF) for p in cliffPos] +
+                     [(float(p), GRASS) for p in grassPos] +
+                     [(float(p), SNOW) for p in snowPos])
+    if entries == []:
+        entries = [(0.0, CLIFF)]
+    positions = np.array([p for p, _ in entries])
+    colours = np.zeros((len(entries), 3))
+    colours[np.arange(len(entries)), [c for _, c in entries]] = 1
+    return positions, colours
+
+
+def band_weights(heights, cliffPos=(0.75, 0.5), grassPos=(0,), snowPos=(1,),
+                 slopes=None, cliffSlope=0.6, slopeFalloff=0.15,
+                 interpolation=RAMP_INTERPOLATION.smooth):
+    '''Works out how much of the cliff, grass and snow textures each point
+    has, in one pass over all of the points.
+
+    Parameters:
+        heights [array]      : The normalised heights of each point (see
+                               'normalise_heights').
+        cliffPos [tuple]     : The ramp positions of the cliff texture.
+                               Ranges from 0.0 to 1.0.
+        grassPos [tuple]     : The ramp positions of the grass texture.
+                               Ranges from 0.0 to 1.0.
+        snowPos [tuple]      : The ramp positions of the snow texture.
+                               Ranges from 0.0 to 1.0.
+        slopes [None][array] : If not None, the slope of each point (see
+                               'slope_values') used to push steep areas
+                               towards the cliff texture.
+        cliffSlope [float]   : The slope from which points start to become
+                               cliff.
+        slopeFalloff [float] : The slope range over which points blend into
+                               being fully cliff.
+        interpolation [int]  : The ramp interpolation between each of the
+                               entries. The value relates to the ramp's
+                               interpolation option menu with 0 (None),
+                               1 (Linear) and 4 (Smooth) supported. Any other
+                               value is treated as linear.
+
+    On Exit:
+        Returns a (n, 3) float array of the cliff, grass and snow weights for
+        each point, with each row adding up to 1.0.
+
+    '''
+    require_numpy()
+    heights = np.clip(np.asarray(heights, dtype=np.float64), 0, 1)
+    positions, colours = ramp_entries(cliffPos, grassPos, snowPos)
+
+    last = len(positions) - 1
+    lower = np.clip(np.searchsorted(positions, heights, side='right') - 1,
+                    0, last)
+    upper = np.minimum(lower + 1, last)
+    gap = positions[upper] - positions[lower]
+    gap[gap == 0] = 1
+    t = np.clip((heights - positions[lower]) / gap, 0, 1)
+    if interpolation == RAMP_INTERPOLATION.none:
+        t = np.zeros_like(t)
+    elif interpolation == RAMP_INTERPOLATION.smooth:
+        t = t * t * (3 - 2 * t)
+    weights = colours[lower] * (1 - t)[:, None] + colours[upper] * t[:, None]
+
+    if slopes is not None:
+        steep = np.clip((np.asarray(slopes, dtype=np.float64) - cliffSlope) /
+                        max(slopeFalloff, 1e-6), 0, 1)
+        weights *= (1 - steep)[:, None]
+        weights[:, CLIFF] += steep
+
+    totals = weights.sum(axis=1)
+    totals[totals == 0] = 1
+    return weights / totals[:, None]
+
+
+def band_colours(weights, colours):
+    '''Blends a colour for each point from its texture weights, used to
+    preview where the textures will land without a shading network.
+
+    Parameters:
+        weights [array]  : A (n, 3) array from 'band_weights'.
+        colours [tuple]  : A 3 tuple of the RGB colours for the cliff, grass
+                           and snow textures.
+
+    On Exit:
+        Returns a (n, 3) float array of RGB colours.
+
+    '''
+    require_numpy()
+    return np.dot(np.asarray(weights, dtype=np.float64),
+                  np.asarray(colours, dtype=np.float64)[:, :3])
+
+
+def splat_pixels(weights):
+    '''Converts the texture weights into RGBA splat values. The red, green
+    and blue channels store the cliff, grass and snow weights and the alpha
+    channel stores the grass layer mask, so that layering grass over cliff
+    followed by snow over both gives back exactly the weights.
+
+    Parameters:
+        weights [array] : A (..., 3) array from 'band_weights'.
+
+    On Exit:
+        Returns a (..., 4) float array of RGBA values.
+
+    '''
+    require_numpy()
+    weights = np.asarray(weights, dtype=np.float64)
+    under = weights[..., CLIFF] + weights[..., GRASS]
+    mask = np.divide(weights[..., GRASS], under,
+                     out=np.zeros_like(under), where=under > 0)
+    return np.concatenate((weights, mask[..., None]), axis=-1)
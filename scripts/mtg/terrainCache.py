@@ -0,0 +1,350 @@
+r'''Module of procedures for caching animated terrain heights on disc.
+
+   The idea behind this module is to let a terrain move with the song over
+   the timeline without keyframing every vertex on every frame. At each frame
+   the terrain shows the part of the song that has just been played, with the
+   first vertex showing the amplitude 'window' seconds ago and the last vertex
+   the amplitude at the current frame, the same way 'createheightvals'
+   spreads the whole song over the vertices.
+
+   The heights for every frame are worked out from one analysis of the song
+   and written to a cache file that is read with a memory map, so a deformer
+   only reads the frame it is showing. Frames can be stored as 16 or 32 bit
+   floats, or as 8 bit deltas from the frame before with a full frame every
+   'keyInterval' frames, which halves the size of a 16 bit cache. As a guide,
+   a 3 minute song at 24 fps on a 256x256 grid makes a cache of about 570MB
+   with 16 bit floats and about 300MB with deltas.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import os, tempfile
+       >>> import numpy as np
+       >>> samples = np.tile([[2], [-2], [6], [-6]], (6, 1))
+       >>> env = envelope(samples, step=2)
+       >>> frames = HeightFrames(env, window_starts(4, 2.0, 8.0, 2), 3, 0.5)
+       >>> frames[:].tolist()
+       [[0.0, 0.0, 0.0], [0.0, 1.0, 3.0], [3.0, 1.0, 3.0], [3.0, 1.0, 3.0]]
+       >>> path = os.path.join(tempfile.gettempdir(), 'mtgDocTest.mtgc')
+       >>> write_height_cache(path, frames, 2.0, delta=True, keyInterval=2)
+       >>> cache = HeightCache(path)
+       >>> cache.nFrames, cache.nVtx
+       (4, 3)
+       >>> np.allclose(cache.frame(3), frames[3:4][0], atol=0.01)
+       True
+       >>> cache.close()
+       >>> os.remove(path)
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainCache module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainCache)
+
+'''
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from terrainBands import require_numpy
+
+CACHE_MAGIC = 'MTGH'
+CACHE_VERSION = 1
+CACHE_HEADER = '<4sHIIfBBI'
+HEADER_SIZE = 64
+
+# The codes used in the cache header for the dtype of the stored heights
+CACHE_DTYPES = {0: 'float16', 1: 'float32'}
+DTYPE_CODES = {'float16': 0, 'float32': 1}
+
+
+def envelope(samples, step, negative=False):
+    '''Averages the amplitude of a song over blocks of frames, the same way
+    'createheightvals' averages the amplitude for each vertex.
+
+    Parameters:
+        samples [array]  : A (nframes, nchannels) array of the amplitude
+                           values of the song.
+        step [int]       : The number of frames averaged for each value.
+        negative [bool]  : If True, the signed amplitudes are averaged. Else,
+                           the absolute amplitudes are averaged.
+
+    On Exit:
+        Returns a float32 array of one value for every full block of frames.
+
+    '''
+    require_numpy()
+    step = max(int(step), 1)
+    samples = np.asarray(samples)
+    nBlocks = len(samples) // step
+    blocks = samples[:nBlocks * step].reshape(nBlocks, -1).astype(np.float32)
+    if not negative:
+        blocks = np.abs(blocks)
+    return blocks.mean(axis=1)
+
+
+def window_starts(nFrames, fps, framerate, step):
+    '''Finds which envelope value each animation frame ends at.
+
+    Parameters:
+        nFrames [int]     : The number of animation frames.
+        fps [float]       : The number of animation frames per second.
+        framerate [float] : The number of song frames per second.
+        step [int]        : The number of song frames per envelope value.
+
+    On Exit:
+        Returns an integer array of the envelope index of each frame.
+
+    '''
+    require_numpy()
+    return np.round(np.arange(nFrames) * (float(framerate) /
+                                          (fps * step))).astype(np.int64)
+
+
+class HeightFrames:
+    '''The heights of every vertex on every frame, made from the envelope of
+    a song when they are asked for so that the whole animation is never held
+    in memory at once.
+
+    Parameters:
+        env [array]    : The envelope from 'envelope'.
+        starts [array] : The envelope index of each frame from 'window_starts'.
+        nVtx [int]     : The number of vertices.
+        scale [float]  : The value each envelope value is multiplied by.
+
+    Attributes:
+        windows [array] : A strided (nEnv + 1, nVtx) view of the envelope,
+                          padded with zeros before the song starts, where
+                          row i holds the nVtx values ending at index i.
+
+    '''
+    def __init__(self, env, starts, nVtx, scale):
+        require_numpy()
+        padded = np.concatenate((np.zeros(nVtx, dtype=np.float32),
+                                 np.asarray(env, dtype=np.float32)))
+        self.windows = np.lib.stride_tricks.as_strided(
+            padded, (len(padded) - nVtx + 1, nVtx),
+            (padded.strides[0], padded.strides[0]))
+        self._padded = padded
+        self.starts = np.minimum(starts, len(self.windows) - 1)
+        self.nVtx = nVtx
+        self.scale = np.float32(scale)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, frames):
+        '''Returns a (n, nVtx) float32 array of the heights of the frames.'''
+        return self.windows[self.starts[frames]] * self.scale
+
+
+def song_frames(samples, framerate, nVtx, vheight, fps=24, window=10.0,
+                negative=False):
+    '''Makes the heights of every vertex on every frame of a song in one
+    analysis of the whole song.
+
+    Parameters:
+        samples [array]   : A (nframes, nchannels) array of the amplitude
+                            values of the song.
+        framerate [float] : The number of song frames per second.
+        nVtx [int]        : The number of vertices.
+        vheight [float]   : The highest height of any vertex on any frame.
+        fps [float]       : The number of animation frames per second.
+        window [float]    : The number of seconds of the song shown over the
+                            vertices on each frame.
+        negative [bool]   : If True, the heights can be negative.
+
+    On Exit:
+        Returns a 'HeightFrames' object of the heights.
+
+    '''
+    require_numpy()
+    step = max(int(round(window * framerate / nVtx)), 1)
+    env = envelope(samples, step, negative)
+    highest = np.abs(env).max() if len(env) else 0
+    scale = float(vheight) / highest if highest > 0 else 0.0
+    nFrames = int(np.ceil(len(samples) * float(fps) / framerate))
+    return HeightFrames(env, window_starts(nFrames, fps, framerate, step),
+                        nVtx, scale)
+
+
+def cache_layout(nFrames, nVtx, dtype, delta, keyInterval):
+    '''Works out where each array is stored in a cache file.
+
+    Parameters:
+        nFrames [int]     : The number of frames.
+        nVtx [int]        : The number of vertices.
+        dtype [str]       : The dtype of the stored heights.
+        delta [bool]      : If True, the frames are stored as deltas.
+        keyInterval [int] : The number of frames between each full frame.
+
+    On Exit:
+        Returns a dictionary of the (offset, dtype, shape) of each array and
+        the total file size under 'size'.
+
+    '''
+    layout = {}
+    offset = HEADER_SIZE
+    if delta:
+        nKeys = (nFrames + keyInterval - 1) // keyInterval
+        arrays = (('scales', 'float32', (nFrames,)),
+                  ('keys', dtype, (nKeys, nVtx)),
+                  ('deltas', 'int8', (nFrames, nVtx)))
+    else:
+        arrays = (('frames', dtype, (nFrames, nVtx)),)
+    for name, arrayType, shape in arrays:
+        layout[name] = (offset, arrayType, shape)
+        offset += np.dtype(arrayType).itemsize * int(np.prod(shape))
+    layout['size'] = offset
+    return layout
+
+
+def write_height_cache(path, frames, fps, dtype='float16', delta=False,
+                       keyInterval=24, chunk=64):
+    '''Writes the heights of every frame to a cache file, a chunk of frames
+    at a time.
+
+    Parameters:
+        path [str]        : The file path of the cache.
+        frames [object]   : The heights of each frame, such as a
+                            'HeightFrames' object or a (nFrames, nVtx) array.
+        fps [float]       : The number of animation frames per second.
+        dtype [str]       : Either 'float16' or 'float32', the dtype used to
+                            store the heights or full frames.
+        delta [bool]      : If True, each frame is stored as an 8 bit delta
+                            from the frame before it, with a full frame every
+                            'keyInterval' frames. The deltas are made from
+                            the frames as they will be read back, so the
+                            rounding errors do not build up.
+        keyInterval [int] : The number of frames between each full frame.
+        chunk [int]       : The number of frames made at a time.
+
+    On Exit:
+        Writes the cache to 'path'.
+
+    '''
+    require_numpy()
+    nFrames = len(frames)
+    nVtx = frames[0:1].shape[1] if nFrames else 0
+    layout = cache_layout(nFrames, nVtx, dtype, delta, keyInterval)
+    header = struct.pack(CACHE_HEADER, CACHE_MAGIC, CACHE_VERSION, nFrames,
+                         nVtx, fps, DTYPE_CODES[dtype], int(delta),
+                         keyInterval)
+    with open(path, 'wb') as cache:
+        cache.write(header.ljust(HEADER_SIZE, '\0'))
+        cache.truncate(layout['size'])
+    if nFrames == 0:
+        return
+    arrays = dict((name, np.memmap(path, dtype=info[1], mode='r+',
+                                   offset=info[0], shape=info[2]))
+                  for name, info in layout.items() if name != 'size')
+
+    last = None
+    for first in range(0, nFrames, chunk):
+        block = np.asarray(frames[first:first + chunk], dtype=np.float32)
+        if not delta:
+            arrays['frames'][first:first + len(block)] = block
+            continue
+        for i, heights in enumerate(block, first):
+            if i % keyInterval == 0:
+                arrays['keys'][i // keyInterval] = heights
+                arrays['scales'][i] = 0
+                arrays['deltas'][i] = 0
+                last = arrays['keys'][i // keyInterval].astype(np.float32)
+                continue
+            change = heights - last
+            scale = np.float32(np.abs(change).max() / 127.0)
+            steps = np.zeros(nVtx, dtype=np.int8)
+            if scale > 0:
+                steps = np.clip(np.round(change / scale), -127,
+                                127).astype(np.int8)
+            arrays['scales'][i] = scale
+            arrays['deltas'][i] = steps
+            last = last + steps.astype(np.float32) * scale
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+
+class HeightCache:
+    '''Reads frames from a cache written by 'write_height_cache' through a
+    memory map, so only the frames that are asked for are read from disc.
+
+    Parameters:
+        path [str] : The file path of the cache.
+
+    Attributes:
+        path [str]        : The file path of the cache.
+        nFrames [int]     : The number of frames in the cache.
+        nVtx [int]        : The number of vertices of each frame.
+        fps [float]       : The number of frames per second of the cache.
+        delta [bool]      : If the frames are stored as deltas.
+        keyInterval [int] : The number of frames between each full frame.
+
+    '''
+    def __init__(self, path):
+        require_numpy()
+        with open(path, 'rb') as cache:
+            header = cache.read(struct.calcsize(CACHE_HEADER))
+        (magic, version, self.nFrames, self.nVtx, self.fps, dtypeCode, delta,
+         self.keyInterval) = struct.unpack(CACHE_HEADER, header)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            raise ValueError('%s is not an MTG height cache' % path)
+        self.path = path
+        self.delta = bool(delta)
+        layout = cache_layout(self.nFrames, self.nVtx,
+                              CACHE_DTYPES[dtypeCode], self.delta,
+                              self.keyInterval)
+        self.arrays = dict((name, np.memmap(path, dtype=info[1], mode='r',
+                                            offset=info[0], shape=info[2]))
+                           for name, info in layout.items()
+                           if name != 'size' and self.nFrames > 0)
+        self._lastFrame = None
+        self._lastHeights = None
+
+    def frame_at(self, seconds):
+        '''Returns the index of the frame shown at a time in seconds.'''
+        return int(round(seconds * self.fps))
+
+    def frame(self, index):
+        '''Reads the heights of a frame. Frames before the start or after
+        the end of the cache return the first or last frame.
+
+        Parameters:
+            index [int] : The index of the frame.
+
+        On Exit:
+            Returns a float32 array of the height of each vertex.
+
+        '''
+        if self.nFrames == 0:
+            return np.zeros(self.nVtx, dtype=np.float32)
+        index = min(max(int(index), 0), self.nFrames - 1)
+        if index == self._lastFrame:
+            return self._lastHeights
+        if not self.delta:
+            heights = np.array(self.arrays['frames'][index], dtype=np.float32)
+        else:
+            key = index - index % self.keyInterval
+            if (self._lastFrame is not None and key <= self._lastFrame <
+                    index):
+                first = self._lastFrame + 1
+                heights = self._lastHeights.copy()
+            else:
+                first = key + 1
+                heights = self.arrays['keys'][key // self.keyInterval].astype(
+                    np.float32)
+            for i in range(first, index + 1):
+                heights += (self.arrays['deltas'][i].astype(np.float32) *
+                            self.arrays['scales'][i])
+        self._lastFrame = index
+        self._lastHeights = heights
+        return heights
+
+    def close(self):
+        '''Releases the memory maps of the cache file.'''
+        self.arrays = {}
+        self._lastFrame = None
+        self._lastHeights = None
@@ -0,0 +1,224 @@
+r'''Module of procedures for eroding a grid of terrain heights.
+
+   The heights made from a song are raw amplitudes, which look spiky and
+   synthetic. The idea behind this module is to wear the heights down the way
+   weather would before the terrain is made, using two kinds of erosion:
+
+     - Thermal erosion, where material slides down from any slope that is
+       steeper than the talus (the steepest a slope can rest at).
+     - Hydraulic erosion, where rain dissolves material, carries it downhill
+       with the water and drops it again as the water evaporates.
+
+   Each iteration works on the whole grid at once by comparing every height
+   with its four neighbours using shifted NumPy arrays, so there are no loops
+   over the cells of the grid. The heights are scaled to a 0.0 to 1.0 range
+   while eroding so that the same options work for any terrain height.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import numpy as np
+       >>> heights = np.zeros((5, 5))
+       >>> heights[2, 2] = 1.0
+       >>> eroded = thermal_erosion(heights, iterations=10)
+       >>> bool(eroded[2, 2] < 1.0)
+       True
+       >>> round(float(eroded.sum()), 6)
+       1.0
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainErosion module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainErosion)
+
+'''
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from terrainBands import require_numpy
+
+
+def neighbour_differences(values):
+    '''Works out how much higher each cell is than each of its four
+    neighbours. Cells on the edge of the grid treat the missing neighbour as
+    being the same height, so nothing flows off the grid.
+
+    Parameters:
+        values [array] : A (rows, cols) array.
+
+    On Exit:
+        Returns a (4, rows, cols) array of the differences to the neighbour
+        above, below, to the left and to the right.
+
+    '''
+    diffs = np.zeros((4,) + values.shape, dtype=values.dtype)
+    diffs[0, 1:] = values[1:] - values[:-1]
+    diffs[1, :-1] = values[:-1] - values[1:]
+    diffs[2, :, 1:] = values[:, 1:] - values[:, :-1]
+    diffs[3, :, :-1] = values[:, :-1] - values[:, 1:]
+    return diffs
+
+
+def flow(values, outflow):
+    '''Moves amounts from every cell into its neighbours.
+
+    Parameters:
+        values [array]  : The (rows, cols) array to update in place.
+        outflow [array] : A (4, rows, cols) array of the amounts each cell
+                          gives to the neighbour above, below, to the left and
+                          to the right, in the same order as
+                          'neighbour_differences'.
+
+    On Exit:
+        Updates 'values' in place and returns it.
+
+    '''
+    values -= outflow.sum(axis=0)
+    values[:-1] += outflow[0, 1:]
+    values[1:] += outflow[1, :-1]
+    values[:, :-1] += outflow[2, :, 1:]
+    values[:, 1:] += outflow[3, :, :-1]
+    return values
+
+
+def split_outflow(diffs, amount):
+    '''Shares out an amount from every cell between its lower neighbours,
+    with steeper neighbours getting more.
+
+    Parameters:
+        diffs [array]  : The (4, rows, cols) positive height differences to
+                         each neighbour.
+        amount [array] : The (rows, cols) amount each cell gives away.
+
+    On Exit:
+        Returns the (4, rows, cols) outflow to use with 'flow'.
+
+    '''
+    total = diffs.sum(axis=0)
+    share = np.zeros_like(amount)
+    np.divide(amount, total, out=share, where=total > 0)
+    return diffs * share
+
+
+def normalised(heights):
+    '''Scales a grid of heights into a 0.0 to 1.0 range.
+
+    Parameters:
+        heights [array] : The (rows, cols) array of heights.
+
+    On Exit:
+        Returns a 3 tuple of the scaled float32 copy, the lowest height and
+        the height range, used to scale the heights back afterwards.
+
+    '''
+    heights = np.asarray(heights, dtype=np.float64)
+    low = heights.min()
+    span = heights.max() - low
+    if span == 0:
+        span = 1.0
+    return ((heights - low) / span).astype(np.float32), low, span
+
+
+def thermal_erosion(heights, iterations=50, strength=0.5, talus=None):
+    '''Wears down slopes that are steeper than the talus by sliding material
+    down to the neighbouring cells.
+
+    Parameters:
+        heights [array]      : The (rows, cols) array of heights.
+        iterations [int]     : The number of times the erosion is run.
+        strength [float]     : How much of the extra slope is moved each
+                               iteration, from 0.0 to 1.0.
+        talus [None][float]  : The height difference (as a fraction of the
+                               terrains height range) that a slope can rest
+                               at. If None, the average difference between
+                               neighbouring cells is used.
+
+    On Exit:
+        Returns a new (rows, cols) array of eroded heights.
+
+    '''
+    require_numpy()
+    h, low, span = normalised(heights)
+    if talus is None:
+        talus = np.abs(neighbour_differences(h)).mean() * 2
+    for _ in range(iterations):
+        diffs = neighbour_differences(h)
+        diffs -= talus
+        np.maximum(diffs, 0, out=diffs)
+        moved = diffs.max(axis=0) * (0.5 * strength)
+        flow(h, split_outflow(diffs, moved))
+    return h.astype(np.float64) * span + low
+
+
+def hydraulic_erosion(heights, iterations=50, strength=0.5, rain=0.01,
+                      evaporation=0.5, capacity=0.05):
+    '''Erodes the terrain with rain water, which dissolves material, carries
+    it downhill and drops it again as the water evaporates.
+
+    Parameters:
+        heights [array]      : The (rows, cols) array of heights.
+        iterations [int]     : The number of times the erosion is run.
+        strength [float]     : How much material the water dissolves, from
+                               0.0 to 1.0.
+        rain [float]         : The amount of water added to every cell each
+                               iteration.
+        evaporation [float]  : The fraction of water that evaporates each
+                               iteration.
+        capacity [float]     : How much material the water can carry for its
+                               amount.
+
+    On Exit:
+        Returns a new (rows, cols) array of eroded heights.
+
+    '''
+    require_numpy()
+    h, low, span = normalised(heights)
+    water = np.zeros_like(h)
+    sediment = np.zeros_like(h)
+    solubility = 0.1 * strength
+    for _ in range(iterations):
+        water += rain
+        dissolved = solubility * water
+        h -= dissolved
+        sediment += dissolved
+
+        diffs = neighbour_differences(h + water)
+        np.maximum(diffs, 0, out=diffs)
+        moved = np.minimum(water, diffs.max(axis=0) * 0.5)
+        waterOut = split_outflow(diffs, moved)
+        carried = np.zeros_like(h)
+        np.divide(sediment, water, out=carried, where=water > 0)
+        sedimentOut = waterOut * carried
+        flow(water, waterOut)
+        flow(sediment, sedimentOut)
+
+        water *= (1 - evaporation)
+        deposit = np.maximum(sediment - capacity * water, 0)
+        sediment -= deposit
+        h += deposit
+    h += sediment
+    return h.astype(np.float64) * span + low
+
+
+def erode(heights, thermalIter=0, hydraulicIter=0, strength=0.5):
+    '''Runs the thermal and then the hydraulic erosion on a grid of heights.
+
+    Parameters:
+        heights [array]     : The (rows, cols) array of heights.
+        thermalIter [int]   : The number of thermal erosion iterations.
+        hydraulicIter [int] : The number of hydraulic erosion iterations.
+        strength [float]    : The strength of both erosions, from 0.0 to 1.0.
+
+    On Exit:
+        Returns a new (rows, cols) array of eroded heights.
+
+    '''
+    require_numpy()
+    heights = np.asarray(heights, dtype=np.float64)
+    if thermalIter > 0:
+        heights = thermal_erosion(heights, thermalIter, strength)
+    if hydraulicIter > 0:
+        heights = hydraulic_erosion(heights, hydraulicIter, strength)
+    return heights
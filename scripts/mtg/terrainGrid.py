@@ -0,0 +1,195 @@
+r'''Module of procedures for working with terrains that are regular grids.
+
+   Most terrains made with MTG are 'polyPlane' objects, whose vertices are
+   laid out in rows and columns. The idea behind this module is to find out
+   when a mesh is one of these grids from its faces, so that values for each
+   vertex can be looked at as a (rows, cols) array and worked on with simple
+   2-D array operations instead of going through the mesh connectivity.
+   Meshes that are not grids are left to the generic procedures.
+
+   The grid layout looked for is the one made by 'polyPlane', where vertex
+   'r * cols + c' is in row r and column c, and the face between rows r and
+   r + 1 and columns c and c + 1 is face 'r * (cols - 1) + c'.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import numpy as np
+       >>> counts = np.array([4, 4])
+       >>> vertexIds = np.array([0, 1, 4, 3, 1, 2, 5, 4])
+       >>> grid_shape(counts, vertexIds, 6)
+       (2, 3)
+       >>> grid_shape(counts, vertexIds[::-1], 6) is None
+       True
+       >>> grid_view(np.arange(6), (2, 3)).tolist()
+       [[0, 1, 2], [3, 4, 5]]
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainGrid module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainGrid)
+
+'''
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from terrainBands import require_numpy
+
+
+def grid_faces(shape):
+    '''Makes the faces of a grid, with the vertex ids of each face sorted.
+
+    Parameters:
+        shape [tuple] : The number of rows and columns of vertices.
+
+    On Exit:
+        Returns a ((rows - 1) * (cols - 1), 4) integer array of the sorted
+        vertex ids of each face.
+
+    '''
+    require_numpy()
+    rows, cols = shape
+    corner = (np.arange(rows - 1)[:, None] * cols +
+              np.arange(cols - 1)[None, :]).ravel()
+    return np.column_stack((corner, corner + 1, corner + cols,
+                            corner + cols + 1))
+
+
+def grid_shape(counts, vertexIds, nVtx):
+    '''Finds if a mesh is a regular grid of quads laid out the same way as a
+    'polyPlane', by checking every one of its faces.
+
+    Parameters:
+        counts [array]    : The number of vertices of each face.
+        vertexIds [array] : The vertex ids of every face, one face after the
+                            other, as returned by 'MFnMesh.getVertices'.
+        nVtx [int]        : The number of vertices of the mesh.
+
+    On Exit:
+        Returns a 2 tuple of the number of rows and columns of vertices, or
+        None if the mesh is not a grid.
+
+    '''
+    require_numpy()
+    counts = np.asarray(counts)
+    vertexIds = np.asarray(vertexIds)
+    if len(counts) == 0 or not (counts == 4).all():
+        return None
+    first = np.sort(vertexIds[:4])
+    cols = int(first[2])
+    if cols < 2 or nVtx % cols != 0:
+        return None
+    shape = (nVtx // cols, cols)
+    if len(counts) != (shape[0] - 1) * (shape[1] - 1):
+        return None
+    faces = np.sort(vertexIds.reshape(-1, 4), axis=1)
+    if not (faces == grid_faces(shape)).all():
+        return None
+    return shape
+
+
+def grid_view(values, shape):
+    '''Looks at per vertex values as a grid without copying them.
+
+    Parameters:
+        values [array] : A value for each vertex, or a (n, c) array of values.
+        shape [tuple]  : The number of rows and columns of vertices.
+
+    On Exit:
+        Returns a (rows, cols) or (rows, cols, c) view of the values.
+
+    '''
+    require_numpy()
+    values = np.asarray(values)
+    return values.reshape(tuple(shape) + values.shape[1:])
+
+
+def regular_grid_uvs(uvs, uvVertexIds, shape, tolerance=1e-4):
+    '''Checks if the UVs of a grid are laid out evenly over the whole 0.0 to
+    1.0 UV area, with U going along the columns and V along the rows, as
+    'polyPlane' makes them.
+
+    Parameters:
+        uvs [array]         : A (m, 2) array of UV coordinates.
+        uvVertexIds [array] : The vertex id that each UV belongs to.
+        shape [tuple]       : The number of rows and columns of vertices.
+        tolerance [float]   : How far a UV can be from where it should be.
+
+    On Exit:
+        Returns True if the UVs match the grid.
+
+    '''
+    require_numpy()
+    rows, cols = shape
+    uvVertexIds = np.asarray(uvVertexIds)
+    expected = np.column_stack(((uvVertexIds % cols) / float(cols - 1),
+                                (uvVertexIds // cols) / float(rows - 1)))
+    return bool(len(uvs) > 0 and
+                np.abs(np.asarray(uvs) - expected).max() <= tolerance)
+
+
+def resample_grid(image, size):
+    '''Resizes a grid of values into a square texture with bilinear
+    filtering, placing the first and last rows and columns on the edges of
+    the texture.
+
+    Parameters:
+        image [array] : A (rows, cols, c) array of values.
+        size [int]    : The width and height of the texture.
+
+    On Exit:
+        Returns a (size, size, c) float array.
+
+    '''
+    require_numpy()
+    image = np.asarray(image, dtype=np.float64)
+    for axis in (0, 1):
+        n = image.shape[axis]
+        coords = np.clip((np.arange(size) + 0.5) / size * (n - 1), 0, n - 1)
+        low = np.minimum(coords.astype(np.int64), max(n - 2, 0))
+        high = np.minimum(low + 1, n - 1)
+        t = coords - low
+        shape = [1] * image.ndim
+        shape[axis] = size
+        t = t.reshape(shape)
+        image = (np.take(image, low, axis=axis) * (1 - t) +
+                 np.take(image, high, axis=axis) * t)
+    return image
+
+
+def grid_smooth(values, iterations=1, strength=0.5):
+    '''Moves each value of a grid towards the average of the values next to
+    it in the rows and columns. This gives the same result as
+    'terrainSmooth.laplacian_smooth' on a grid mesh without the sparse
+    adjacency.
+
+    Parameters:
+        values [array]    : A (rows, cols) or (rows, cols, c) array of values.
+        iterations [int]  : The number of times the smoothing is run.
+        strength [float]  : How far each value is moved towards the average
+                            each iteration, from 0.0 to 1.0.
+
+    On Exit:
+        Returns a new float array of the smoothed values.
+
+    '''
+    require_numpy()
+    grid = np.array(values, dtype=np.float64)
+    found = np.zeros(grid.shape[:2])
+    found[1:] += 1
+    found[:-1] += 1
+    found[:, 1:] += 1
+    found[:, :-1] += 1
+    found = found.reshape(found.shape + (1,) * (grid.ndim - 2))
+    joined = found > 0
+    found[~joined] = 1
+    for _ in range(iterations):
+        total = np.zeros_like(grid)
+        total[1:] += grid[:-1]
+        total[:-1] += grid[1:]
+        total[:, 1:] += grid[:, :-1]
+        total[:, :-1] += grid[:, 1:]
+        grid += strength * (total / found - grid) * joined
+    return grid
@@ -0,0 +1,291 @@
+r'''Module of procedures for turning terrain values into image files.
+
+   The idea behind this module is to take values that MTG works out for each
+   vertex of a terrain, such as texture weights or heights, and write them
+   out as textures that Maya's file node can read. Values are placed into the
+   texture using the UV layout of the mesh, so the texture lines up with the
+   object when it is rendered.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import numpy as np
+       >>> values = np.array([[0.0], [1.0], [2.0], [3.0]])
+       >>> uvs = np.array([[0.0, 0.0], [0.9, 0.0], [0.0, 0.9], [0.9, 0.9]])
+       >>> image = rasterise_uvs(values, uvs, np.arange(4), 2)
+       >>> image[..., 0].tolist()
+       [[0.0, 1.0], [2.0, 3.0]]
+       >>> uvs = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+       >>> triangles = np.array([[0, 1, 3], [0, 3, 2]])
+       >>> image = rasterise_uvs(values, uvs, np.arange(4), 4, triangles)
+       >>> np.round(image[0, :, 0], 3).tolist()
+       [0.375, 0.625, 0.875, 1.125]
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainImage module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainImage)
+
+'''
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from terrainBands import require_numpy
+
+EXR_MAGIC = 20000630
+EXR_FLOAT = 2
+# The most texels tested against triangles at once by 'rasterise_triangles'
+RASTER_TEXELS = 1 << 20
+# How far outside a triangle a texel centre can be and still be inside it,
+# so that texels on the edge between two triangles are not missed
+BARYCENTRIC_TOLERANCE = 1e-9
+
+
+def shift_filled(image, shift, axis):
+    '''Moves an image one texel along an axis without wrapping around the
+    edges. The texels moved in are left as 0.
+
+    Parameters:
+        image [array] : The image array to shift.
+        shift [int]   : Either 1 or -1 for the direction of the move.
+        axis [int]    : The axis of the image to move along.
+
+    On Exit:
+        Returns a new shifted array the same shape as 'image'.
+
+    '''
+    moved = np.zeros_like(image)
+    src = [slice(None)] * image.ndim
+    dst = [slice(None)] * image.ndim
+    if shift > 0:
+        src[axis] = slice(None, -shift)
+        dst[axis] = slice(shift, None)
+    else:
+        src[axis] = slice(-shift, None)
+        dst[axis] = slice(None, shift)
+    moved[tuple(dst)] = image[tuple(src)]
+    return moved
+
+
+def rasterise_triangles(values, uvs, triangles, size):
+    '''Interpolates values across UV triangles, giving every texel whose 
+    centre is inside a triangle the barycentric blend of its three corners.
+
+    Parameters:
+        values [array]    : A (m, c) array of values for each UV.
+        uvs [array]       : A (m, 2) array of UV coordinates.
+        triangles [array] : A (t, 3) array of the UV index of each corner of
+                            every triangle.
+        size [int]        : The width and height of the texture.
+
+    On Exit:
+        Returns a 2 tuple of a (size*size, c) array of the summed values of
+        each texel and an array of the number of triangles summed into each
+        texel, with the first row being at the bottom of the UV space.
+
+    '''
+    channels = values.shape[1]
+    sums = np.zeros((size * size, channels))
+    counts = np.zeros(size * size)
+    # Texel centres are at whole numbers in these coordinates
+    corners = uvs[triangles] * size - 0.5
+    low = np.clip(np.ceil(corners.min(axis=1)), 0, size - 1).astype(np.int64)
+    high = np.clip(np.floor(corners.max(axis=1)), 
+                   0, size - 1).astype(np.int64)
+    widths = np.maximum(high - low + 1, 0)
+    nTexels = widths[:, 0] * widths[:, 1]
+    if len(triangles) == 0 or nTexels.max() == 0:
+        return sums, counts
+
+    step = max(1, RASTER_TEXELS // int(nTexels.max()))
+    for first in range(0, len(triangles), step):
+        n = nTexels[first:first + step]
+        tri = np.repeat(np.arange(first, first + len(n)), n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        x = low[tri, 0] + k % widths[tri, 0]
+        y = low[tri, 1] + k // widths[tri, 0]
+
+        a = corners[tri, 0]
+        v0 = corners[tri, 1] - a
+        v1 = corners[tri, 2] - a
+        px = x - a[:, 0]
+        py = y - a[:, 1]
+        d = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w1 = (px * v1[:, 1] - v1[:, 0] * py) / d
+            w2 = (v0[:, 0] * py - px * v0[:, 1]) / d
+        weights = np.column_stack((1 - w1 - w2, w1, w2))
+        inside = (d != 0) & (weights >= -BARYCENTRIC_TOLERANCE).all(axis=1)
+
+        index = (y * size + x)[inside]
+        blend = (weights[inside][..., None] * 
+                 values[triangles[tri[inside]]]).sum(axis=1)
+        counts += np.bincount(index, minlength=size * size)
+        for c in range(channels):
+            sums[:, c] += np.bincount(index, blend[:, c], 
+                                      minlength=size * size)
+    return sums, counts
+
+
+def rasterise_uvs(values, uvs, uvVertexIds, size, triangles=None):
+    '''Used to turn values stored per vertex into a square texture using the
+    UV layout of the mesh. When the triangles of the mesh are given, the
+    values are interpolated across each triangle. Otherwise, and for any
+    texel that no triangle covers, each texel takes the average of the
+    vertices that land in it. Any empty texels are then filled in from their
+    neighbours.
+
+    Parameters:
+        values [array]            : A (n, c) array of values for each vertex.
+        uvs [array]               : A (m, 2) array of UV coordinates.
+        uvVertexIds [array]       : An array of length m with the vertex id 
+                                    that each UV belongs to.
+        size [int]                : The width and height of the texture.
+        triangles [None][array]   : A (t, 3) array of the UV index of each 
+                                    corner of every triangle, such as from
+                                    'mayaFuncs.face_vertex_triangles'.
+
+    On Exit:
+        Returns a (size, size, c) float array with the first row being at the
+        bottom of the UV space (V = 0).
+
+    '''
+    require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    uvs = np.asarray(uvs, dtype=np.float64)
+    channels = values.shape[1]
+
+    texel = np.clip((uvs * size).astype(np.int64), 0, size - 1)
+    index = texel[:, 1] * size + texel[:, 0]
+    counts = np.bincount(index, minlength=size * size).astype(np.float64)
+    image = np.empty((size * size, channels))
+    for c in range(channels):
+        image[:, c] = np.bincount(index, values[uvVertexIds, c],
+                                  minlength=size * size)
+    filled = counts > 0
+    image[filled] /= counts[filled][:, None]
+    if triangles is not None:
+        sums, counts = rasterise_triangles(values[uvVertexIds], uvs, 
+                                           np.asarray(triangles), size)
+        covered = counts > 0
+        image[covered] = sums[covered] / counts[covered][:, None]
+        filled |= covered
+
+    image = image.reshape(size, size, channels)
+    filled = filled.reshape(size, size)
+    while not filled.all():
+        total = np.zeros_like(image)
+        found = np.zeros(filled.shape)
+        for axis in (0, 1):
+            for shift in (1, -1):
+                total += shift_filled(image * filled[..., None], shift, axis)
+                found += shift_filled(filled, shift, axis)
+        grow = ~filled & (found > 0)
+        if not grow.any():
+            break
+        image[grow] = total[grow] / found[grow][:, None]
+        filled = filled | grow
+    return image
+
+
+def write_tga(path, pixels):
+    '''Writes an uncompressed 32 bit TGA image that Maya's file node can read.
+
+    Parameters:
+        path [str]      : The file path to write the image to.
+        pixels [array]  : A (height, width, 4) array of RGBA values ranging
+                          from 0.0 to 1.0 with the first row being the bottom
+                          of the image.
+
+    On Exit:
+        Writes the image to 'path' and returns the path.
+
+    '''
+    require_numpy()
+    pixels = np.asarray(pixels)
+    height, width = pixels.shape[:2]
+    rgba = np.round(np.clip(pixels, 0, 1) * 255).astype(np.uint8)
+    bgra = rgba[..., [2, 1, 0, 3]]
+    header = struct.pack('<BBBHHBHHHHBB', 0, 0, 2, 0, 0, 0, 0, 0,
+                         width, height, 32, 8)
+    with open(path, 'wb') as tga:
+        tga.write(header)
+        tga.write(np.ascontiguousarray(bgra).tobytes())
+    return path
+
+
+def exr_attribute(name, attrType, value):
+    '''Packs a single OpenEXR header attribute.
+
+    Parameters:
+        name [str]     : The name of the attribute.
+        attrType [str] : The OpenEXR type name of the attribute.
+        value [str]    : The already packed value of the attribute.
+
+    On Exit:
+        Returns the attribute as a string of bytes.
+
+    '''
+    return (name.encode('ascii') + b'\0' + attrType.encode('ascii') + b'\0' +
+            struct.pack('<i', len(value)) + value)
+
+
+def write_exr(path, pixels, channels='RGB'):
+    '''Writes an uncompressed 32 bit float OpenEXR image, used for textures
+    such as displacement maps that need more precision than 8 bits.
+
+    Parameters:
+        path [str]      : The file path to write the image to.
+        pixels [array]  : A (height, width) or (height, width, c) array of
+                          values with the first row being the bottom of the
+                          image. A (height, width) array is written to every
+                          channel.
+        channels [str]  : The name of each of the channels in the image, one
+                          letter per channel.
+
+    On Exit:
+        Writes the image to 'path' and returns the path.
+
+    '''
+    require_numpy()
+    pixels = np.asarray(pixels, dtype='<f4')
+    if pixels.ndim == 2:
+        pixels = np.repeat(pixels[..., None], len(channels), axis=2)
+    height, width = pixels.shape[:2]
+    order = sorted(range(len(channels)), key=lambda c: channels[c])
+
+    chlist = b''.join([channels[c].encode('ascii') + b'\0' +
+                       struct.pack('<iB3xii', EXR_FLOAT, 0, 1, 1)
+                       for c in order]) + b'\0'
+    window = struct.pack('<iiii', 0, 0, width - 1, height - 1)
+    header = b''.join([struct.pack('<ii', EXR_MAGIC, 2),
+                       exr_attribute('channels', 'chlist', chlist),
+                       exr_attribute('compression', 'compression', b'\0'),
+                       exr_attribute('dataWindow', 'box2i', window),
+                       exr_attribute('displayWindow', 'box2i', window),
+                       exr_attribute('lineOrder', 'lineOrder', b'\0'),
+                       exr_attribute('pixelAspectRatio', 'float',
+                                     struct.pack('<f', 1)),
+                       exr_attribute('screenWindowCenter', 'v2f',
+                                     struct.pack('<ff', 0, 0)),
+                       exr_attribute('screenWindowWidth', 'float',
+                                     struct.pack('<f', 1)),
+                       b'\0'])
+
+    # OpenEXR scanlines run from the top of the image down, with each
+    # scanline storing all of the pixels of one channel before the next.
+    lines = np.ascontiguousarray(pixels[::-1][..., order].transpose(0, 2, 1))
+    lineSize = width * len(channels) * 4
+    first = len(header) + height * 8
+    offsets = first + np.arange(height, dtype='<u8') * (lineSize + 8)
+    with open(path, 'wb') as exr:
+        exr.write(header)
+        exr.write(offsets.astype('<u8').tobytes())
+        for y in range(height):
+            exr.write(struct.pack('<ii', y, lineSize))
+            exr.write(lines[y].tobytes())
+    return path
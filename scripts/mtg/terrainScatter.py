@@ -0,0 +1,191 @@
+r'''Module of procedures for scattering points over the surface of a terrain.
+
+   The idea behind this module is to place many objects such as rocks and
+   grass tufts on a terrain without working on them one at a time. The faces
+   of the mesh are split into triangles, a triangle is picked for every point
+   based on its area and how dense the points should be around it, and a
+   random position is then picked inside of it. Everything is done on whole
+   NumPy arrays so that a million points can be made in seconds.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import numpy as np
+       >>> points = np.array([[0, 0, 0], [1, 0, 0], [1, 0, 1], [0, 0, 1.0]])
+       >>> tris = triangulate(np.array([4]), np.array([0, 1, 2, 3]))
+       >>> tris.tolist()
+       [[0, 1, 2], [0, 2, 3]]
+       >>> triangle_areas(points, tris).tolist()
+       [0.5, 0.5]
+       >>> positions, triIds, bary = sample_points(points, tris, 100, seed=1)
+       >>> positions.shape
+       (100, 3)
+       >>> bool((positions >= 0).all() and (positions <= 1).all())
+       True
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainScatter module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainScatter)
+
+'''
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from terrainBands import require_numpy
+
+# The column of each up axis in a point or rotation
+AXES = {'x': 0, 'y': 1, 'z': 2}
+
+
+def random_state(seed=None):
+    '''Returns 'seed' if it is a 'numpy.random.RandomState' already, else a
+    new one seeded with it. Passing one RandomState to every procedure keeps
+    their random values independent of each other.'''
+    require_numpy()
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+
+def triangulate(counts, vertexIds):
+    '''Splits every face of a mesh into a fan of triangles.
+
+    Parameters:
+        counts [array]    : The number of vertices of each face.
+        vertexIds [array] : The vertex ids of every face, one face after the
+                            other, as returned by 'MFnMesh.getVertices'.
+
+    On Exit:
+        Returns a (t, 3) integer array of the vertex ids of each triangle.
+
+    '''
+    require_numpy()
+    counts = np.asarray(counts, dtype=np.int64)
+    vertexIds = np.asarray(vertexIds, dtype=np.int64)
+    faceStart = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nTris = np.maximum(counts - 2, 0)
+    triFace = np.repeat(np.arange(len(counts)), nTris)
+    triStart = np.concatenate(([0], np.cumsum(nTris)[:-1]))
+    corner = np.arange(nTris.sum()) - np.repeat(triStart, nTris) + 1
+    first = faceStart[triFace]
+    return np.column_stack((vertexIds[first], vertexIds[first + corner],
+                            vertexIds[first + corner + 1]))
+
+
+def triangle_areas(points, tris):
+    '''Works out the area of every triangle.
+
+    Parameters:
+        points [array] : A (n, 3) array of point positions.
+        tris [array]   : A (t, 3) array of triangle vertex ids.
+
+    On Exit:
+        Returns a float array of length t of the triangle areas.
+
+    '''
+    require_numpy()
+    points = np.asarray(points, dtype=np.float64)
+    a, b, c = points[tris[:, 0]], points[tris[:, 1]], points[tris[:, 2]]
+    return 0.5 * np.sqrt((np.cross(b - a, c - a) ** 2).sum(axis=1))
+
+
+def sample_points(points, tris, nPoints, density=None, seed=None):
+    '''Picks random points over the surface of the triangles. Larger
+    triangles and triangles with a higher density get more points.
+
+    Parameters:
+        points [array]        : A (n, 3) array of point positions.
+        tris [array]          : A (t, 3) array of triangle vertex ids.
+        nPoints [int]         : The number of points to pick.
+        density [None][array] : If not None, a value for each vertex from
+                                0.0 to 1.0 of how dense the points should be
+                                around it.
+        seed [None][int][RandomState] : The random seed so that the same
+                                        points can be picked again, or the
+                                        RandomState to use (see
+                                        'random_state').
+
+    On Exit:
+        Returns a 3 tuple of the (nPoints, 3) array of positions, the array
+        of the triangle each position is in and the (nPoints, 3) array of the
+        barycentric weights of each position within its triangle, which can
+        be used with 'interpolate' to find other values at the positions.
+
+    '''
+    require_numpy()
+    random = random_state(seed)
+    points = np.asarray(points, dtype=np.float64)
+    weights = triangle_areas(points, tris)
+    if density is not None:
+        weights = weights * np.asarray(density, dtype=np.float64)[tris].mean(
+            axis=1)
+    total = weights.sum()
+    if total <= 0 or nPoints <= 0:
+        return (np.zeros((0, 3)), np.zeros(0, dtype=np.int64),
+                np.zeros((0, 3)))
+    cumulative = np.cumsum(weights)
+    triIds = np.searchsorted(cumulative, random.uniform(0, total, nPoints),
+                             side='right')
+    triIds = np.minimum(triIds, len(tris) - 1)
+
+    root = np.sqrt(random.uniform(size=nPoints))
+    r2 = random.uniform(size=nPoints)
+    bary = np.column_stack((1 - root, root * (1 - r2), root * r2))
+    return interpolate(points, tris, triIds, bary), triIds, bary
+
+
+def interpolate(values, tris, triIds, bary):
+    '''Finds per vertex values at positions picked by 'sample_points'.
+
+    Parameters:
+        values [array] : A (n, ...) array of values for each vertex.
+        tris [array]   : A (t, 3) array of triangle vertex ids.
+        triIds [array] : The triangle of each position.
+        bary [array]   : The (p, 3) barycentric weights of each position.
+
+    On Exit:
+        Returns a (p, ...) array of the values at each of the positions.
+
+    '''
+    require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    corners = values[tris[triIds]]
+    shape = bary.shape + (1,) * (values.ndim - 1)
+    return (corners * bary.reshape(shape)).sum(axis=1)
+
+
+def instance_transforms(nPoints, scaleRange=(0.5, 1.5), amplitudes=None,
+                        seed=None, axis='y'):
+    '''Makes a random scale and rotation for every point, used to stop
+    instanced objects from all looking the same.
+
+    Parameters:
+        nPoints [int]            : The number of points.
+        scaleRange [tuple]       : The lowest and highest uniform scale.
+        amplitudes [None][array] : If not None, a value for each point from
+                                   0.0 to 1.0 (such as the song amplitude)
+                                   that pushes the scale towards the highest
+                                   scale.
+        seed [None][int][RandomState] : The random seed or the RandomState
+                                        to use (see 'random_state').
+        axis [str]               : The up axis (x, y or z) the instances are
+                                   rotated around.
+
+    On Exit:
+        Returns a 2 tuple of (nPoints, 3) arrays of the scales and the
+        rotations in degrees, rotating only around the up axis.
+
+    '''
+    require_numpy()
+    random = random_state(seed)
+    low, high = scaleRange
+    mix = random.uniform(size=nPoints)
+    if amplitudes is not None:
+        mix = 0.5 * (mix + np.clip(amplitudes, 0, 1))
+    scales = np.repeat((low + (high - low) * mix)[:, None], 3, axis=1)
+    rotations = np.zeros((nPoints, 3))
+    rotations[:, AXES[axis.lower()]] = random.uniform(0, 360, nPoints)
+    return scales, rotations
@@ -0,0 +1,261 @@
+r'''Module of procedures for smoothing values over the vertices of a mesh.
+
+   The heights made from a song are placed on each vertex in turn, so
+   neighbouring vertices can get heights from unrelated parts of the song and
+   make harsh spikes. The idea behind this module is to smooth the heights by
+   moving each one towards the average of its neighbours (Laplacian
+   smoothing), which works on any polygonal mesh and not only on grids.
+
+   Which vertices are joined to which is stored as a sparse matrix in
+   compressed sparse row (CSR) form, made once from the face arrays given by
+   'mayaFuncs.mesh_connectivity' and kept in a cache using a hash of the
+   topology, so running the smoothing again on the same mesh skips this step.
+   Each iteration is a single sparse matrix-vector product done with NumPy,
+   which lets the smoothing work on meshes with millions of vertices.
+
+   None of the functions in this module need Maya, so they can be tested from
+   any Python interpreter with NumPy installed.
+
+       >>> import numpy as np
+       >>> counts = np.array([4, 4])
+       >>> vertexIds = np.array([0, 1, 4, 3, 1, 2, 5, 4])
+       >>> adj = cached_adjacency(counts, vertexIds)
+       >>> adj.neighbours(1).tolist()
+       [0, 2, 4]
+       >>> adj is cached_adjacency(counts, vertexIds)
+       True
+       >>> heights = np.array([0.0, 6.0, 0.0, 0.0, 0.0, 0.0])
+       >>> smooth = laplacian_smooth(heights, adj, iterations=1, strength=1)
+       >>> smooth.tolist()
+       [3.0, 0.0, 3.0, 0.0, 2.0, 0.0]
+
+    To test/execute the examples in the module documentation, once you have
+    imported the terrainSmooth module:
+    import doctest
+    nfail, ntests = doctest.testmod(terrainSmooth)
+
+'''
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from terrainBands import require_numpy
+import terrainScatter as ts
+
+# The number of mesh topologies kept in the adjacency cache
+CACHE_SIZE = 8
+
+ADJACENCY_CACHE = {}
+CACHE_ORDER = []
+
+
+class VertexAdjacency:
+    '''The vertex adjacency of a mesh stored as a sparse CSR matrix.
+
+    Parameters:
+        counts [array]    : The number of vertices of each face.
+        vertexIds [array] : The vertex ids of every face, one face after the
+                            other, as returned by 'MFnMesh.getVertices'.
+        nVtx [None][int]  : The number of vertices of the mesh. If None, it
+                            is found from the highest vertex id.
+
+    Attributes:
+        nVtx [int]       : The number of vertices.
+        indptr [array]   : The CSR row pointers, with the neighbours of vertex
+                           i being 'indices[indptr[i]:indptr[i+1]]'.
+        indices [array]  : The CSR column indices, sorted within each row.
+        rows [array]     : The row of every stored entry, kept so that the
+                           matrix-vector product can use 'np.bincount'.
+        edgeKeys [array] : The sorted 'row * nVtx + column' key of every entry,
+                           used to look up the entry of an edge.
+
+    '''
+    def __init__(self, counts, vertexIds, nVtx=None):
+        require_numpy()
+        counts = np.asarray(counts, dtype=np.int64)
+        vertexIds = np.asarray(vertexIds, dtype=np.int64)
+        if nVtx is None:
+            nVtx = int(vertexIds.max()) + 1 if len(vertexIds) else 0
+        self.nVtx = nVtx
+
+        # Each face vertex is joined to the next one around its face
+        faceStart = np.repeat(np.cumsum(counts) - counts, counts)
+        faceEnd = np.repeat(np.cumsum(counts), counts)
+        following = np.arange(len(vertexIds)) + 1
+        following[following == faceEnd] = faceStart[following == faceEnd]
+        first = vertexIds
+        second = vertexIds[following]
+
+        keys = np.unique(np.concatenate((first * nVtx + second,
+                                         second * nVtx + first)))
+        keys = keys[keys // nVtx != keys % nVtx]
+        self.edgeKeys = keys
+        self.rows = keys // nVtx
+        self.indices = keys % nVtx
+        self.indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(self.rows, minlength=nVtx))))
+
+    def neighbours(self, vtx):
+        '''Finds the vertices joined to a vertex by an edge.
+
+        Parameters:
+            vtx [int] : The vertex id.
+
+        On Exit:
+            Returns a sorted array of the neighbouring vertex ids.
+
+        '''
+        return self.indices[self.indptr[vtx]:self.indptr[vtx + 1]]
+
+    def edge_entries(self, first, second):
+        '''Finds where the edges between two arrays of vertices are stored.
+
+        Parameters:
+            first [array]  : The vertex ids at the start of each edge.
+            second [array] : The vertex ids at the end of each edge.
+
+        On Exit:
+            Returns a 2 tuple of the entry index of each edge and a boolean
+            array of which of the edges are in the adjacency.
+
+        '''
+        keys = first * self.nVtx + second
+        entries = np.minimum(np.searchsorted(self.edgeKeys, keys),
+                             len(self.edgeKeys) - 1)
+        return entries, self.edgeKeys[entries] == keys
+
+    def matvec(self, values, weights=None):
+        '''Multiplies the adjacency matrix by a vector of values, adding up
+        the values of the neighbours of every vertex.
+
+        Parameters:
+            values [array]        : A value for each vertex.
+            weights [None][array] : If not None, a weight for every stored
+                                    entry. Else, every entry is 1.
+
+        On Exit:
+            Returns a float array of the (weighted) sum of the neighbouring
+            values of each vertex.
+
+        '''
+        gathered = np.asarray(values, dtype=np.float64)[self.indices]
+        if weights is not None:
+            gathered = gathered * weights
+        return np.bincount(self.rows, gathered, minlength=self.nVtx)
+
+
+def topology_key(counts, vertexIds):
+    '''Makes a hash of the faces of a mesh, which only changes when the
+    topology of the mesh changes.
+
+    Parameters:
+        counts [array]    : The number of vertices of each face.
+        vertexIds [array] : The vertex ids of every face.
+
+    On Exit:
+        Returns the hash as a hex string.
+
+    '''
+    require_numpy()
+    digest = hashlib.md5()
+    digest.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(vertexIds, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def cached_adjacency(counts, vertexIds, nVtx=None):
+    '''Finds the adjacency of a mesh, only making it if the same topology is
+    not already in the cache. The oldest topology is removed when there are
+    more than 'CACHE_SIZE'.
+
+    Parameters:
+        counts [array]    : The number of vertices of each face.
+        vertexIds [array] : The vertex ids of every face.
+        nVtx [None][int]  : The number of vertices of the mesh.
+
+    On Exit:
+        Returns the 'VertexAdjacency' of the mesh.
+
+    '''
+    key = (topology_key(counts, vertexIds), nVtx)
+    if key in ADJACENCY_CACHE:
+        CACHE_ORDER.remove(key)
+    else:
+        ADJACENCY_CACHE[key] = VertexAdjacency(counts, vertexIds, nVtx)
+        if len(CACHE_ORDER) >= CACHE_SIZE:
+            del ADJACENCY_CACHE[CACHE_ORDER.pop(0)]
+    CACHE_ORDER.append(key)
+    return ADJACENCY_CACHE[key]
+
+
+def cotangent_weights(adjacency, points, counts, vertexIds):
+    '''Works out cotangent weights for each edge of the adjacency, which
+    smooth evenly over the surface even when the faces of the mesh are of
+    different sizes. Each edge gets half of the cotangent of the angles
+    facing it in the triangles on either side. Negative weights from obtuse
+    triangles are set to 0.
+
+    Parameters:
+        adjacency [object] : The 'VertexAdjacency' of the mesh.
+        points [array]     : A (n, 3) array of the vertex positions.
+        counts [array]     : The number of vertices of each face.
+        vertexIds [array]  : The vertex ids of every face.
+
+    On Exit:
+        Returns a float array of a weight for every stored entry of the
+        adjacency.
+
+    '''
+    require_numpy()
+    points = np.asarray(points, dtype=np.float64)
+    tris = ts.triangulate(counts, vertexIds)
+    weights = np.zeros(len(adjacency.edgeKeys))
+    for corner in range(3):
+        a = tris[:, corner]
+        b = tris[:, (corner + 1) % 3]
+        c = tris[:, (corner + 2) % 3]
+        ab = points[b] - points[a]
+        ac = points[c] - points[a]
+        area = np.sqrt((np.cross(ab, ac) ** 2).sum(axis=1))
+        cot = np.zeros(len(tris))
+        np.divide((ab * ac).sum(axis=1), area, out=cot, where=area > 0)
+        for first, second in ((b, c), (c, b)):
+            entries, found = adjacency.edge_entries(first, second)
+            weights += np.bincount(entries[found], 0.5 * cot[found],
+                                   minlength=len(weights))
+    return np.maximum(weights, 0)
+
+
+def laplacian_smooth(values, adjacency, iterations=1, strength=0.5,
+                     weights=None):
+    '''Moves each value towards the (weighted) average of its neighbours.
+
+    Parameters:
+        values [array]        : A value for each vertex, or a (n, c) array of
+                                values.
+        adjacency [object]    : The 'VertexAdjacency' of the mesh.
+        iterations [int]      : The number of times the smoothing is run.
+        strength [float]      : How far each value is moved towards the
+                                average each iteration, from 0.0 to 1.0.
+        weights [None][array] : If not None, a weight for every entry of the
+                                adjacency such as from 'cotangent_weights'.
+
+    On Exit:
+        Returns a new float array of the smoothed values. Vertices without
+        any neighbours are left as they are.
+
+    '''
+    require_numpy()
+    values = np.array(values, dtype=np.float64)
+    columns = values.reshape(len(values), -1)
+    totals = adjacency.matvec(np.ones(adjacency.nVtx), weights)
+    joined = totals > 0
+    for _ in range(iterations):
+        for c in range(columns.shape[1]):
+            column = columns[:, c]
+            average = adjacency.matvec(column, weights)[joined] / totals[joined]
+            column[joined] += strength * (average - column[joined])
+    return values
@@ -42,13 +42,370 @@ import struct
 import datetime
 import math
 import itertools
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import mtgProgress as mp
+import mtgTrace as tr
+import mtgMemory as mm
+
+# The number of song frames summed into each bin of a 'SongSummary'
+BIN_FRAMES = 256
+# Edge frames this close together are read in one go by 'SongSummary.
+# totals', as reading the frames between is quicker than another read
+EDGE_GAP_FRAMES = 2048
+
+# The frames per second of Maya's named time units (see 'mayaFuncs.TIME_VALS')
+TIME_UNIT_FPS = {'game': 15, 'film': 24, 'pal': 25, 'ntsc': 30, 'show': 48, 
+                 'palf': 50, 'ntscf': 60}
+
+
+def unit_fps(unit):
+    '''Finds the frames per second of a Maya time unit.
+    
+    Parameters:
+        unit [str][float] : Either a named time unit such as 'film', a frame 
+                            rate unit such as '23.976fps' or a number of 
+                            frames per second.
+    
+    On Exit:
+        Returns the frames per second as a float.
+        
+    '''
+    if isinstance(unit, (int, float)):
+        return float(unit)
+    if unit in TIME_UNIT_FPS:
+        return float(TIME_UNIT_FPS[unit])
+    if unit.endswith('fps'):
+        return float(unit[:-3])
+    raise ValueError('%s is not a time unit with a frame rate' % unit)
+
+
+def length_time(seconds):
+    '''Returns a length in seconds in the form "h:mm:ss.msmsms".'''
+    return str(datetime.timedelta(seconds=seconds))
+
+
+def frame_range(nframes, framerate, start=None, end=None, frames=False):
+    '''Works out the song frames between a start and end time, so that only 
+    that part of a song has to be read.
+    
+    Parameters:
+        nframes [int]           : The number of frames in the song.
+        framerate [float]       : The number of song frames per second.
+        start [None][float]     : The time the range starts at. If None, the 
+                                  start of the song.
+        end [None][float]       : The time the range ends at. If None, the 
+                                  end of the song.
+        frames [bool]           : If True, 'start' and 'end' are song frames 
+                                  instead of seconds.
+    
+    On Exit:
+        Returns a 2 tuple of the first song frame and the number of song 
+        frames in the range, clipped to the song.
+        
+    '''
+    rate = 1 if frames else framerate
+    first = 0 if start is None else int(round(start * rate))
+    last = nframes if end is None else int(round(end * rate))
+    first = min(max(first, 0), nframes)
+    last = min(max(last, first), nframes)
+    return first, last - first
+
+
+def decode_samples(data, sampwidth, nchannels):
+    '''Turns the raw frame bytes of a wave file into amplitude values. 8 bit 
+    samples are unsigned in wave files and are moved to be centred on 0.
+    
+    Parameters:
+        data [str]      : The frame bytes as returned by 'readframes'.
+        sampwidth [int] : The number of bytes of each sample (1 to 4).
+        nchannels [int] : The number of channels of each frame.
+    
+    On Exit:
+        Returns a (nframes, nchannels) int32 array of the amplitude values.
+        
+    '''
+    frameSize = sampwidth * nchannels
+    raw = np.frombuffer(data[:len(data) - len(data) % frameSize], 
+                        dtype=np.uint8)
+    if sampwidth == 1:
+        samples = raw.astype(np.int32) - 128
+    elif sampwidth == 2:
+        samples = raw.view('<i2').astype(np.int32)
+    elif sampwidth == 3:
+        triples = raw.reshape(-1, 3).astype(np.int32)
+        samples = triples[:, 0] | (triples[:, 1] << 8) | (triples[:, 2] << 16)
+        samples = (samples ^ 0x800000) - 0x800000
+    elif sampwidth == 4:
+        samples = raw.view('<i4')
+    else:
+        raise ValueError('%d byte samples are not supported' % sampwidth)
+    return samples.reshape(-1, nchannels)
+
+
+def frame_windows(nframes, framerate, fps, frames, offset=0):
+    '''Works out exactly which song frames play during each animation frame.
+    
+    Parameters:
+        nframes [int]     : The number of frames in the song.
+        framerate [float] : The number of song frames per second.
+        fps [float]       : The number of animation frames per second.
+        frames [array]    : The animation frames.
+        offset [float]    : The animation frame the song starts on, the same 
+                            as the 'offset' of a Maya sound node.
+    
+    On Exit:
+        Returns a 2 tuple of integer arrays of the first and one past the 
+        last song frame of each animation frame, clipped to the song.
+        
+    '''
+    times = (np.asarray(frames, dtype=np.float64) - offset) / fps
+    starts = np.round(times * framerate).astype(np.int64)
+    ends = np.round((times + 1.0 / fps) * framerate).astype(np.int64)
+    return np.clip(starts, 0, nframes), np.clip(ends, 0, nframes)
+
+
+def band_edges(bands, nBins):
+    '''Splits the bins of a spectrum into bands that are evenly spaced in 
+    pitch, leaving out the 0 Hz bin.
+    
+    Parameters:
+        bands [int] : The number of bands.
+        nBins [int] : The number of bins of the spectrum.
+    
+    On Exit:
+        Returns an integer array of length 'bands' + 1 of the first bin of 
+        each band followed by the end of the last band.
+        
+    '''
+    edges = np.unique(np.round(np.logspace(0, np.log10(nBins), bands + 1)))
+    edges = edges.astype(np.int64)
+    if len(edges) < bands + 1:
+        edges = np.linspace(1, nBins, bands + 1).astype(np.int64)
+    return edges
+
+
+class SongSummary(threading.Thread):
+    '''Decodes a wave file on a background thread, summing the amplitude 
+    values of each bin of at least 'BIN_FRAMES' frames so that the height 
+    values for 
+    any number of vertices can be made from the sums straight away 
+    afterwards. Only the running totals at the bin edges are kept, so a two 
+    hour song takes about 20 MB instead of the gigabytes of one sum for 
+    each frame. The frames between a bin edge and the edge of a vertex are 
+    read again when the heights are made. Nothing in here needs Maya, so it 
+    can run while the user is setting the options.
+    
+    Parameters:
+        path [str]            : The song path, opened again by the thread so 
+                                that it does not move the read position of 
+                                another reader of the song.
+        callback [None][func] : If not None, called from the thread with the 
+                                number of frames read and the number of 
+                                frames of the song after each block, and 
+                                once more when the thread finishes.
+        blockFrames [int]     : The most frames read at a time, rounded 
+                                down to whole bins. Fewer are read if the 
+                                block would not fit in the memory budget 
+                                (see 'mtgMemory').
+        start [None][float]   : The time the summary starts at, so that only
+                                part of the song is read (see 
+                                'frame_range').
+        end [None][float]     : The time the summary ends at.
+        frames [bool]         : If True, 'start' and 'end' are song frames 
+                                instead of seconds.
+    
+    Attributes:
+        first [int]     : The first song frame summed.
+        nframes [int]   : The number of frames summed.
+        framerate [int] : The number of song frames per second.
+        nchannels [int] : The number of channels in the song.
+        binFrames [int] : The number of frames in each bin, more than 
+                          'BIN_FRAMES' if the sums of a very long song 
+                          would not fit in their share of the memory budget 
+                          ('mtgMemory.SUMMARY_SHARE').
+        sums [array]    : The sum of the amplitudes of the frames before 
+                          each bin edge, from 'first'.
+        absSums [array] : The sum of the absolute amplitudes of the frames 
+                          before each bin edge.
+        done [int]      : The number of frames read so far.
+        error [None][Exception] : The error that stopped the thread, if any.
+        
+    '''
+    def __init__(self, path, callback=None, blockFrames=65536, start=None, 
+                 end=None, frames=False):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = path
+        self.callback = callback
+        song = wave.open(path, 'rb')
+        self.framerate = song.getframerate()
+        self.first, self.nframes = frame_range(song.getnframes(), 
+                                               self.framerate, start, end, 
+                                               frames)
+        self.nchannels = song.getnchannels()
+        self.sampwidth = song.getsampwidth()
+        song.close()
+        nbins = mm.chunk_size(2 * 8, -(-self.nframes // BIN_FRAMES), 
+                              mm.SUMMARY_SHARE)
+        self.binFrames = max(-(-self.nframes // nbins), BIN_FRAMES)
+        blockFrames = mm.chunk_size(self.nchannels*mm.ARRAY_SAMPLE_BYTES, 
+                                    blockFrames)
+        self.blockFrames = max(blockFrames // self.binFrames, 1) * \
+            self.binFrames
+        nbins = -(-self.nframes // self.binFrames)
+        self.sums = np.zeros(nbins + 1, dtype=np.int64)
+        self.absSums = np.zeros(nbins + 1, dtype=np.int64)
+        self.done = 0
+        self.error = None
+        self.cancelled = False
+        self.finished = threading.Event()
+        
+    def run(self):
+        try:
+            song = wave.open(self.path, 'rb')
+            try:
+                song.setpos(self.first)
+                with tr.span('Decoding Song', nframes=self.nframes):
+                    self.read_blocks(song)
+            finally:
+                song.close()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+            if self.callback is not None:
+                self.callback(self.done, self.nframes)
+            
+    def read_blocks(self, song):
+        '''Reads and sums the frames of 'song' one block at a time.'''
+        while self.done < self.nframes and not self.cancelled:
+            data = song.readframes(min(self.blockFrames, 
+                                       self.nframes - self.done))
+            tr.count('bytes read', len(data))
+            samples = decode_samples(data, self.sampwidth, self.nchannels)
+            if len(samples) == 0:
+                raise EOFError('%s ended after %d frames' % 
+                               (self.path, self.done))
+            edges = np.arange(0, len(samples), self.binFrames)
+            first = self.done // self.binFrames
+            last = first + len(edges)
+            for totals, values in ((self.sums, samples.sum(axis=1)), 
+                                   (self.absSums, 
+                                    np.abs(samples).sum(axis=1))):
+                np.cumsum(np.add.reduceat(values.astype(np.int64), edges), 
+                          out=totals[first + 1:last + 1])
+                totals[first + 1:last + 1] += totals[first]
+            self.done += len(samples)
+            if self.callback is not None:
+                self.callback(self.done, self.nframes)
+            
+    def cancel(self):
+        '''Stops the thread after the block it is reading.'''
+        self.cancelled = True
+        
+    def wait(self, timeout=None):
+        '''Waits for the thread to finish for up to 'timeout' seconds and 
+        returns True if it has finished.'''
+        self.finished.wait(timeout)
+        return self.finished.is_set()
+    
+    def ready(self):
+        '''Returns True if the whole range has been summed.'''
+        return (self.finished.is_set() and self.error is None and 
+                not self.cancelled and self.done == self.nframes)
+    
+    def covers(self, first, nframes):
+        '''Returns True if the 'nframes' song frames from 'first' have been 
+        summed already.'''
+        return self.first <= first and first + nframes <= self.first + self.done
+        
+    def totals(self, positions, negative=False):
+        '''Finds the sum of the amplitudes from 'first' up to each of 
+        'positions', from the sums at the bin edges and the frames read 
+        again from the bin edge to each position. Frames next to each other 
+        are read in one go (see 'EDGE_GAP_FRAMES'), so the song is read at 
+        most once more.
+        
+        Parameters:
+            positions [array] : The sorted frame positions from 'first', all 
+                                within the frames read so far.
+            negative [bool]   : If True, the sums of the amplitudes. Else, 
+                                of the absolute amplitudes.
+        
+        On Exit:
+            Returns an int64 array of the sum up to each position.
+            
+        '''
+        positions = np.asarray(positions, dtype=np.int64)
+        bins = positions // self.binFrames
+        totals = (self.sums if negative else self.absSums)[bins]
+        need = np.flatnonzero(positions % self.binFrames)
+        if len(need) == 0:
+            return totals
+        # the bins to read, split into runs of bins close to each other of at 
+        # most a block of frames
+        needBins = bins[need]
+        breaks = np.flatnonzero(
+            (np.diff(needBins) * self.binFrames > EDGE_GAP_FRAMES) | 
+            (np.diff(needBins * self.binFrames // self.blockFrames) != 0)) + 1
+        song = wave.open(self.path, 'rb')
+        try:
+            for run in np.split(need, breaks):
+                firstFrame = bins[run[0]] * self.binFrames
+                song.setpos(self.first + firstFrame)
+                data = song.readframes(positions[run[-1]] - firstFrame)
+                tr.count('bytes read', len(data))
+                samples = decode_samples(data, self.sampwidth, 
+                                         self.nchannels)
+                if not(negative):
+                    samples = np.abs(samples)
+                running = np.zeros(len(samples) + 1, dtype=np.int64)
+                np.cumsum(samples.sum(axis=1), out=running[1:])
+                totals[run] += (running[positions[run] - firstFrame] - 
+                                running[bins[run] * self.binFrames - 
+                                        firstFrame])
+        finally:
+            song.close()
+        return totals
+        
+    def heightvals(self, nvtx, vheight, negative=False, start=None, 
+                   end=None, frames=False):
+        '''Creates the same height values as 'TerrainWaveFile.
+        createheightvals' from the sums (see it for the parameters). A 
+        'start' and 'end' range must be within the summed range.'''
+        if start is None and end is None:
+            first, nframes = self.first, self.nframes
+        else:
+            first, nframes = frame_range(self.first + self.nframes, 
+                                         self.framerate, start, end, frames)
+            if first < self.first:
+                raise ValueError('the range starts before the summary')
+        vtxsample = int(nframes // nvtx)
+        if vtxsample == 0:
+            raise ZeroDivisionError('the song has fewer frames than vertices')
+        positions = first - self.first + np.arange(nvtx + 1) * vtxsample
+        amps = np.diff(self.totals(positions, negative)) // (vtxsample * 
+                                                             self.nchannels)
+        hRatio = float(vheight) / amps.max()
+        return tuple((amps * hRatio).tolist())
+
 
 class TerrainWaveFile(wave.Wave_read):
     '''Allows for the opening of a wave file with more built in variables and
     can create height values for creating terrain.
     
     Parameters:
-        path [string] : This is the song path which will be read by the class
+        path [string]    : This is the song path which will be read by the 
+                           class
+        q [None][object] : Where the progress of 'createheightvals' is 
+                           reported to, either a 'Queue' or a 
+                           'mtgProgress.ProgressReporter'.
     
     Attributes:
         _samplesize [int]      : The sample size for the song. Usually 16 for
@@ -59,39 +416,110 @@ class TerrainWaveFile(wave.Wave_read):
                                  from the song file
         _maxamplitude [int]    : The maximum amplitude from the signed bits
                                  read from the song
+        heightvals [None][tuple] : The height values made by the last run of 
+                                   'heightvalsteps'
+        summary [None][object]   : The 'SongSummary' started by 
+                                   'startsummary'
                                  
     '''
     def __init__(self, path, q=None):
         wave.Wave_read.__init__(self, path)
+        self.path = path
         self._samplesize = self._sampwidth * 8
         self._songlength = float(self._nframes) / self._framerate 
         self._unpackstructval = 'h' * ((self._nchannels*self._sampwidth) / 2)
         self._maxamplidtude = 2 ** self._samplesize/2
         self.stop = False
         self.queue = q
+        self.progress = mp.reporter(q)
         self.vtxsample = 0
+        self.heightvals = None
+        self.summary = None
+
+    def startsummary(self, callback=None):
+        '''Starts summing the song on a background thread, so that 
+        'heightvalsteps' does not need to read the song itself when the 
+        summary is finished (see 'SongSummary').
+        
+        Parameters:
+            callback [None][func] : Called from the thread with the number 
+                                    of frames read and the number of frames 
+                                    of the song as it is read.
+        
+        On Exit:
+            Returns the started 'SongSummary', which is also stored in 
+            'summary'.
+            
+        '''
+        if self.summary is not None:
+            self.summary.cancel()
+        self.summary = SongSummary(self.path, callback)
+        self.summary.start()
+        return self.summary
+    
+    def close(self):
+        summary = getattr(self, 'summary', None)
+        if summary is not None:
+            summary.cancel()
+        wave.Wave_read.close(self)
 
     def parsedata(self, i):
-        if self.queue:
-            self.queue.put(i)
+        self.progress.advance()
         return struct.unpack(self._unpackstructval*self.vtxsample, self.readframes(self.vtxsample))
 
     def convertAbsolute(self, amps, i):
-        if self.queue:
-            self.queue.put(i)
+        self.progress.advance()
         return [~x+1 if x < 0 else x for x in amps]
 
     def averageAmps(self, amps, i):
-        if self.queue:
-            self.queue.put(i)
+        self.progress.advance()
         return sum(amps)/len(amps)
 
     def relativeScale(self, amps, hRatio, i):
-        if self.queue:
-            self.queue.put(i)
+        self.progress.advance()
         return amps * hRatio
 
-    def createheightvals(self, nvtx, vheight, negative=False):
+    def averageamp(self, negative=False, piece=None):
+        '''Reads the next 'vtxsample' frames and returns the average of their 
+        amplitudes, the same as 'parsedata', 'convertAbsolute' and 
+        'averageAmps' together. At most 'piece' frames are unpacked at a 
+        time, so that the amplitudes of one vertex of a long song do not 
+        have to fit in memory at once.'''
+        if piece is None:
+            piece = self.vtxsample
+        total = 0
+        for done in xrange(0, self.vtxsample, piece):
+            n = min(piece, self.vtxsample - done)
+            amps = struct.unpack(self._unpackstructval*n, self.readframes(n))
+            if not(negative):
+                amps = [~x+1 if x < 0 else x for x in amps]
+            total += sum(amps)
+        return total/(self.vtxsample*len(self._unpackstructval))
+
+    def songrange(self, start=None, end=None, frames=False):
+        '''Returns a 2 tuple of the first song frame and the number of song 
+        frames between 'start' and 'end' (see 'frame_range').'''
+        return frame_range(self._nframes, self._framerate, start, end, frames)
+
+    def summaryheightvals(self, nvtx, vheight, negative=False, start=None, 
+                          end=None, frames=False):
+        '''Creates the same height values as 'createheightvals' with NumPy 
+        (see it for the parameters). The summary started by 'startsummary' 
+        is used if it has summed the range already. Else, only the range is 
+        summed, in this thread.'''
+        first, nframes = self.songrange(start, end, frames)
+        summary = self.summary
+        if summary is None or not(summary.covers(first, nframes)):
+            summary = SongSummary(self.path, start=first, 
+                                  end=first + nframes, frames=True)
+            summary.run()
+            if summary.error is not None:
+                raise summary.error
+        return summary.heightvals(nvtx, vheight, negative, first, 
+                                  first + nframes, True)
+
+    def createheightvals(self, nvtx, vheight, negative=False, start=None, 
+                         end=None, frames=False):
         '''Samples the music and creates a list of height values. The song is
         sampled for all of the frames divided by the 'nvtx'. Then, all of 
         those values are averaged to get a final value for each vertex.
@@ -106,37 +534,250 @@ class TerrainWaveFile(wave.Wave_read):
             negative [bool] : If True, the values returned will include 
                               positive and negative values. If False, the 
                               values returned will be all positive.
+            start [None][float] : The time in the song the values start at. 
+                                  If None, the start of the song.
+            end [None][float]   : The time in the song the values end at. If 
+                                  None, the end of the song.
+            frames [bool]   : If True, 'start' and 'end' are song frames 
+                              instead of seconds.
                               
         On Exit:
             Returns a list of float values with length 'nvtx', with maximum 
-            or minimum value of 'vheight'.
+            or minimum value of 'vheight'. Only the frames between 'start' 
+            and 'end' are read. If their amplitudes do not fit in the memory 
+            budget (see 'mtgMemory'), they are read a chunk of vertices at a 
+            time by 'chunkedheightvals'.
         
         '''
-        self.rewind()  # Starts the song reading from the beginning
+        first, nframes = self.songrange(start, end, frames)
+        self.setpos(first)  # Starts the song reading from the range start
         
-        self.vtxsample = math.trunc(float(self._nframes)/nvtx)
+        self.vtxsample = math.trunc(float(nframes)/nvtx)
         # vtxsample stores the number of amplitude frames to average for each
         # vertex rounded up
-        if self.queue:
-            self.queue.put(('Reading WAV Data', nvtx))
-        allAmps = [self.parsedata(i) for i in xrange(nvtx)]
+        chunk = mm.chunk_size(self.vtxsample*self._nchannels*mm.SAMPLE_BYTES, 
+                              nvtx)
+        if chunk < nvtx:
+            return self.chunkedheightvals(nvtx, vheight, negative, chunk, 
+                                          first, first + nframes, True)
+        self.progress.start('Reading WAV Data', nvtx)
+        with tr.span('Reading WAV Data', nvtx=nvtx):
+            allAmps = [self.parsedata(i) for i in xrange(nvtx)]
+            tr.count('bytes read', nvtx*self.vtxsample*self._framesize)
         #allAmps stores all the amplitude values in tuples for each vertex
 
         if not(negative): #Turns all the values positive if negative=False
-            if self.queue:
-                self.queue.put(('Converting all Values to Positive', len(allAmps)))
-            allAmps = [self.convertAbsolute(allAmps[i], i) for i in xrange(len(allAmps))]
-
-        if self.queue:
-            self.queue.put(('Averaging Amplitude values', len(allAmps)))
-        allAmps = [self.averageAmps(allAmps[i], i) for i in xrange(len(allAmps))] #finds the average of
-                                                        #each tuple value
+            self.progress.start('Converting all Values to Positive', len(allAmps))
+            with tr.span('Converting all Values to Positive', nvtx=nvtx):
+                allAmps = [self.convertAbsolute(allAmps[i], i) for i in xrange(len(allAmps))]
+
+        self.progress.start('Averaging Amplitude values', len(allAmps))
+        with tr.span('Averaging Amplitude values', nvtx=nvtx):
+            allAmps = [self.averageAmps(allAmps[i], i) for i in xrange(len(allAmps))] #finds the average of
+                                                            #each tuple value
         hRatio = float(vheight) / max(allAmps) 
         #hRatio is the value to multiply each averaged allAmp value to reflect
         #a maximum of vheight
-        if self.queue:
-            self.queue.put(('Scaling to Magnitude Value', len(allAmps)))
-        return tuple(self.relativeScale(allAmps[i], hRatio, i) for i in xrange(len(allAmps)))
+        self.progress.start('Scaling to Magnitude Value', len(allAmps))
+        with tr.span('Scaling to Magnitude Value', nvtx=nvtx):
+            return tuple(self.relativeScale(allAmps[i], hRatio, i) for i in xrange(len(allAmps)))
+
+    def chunkedheightvals(self, nvtx, vheight, negative=False, chunk=1000, 
+                          start=None, end=None, frames=False):
+        '''Creates the same height values as 'createheightvals', but reads, 
+        converts and averages the amplitudes of one vertex at a time, in 
+        pieces that fit in the memory budget (see 'averageamp'), so that only 
+        the averages are held in memory.
+        
+        Parameters:
+            nvtx [int]      : The number of height values to be created.
+            vheight [float] : The highest and/or lowest height value.
+            negative [bool] : If True, the values include positive and 
+                              negative values.
+            chunk [int]     : The number of vertices read for each trace 
+                              span.
+            start [None][float] : The time in the song the values start at.
+            end [None][float]   : The time in the song the values end at.
+            frames [bool]   : If True, 'start' and 'end' are song frames.
+        
+        On Exit:
+            Returns a tuple of float values with length 'nvtx', with maximum 
+            or minimum value of 'vheight'.
+        
+        '''
+        first, nframes = self.songrange(start, end, frames)
+        self.setpos(first)
+        self.vtxsample = math.trunc(float(nframes)/nvtx)
+        piece = mm.chunk_size(len(self._unpackstructval)*mm.SAMPLE_BYTES, 
+                              self.vtxsample)
+        self.progress.start('Reading WAV Data', nvtx)
+        allAmps = []
+        for first in xrange(0, nvtx, chunk):
+            last = min(first + chunk, nvtx)
+            with tr.span('Reading WAV Data', first=first, nvtx=last-first):
+                for i in xrange(first, last):
+                    self.progress.advance()
+                    allAmps.append(self.averageamp(negative, piece))
+                tr.count('bytes read', 
+                         (last-first)*self.vtxsample*self._framesize)
+        hRatio = float(vheight) / max(allAmps)
+        self.progress.start('Scaling to Magnitude Value', nvtx)
+        with tr.span('Scaling to Magnitude Value', nvtx=nvtx):
+            return tuple(self.relativeScale(allAmps[i], hRatio, i) 
+                         for i in xrange(nvtx))
+
+    def heightvalsteps(self, nvtx, vheight, negative=False, chunk=1000, 
+                       start=None, end=None, frames=False):
+        '''Creates the same height values as 'createheightvals' a chunk of 
+        vertices at a time, so that the reading can be spread over Maya's 
+        idle events and stopped part way through.
+        
+        Parameters:
+            nvtx [int]      : The number of height values to be created.
+            vheight [float] : The highest and/or lowest height value.
+            negative [bool] : If True, the values include positive and 
+                              negative values.
+            chunk [int]     : The number of vertices read for each step. The 
+                              frames of each vertex are read in pieces that 
+                              fit in the memory budget (see 'averageamp').
+            start [None][float] : The time in the song the values start at.
+            end [None][float]   : The time in the song the values end at.
+            frames [bool]   : If True, 'start' and 'end' are song frames.
+                              
+        On Exit:
+            A generator yielding a 3 tuple of the message, the number of 
+            vertices read and 'nvtx' after each chunk. Once it has finished, 
+            the height values are stored in 'heightvals'. If a summary was 
+            started and has reached the start of the range, it waits only 
+            until the summary has read to the end of the range and makes the 
+            values from it instead. Else, only the range is read from the 
+            song, rather than waiting for the summary to read up to it.
+        
+        '''
+        first, nframes = self.songrange(start, end, frames)
+        summary = self.summary
+        if (summary is not None and not summary.cancelled and 
+                summary.first <= first <= summary.first + summary.done and 
+                first + nframes <= summary.first + summary.nframes):
+            offset = first - summary.first
+            while (not(summary.covers(first, nframes)) and 
+                   not(summary.wait(0.05))):
+                yield ('Analysing Song', summary.done - offset, nframes)
+            if summary.covers(first, nframes):
+                with tr.span('Summary Height Values', nvtx=nvtx):
+                    self.heightvals = summary.heightvals(
+                        nvtx, vheight, negative, first, first + nframes, 
+                        True)
+                yield ('Reading WAV Data', nvtx, nvtx)
+                return
+        self.setpos(first)
+        self.vtxsample = math.trunc(float(nframes)/nvtx)
+        piece = mm.chunk_size(len(self._unpackstructval)*mm.SAMPLE_BYTES, 
+                              self.vtxsample)
+        allAmps = []
+        for first in xrange(0, nvtx, chunk):
+            last = min(first + chunk, nvtx)
+            with tr.span('Reading WAV Data', first=first, nvtx=last-first):
+                for i in xrange(first, last):
+                    allAmps.append(self.averageamp(negative, piece))
+                tr.count('bytes read', 
+                         (last-first)*self.vtxsample*self._framesize)
+            yield ('Reading WAV Data', last, nvtx)
+        hRatio = float(vheight) / max(allAmps)
+        self.heightvals = tuple(amp * hRatio for amp in allAmps)
+                      
+    def getsamples(self, start=0, nframes=None):
+        '''Reads the amplitude values of the song into a NumPy array in one 
+        go, only reading the bytes of the frames asked for.
+        
+        Parameters:
+            start [int]         : The first song frame to read.
+            nframes [None][int] : The number of frames to read. If None, the 
+                                  song is read to the end.
+        
+        On Exit:
+            Returns a (nframes, nchannels) int32 array of the amplitude 
+            values for each frame and channel of the song.
+        
+        '''
+        start = min(max(int(start), 0), self._nframes)
+        if nframes is None:
+            nframes = self._nframes - start
+        nframes = min(max(int(nframes), 0), self._nframes - start)
+        self.setpos(start)
+        return decode_samples(self.readframes(nframes), self._sampwidth, 
+                              self._nchannels)
+    
+    def frameanalysis(self, unit='film', startFrame=0, endFrame=None, 
+                      offset=0, bands=1, negative=False):
+        '''Analyses the song for each frame of an animation, so that values 
+        made from the song line up with the timeline and the sound node that 
+        plays it. Every animation frame uses exactly the song frames that 
+        play during it, and only the bytes of the song within the frame 
+        range are read.
+        
+        Parameters:
+            unit [str][float]     : The Maya time unit (see 
+                                    'mayaFuncs.TIME_VALS') or the frames per 
+                                    second of the animation.
+            startFrame [int]      : The first animation frame.
+            endFrame [None][int]  : The last animation frame. If None, the 
+                                    frame the song ends on is used.
+            offset [float]        : The animation frame the song starts on, 
+                                    the same as the sound node's 'offset'.
+            bands [int]           : If 1, the average amplitude of each frame 
+                                    is found. Else, the spectrum of each 
+                                    frame is split into this many bands 
+                                    spaced evenly in pitch, from low to high.
+            negative [bool]       : If True and 'bands' is 1, the signed 
+                                    amplitudes are averaged. Else, the 
+                                    absolute amplitudes are.
+        
+        On Exit:
+            Returns a 2 tuple of the array of animation frames and an array 
+            of the values of each frame, of shape (nFrames,) for one band or 
+            (nFrames, bands). Frames outside of the song are 0.
+        
+        '''
+        fps = unit_fps(unit)
+        if endFrame is None:
+            endFrame = int(math.ceil(self._songlength * fps + offset)) - 1
+        frames = np.arange(startFrame, endFrame + 1)
+        starts, ends = frame_windows(self._nframes, self._framerate, fps, 
+                                     frames, offset)
+        if len(frames) == 0:
+            return frames, np.zeros((0,) if bands == 1 else (0, bands))
+        first = int(starts.min())
+        samples = self.getsamples(first, int(ends.max()) - first)
+        starts -= first
+        ends -= first
+        lengths = ends - starts
+        
+        if bands == 1:
+            amps = samples.astype(np.float64)
+            if not(negative):
+                amps = np.abs(amps)
+            amps = amps.mean(axis=1)
+            totals = np.concatenate(([0], np.cumsum(amps)))
+            values = np.zeros(len(frames))
+            played = lengths > 0
+            values[played] = ((totals[ends[played]] - totals[starts[played]]) 
+                              / lengths[played])
+            return frames, values
+        
+        size = int(math.ceil(self._framerate / fps))
+        mono = np.concatenate((samples.astype(np.float32).mean(axis=1), 
+                               np.zeros(size, dtype=np.float32)))
+        windows = np.lib.stride_tricks.as_strided(
+            mono, (len(mono) - size + 1, size), 
+            (mono.strides[0], mono.strides[0]))[np.minimum(starts, 
+                                                           len(mono) - size)]
+        inside = np.arange(size)[None, :] < lengths[:, None]
+        spectrum = np.abs(np.fft.rfft(windows * inside, axis=1)) / size
+        edges = band_edges(bands, spectrum.shape[1])
+        values = np.add.reduceat(spectrum, edges[:-1], axis=1)
+        values /= np.diff(edges)[None, :]
+        return frames, values
                       
     def getsamplesize(self):
         '''Returns the sample size for the song'''
@@ -148,7 +789,7 @@ class TerrainWaveFile(wave.Wave_read):
     
     def getsonglengthtime(self):
         '''Returns the song length in the form "h:mm:ss.msmsms"'''
-        return str(datetime.timedelta(seconds=self._songlength))
+        return length_time(self._songlength)
     
     def getmaxamplitude(self):
         '''Returns the maximum amplitede for the song'''